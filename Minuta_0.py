@@ -1,15 +1,20 @@
-import pandas as pd
 import streamlit as st
 import datetime as dt
+from pathlib import Path
+from catalogo import CatalogoCompartilhado, carregar_catalogo, opcoes_cascata
 
 st.set_page_config(page_title="Modelo de Ocorrência")
 
-@st.cache_data
+@st.cache_resource
 def load_data(local_data):
-    return pd.read_excel(local_data)
+    # Lê o snapshot colunar compilado da planilha; o xlsx só é relido quando muda.
+    # Uma única instância por processo, compartilhada por todas as sessões. Snapshot próprio
+    # deste script, que lê uma origem diferente da dos outros
+    return CatalogoCompartilhado(carregar_catalogo(local_data, Path(__file__).with_name('catalogo_minuta_0.arrow')))
 
 local_data = r'C:\Users\luiz.camuri\PycharmProjects\PythonProject\Listagem de equipamentos.xlsx'
-dados = load_data(local_data)
+catalogo = load_data(local_data)
+dados = catalogo.dados
 
 # Colunas do DataFrame
 required_columns = ['UFV','família do equipamento','SE','equipamento']
@@ -43,18 +48,18 @@ if missing_columns:
     st.error(f'Colunas faltando no arquivo Excel: {", ".join(missing_columns)}')
 
 else:
-    ufv_0 = dados['UFV'].unique()
+    indice = catalogo.indice
+
+    ufv_0 = opcoes_cascata(indice)
     ufv_sel = st.selectbox('Selecione a UFV: ', ufv_0, index=None)
 
-    fam_0 = dados[dados['UFV'] == ufv_sel]['família do equipamento'].unique()
+    fam_0 = opcoes_cascata(indice, ufv_sel)
     fam_sel = st.selectbox('Selecione o tipo de equipamento: ', fam_0, index=None)
 
-    se_0 = dados[(dados['UFV'] == ufv_sel) & (dados['família do equipamento'] == fam_sel)]['SE'].unique()
+    se_0 = opcoes_cascata(indice, ufv_sel, fam_sel)
     se_sel = st.selectbox('Selecione parte da instalação: ', se_0, index=None)
 
-    equip_0 = dados[(dados['UFV'] == ufv_sel) &
-                    (dados['família do equipamento'] == fam_sel) &
-                    (dados['SE'] == se_sel)]['equipamento'].unique()
+    equip_0 = opcoes_cascata(indice, ufv_sel, fam_sel, se_sel)
     equip_sel = st.selectbox('Selecione o Equipamento: ', equip_0, index=None)
 
 descr_ini_ocr = st.text_area('Descrição inicial da Ocorrência:')
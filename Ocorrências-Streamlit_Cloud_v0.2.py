@@ -3,47 +3,156 @@
 import pandas as pd
 import streamlit as st
 import datetime as dt
-from st_gsheets_connection import GSheetsConnection # 1. IMPORTAR A CLASSE
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from pathlib import Path
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from armazenamento import ArmazenamentoPlanilha, ConexaoGSheets, abrir_armazenamento
+from catalogo import COLUNAS_CASCATA, AtualizadorCatalogo, opcoes_cascata
+from banco_ocorrencias import BancoOcorrencias, COLUNA_ID, COLUNAS_PLANILHA, SincronizadorPlanilha, novo_id
+from exportacao import FORMATOS, exportar, nome_arquivo
+from fila_gravacao import FilaGravacao
+from indicadores import resumir
+from validacao import PROTECOES, colunas_faltando, validar_ocorrencias
+import metricas
+from metricas import medir
 
 # --- Configuração Inicial e Conexão ---
 
 st.set_page_config(page_title="Modelo de Ocorrência")
 
-# Estabelece a conexão com o Google Sheets uma única vez
-@st.cache_resource
+# O catálogo é um só por processo e as sessões recebem cópias rasas dele: com copy-on-write
+# (padrão a partir do pandas 3) uma alteração feita por uma sessão gera uma cópia só dela
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+inicio_rerun = time.perf_counter()
+
+# Estabelece a conexão com o Google Sheets uma única vez. Sem spinner: ela costuma ser
+# criada em segundo plano, depois que a página já foi enviada ao navegador
+@st.cache_resource(show_spinner=False)
 def get_gsheets_connection():
-    # 2. USAR A CLASSE AQUI
-    return st.connection("gsheets", type=GSheetsConnection)
+    # 1. IMPORTAR A CLASSE (só aqui: a biblioteca e suas dependências do Google são pesadas
+    # e só são necessárias quando a conexão é criada)
+    from st_gsheets_connection import GSheetsConnection
+    # 2. USAR A CLASSE AQUI (com as leituras e gravações por intervalo da ConexaoGSheets)
+    with medir('conexao.gsheets'):
+        return ConexaoGSheets(st.connection("gsheets", type=GSheetsConnection))
+
+
+# --- Armazenamento ---
+
+ABA_OCORRENCIAS = "Ocorrências"
+gsheets_url = "https://docs.google.com/spreadsheets/d/1lUzy2PInVjaL2k7U5R4Wofc-9mvID-EF/edit?usp=sharing&ouid=111800672169498816048&rtpof=true&sd=true"
 
-conn = get_gsheets_connection()
+# OCORRENCIAS_ARMAZENAMENTO troca a planilha Google por outro armazenamento (servidor
+# local que emula o Sheets, arquivos xlsx ou SQLite; ver armazenamento.py), por exemplo
+# para usar o formulário sem rede ou nos testes de carga
+ARMAZENAMENTO_CONFIGURADO = os.environ.get('OCORRENCIAS_ARMAZENAMENTO')
+
+
+@st.cache_resource
+def get_armazenamento():
+    """Origem do catálogo e destino das ocorrências replicadas, um por processo."""
+    if ARMAZENAMENTO_CONFIGURADO:
+        return abrir_armazenamento(ARMAZENAMENTO_CONFIGURADO, Path(__file__).parent)
+    # A conexão só é criada no primeiro envio (ou pela preparação em segundo plano)
+    return ArmazenamentoPlanilha(gsheets_url, get_gsheets_connection, ABA_OCORRENCIAS)
+
+
+def conectar_armazenamento():
+    """Deixa pronta a conexão usada nas gravações (só a da planilha Google é demorada)."""
+    return get_gsheets_connection() if not ARMAZENAMENTO_CONFIGURADO else get_armazenamento()
 
 
 # --- Carregamento de Dados ---
 
-@st.cache_data
+# OCORRENCIAS_SNAPSHOT permite apontar o snapshot para outro arquivo (por exemplo nos testes de carga)
+CAMINHO_SNAPSHOT_CATALOGO = Path(os.environ.get('OCORRENCIAS_SNAPSHOT',
+                                                Path(__file__).with_name('catalogo_equipamentos.arrow')))
+
+
+# cache_resource: uma única instância do catálogo por processo, lida por todas as sessões
+# sem serializar nem copiar (cache_data entregaria uma cópia nova a cada rerun).
+# Depois da carga inicial, uma thread confere a planilha a cada 5 minutos e troca o
+# catálogo quando ele muda; nenhuma sessão espera por essa recarga.
+@st.cache_resource
 def load_data_from_gsheets(spreadsheet_url):
     """Carrega dados de uma planilha Google, tratando possíveis erros de carregamento."""
+    origem = get_armazenamento() if ARMAZENAMENTO_CONFIGURADO else spreadsheet_url
+    atualizador = AtualizadorCatalogo(origem, CAMINHO_SNAPSHOT_CATALOGO, intervalo=300)
     try:
-        spreadsheet_id = spreadsheet_url.split("/d/")[1].split("/")[0]
-        url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/gviz/tq?tqx=out:csv&tqs=0"
-        df = pd.read_csv(url)
-        return df
+        # Lê o snapshot colunar local; o CSV da planilha só é baixado de novo quando muda
+        with medir('catalogo.carregar'):
+            atualizador.carregar()
     except Exception as e:
-        st.error(f"Não foi possível carregar os dados dos equipamentos da planilha: {e}")
-        return pd.DataFrame()  # Retorna um DataFrame vazio em caso de erro
+        # Segue com o catálogo vazio; a thread de atualização continua tentando.
+        # O erro é exibido pelo script, pois esta função pode rodar fora da thread do script.
+        atualizador.ultimo_erro = f"{type(e).__name__}: {e}"
+    atualizador.iniciar()
+    return atualizador
 
 
-gsheets_url = "https://docs.google.com/spreadsheets/d/1lUzy2PInVjaL2k7U5R4Wofc-9mvID-EF/edit?usp=sharing&ouid=111800672169498816048&rtpof=true&sd=true"
-dados_equipamentos = load_data_from_gsheets(gsheets_url)
+# --- Inicialização em Paralelo ---
+
+# A conexão com a planilha e o catálogo são buscas de rede independentes: na primeira
+# execução do processo elas rodam ao mesmo tempo, com um prazo único para as duas, e a
+# primeira tela custa a mais lenta em vez da soma. Nos reruns seguintes as duas já estão
+# no cache_resource e voltam na hora.
+PRAZO_INICIALIZACAO = 30  # segundos, para todas as buscas juntas
+
+# Início rápido (padrão): a conexão com a planilha só começa a ser criada depois que a
+# primeira página está na tela (ver o final do script). Com OCORRENCIAS_INICIO_RAPIDO=0
+# ela é criada na inicialização, junto com o catálogo, e um erro de credenciais aparece logo.
+INICIO_RAPIDO = os.environ.get('OCORRENCIAS_INICIO_RAPIDO', '1') != '0'
+
+
+def em_paralelo(prazo, **tarefas):
+    """Executa as funções ao mesmo tempo e espera até ``prazo`` segundos por todas.
+
+    Retorna os futures por nome; os que não terminaram no prazo seguem rodando.
+    """
+    contexto = get_script_run_ctx()
+
+    def no_contexto(funcao):
+        # Permite usar st.cache_resource e st.secrets dentro das threads auxiliares
+        add_script_run_ctx(threading.current_thread(), contexto)
+        return funcao()
+
+    executor = ThreadPoolExecutor(max_workers=len(tarefas), thread_name_prefix='inicializacao')
+    futuros = {nome: executor.submit(no_contexto, funcao) for nome, funcao in tarefas.items()}
+    executor.shutdown(wait=False)
+    wait(futuros.values(), timeout=prazo)
+    return futuros
+
+
+tarefas_inicializacao = {'catalogo': lambda: load_data_from_gsheets(gsheets_url)}
+if not INICIO_RAPIDO:
+    tarefas_inicializacao['conexao'] = conectar_armazenamento
+with medir('inicializacao'):
+    inicializacao = em_paralelo(PRAZO_INICIALIZACAO, **tarefas_inicializacao)
+
+if not inicializacao['catalogo'].done():
+    st.warning("O catálogo de equipamentos ainda está sendo carregado. Tente novamente em instantes.")
+    st.stop()
+atualizador_catalogo = inicializacao['catalogo'].result()
+if atualizador_catalogo.versao == 0 and atualizador_catalogo.ultimo_erro:
+    st.error(f"Não foi possível carregar os dados dos equipamentos da planilha: {atualizador_catalogo.ultimo_erro}")
+catalogo = atualizador_catalogo.atual  # O mesmo catálogo durante todo o rerun, mesmo se trocado no meio
+dados_equipamentos = catalogo.dados
 
 # Verifica se as colunas essenciais existem no DataFrame carregado
 if not dados_equipamentos.empty:
-    required_columns = ['UFV', 'família do equipamento', 'SE', 'equipamento']
-    missing_columns = [col for col in required_columns if col not in dados_equipamentos.columns]
+    missing_columns = colunas_faltando(dados_equipamentos, COLUNAS_CASCATA)
     if missing_columns:
         st.error(f'Colunas faltando no arquivo de equipamentos: {", ".join(missing_columns)}')
         st.stop()  # Interrompe a execução se colunas essenciais faltam
 
+indice_cascata = catalogo.indice
+
 # --- Inicialização do Estado da Sessão e Funções de Callback ---
 
 # Bloco único para inicializar todas as chaves do session_state
@@ -57,10 +166,12 @@ if 'initialized' not in st.session_state:
     st.session_state['fam_sel'] = None
     st.session_state['se_sel'] = None
     st.session_state['equip_sel'] = None
+    st.session_state['busca_equip'] = ''
     st.session_state['descr_ini_ocr'] = ''
     st.session_state['prot_up'] = []
     st.session_state['bloq_chk'] = False
     st.session_state['obs_ocr'] = ''
+    st.session_state['id_ocorrencia'] = novo_id()
 
 
 def ufv_changed():
@@ -81,6 +192,16 @@ def se_changed():
     st.session_state['equip_sel'] = None
 
 
+def busca_selecionada():
+    """Callback que preenche toda a cascata com o equipamento escolhido na busca."""
+    caminho = st.session_state.get('busca_caminhos', {}).get(st.session_state.get('busca_resultado'))
+    if caminho:
+        (st.session_state['ufv_sel'], st.session_state['fam_sel'],
+         st.session_state['se_sel'], st.session_state['equip_sel']) = caminho
+        st.session_state['busca_equip'] = ''
+    st.session_state['busca_resultado'] = None
+
+
 def clear_form():
     """Limpa todos os campos do formulário, resetando o estado da sessão."""
     st.session_state['date_ini'] = dt.date.today()
@@ -91,189 +212,610 @@ def clear_form():
     st.session_state['fam_sel'] = None
     st.session_state['se_sel'] = None
     st.session_state['equip_sel'] = None
+    st.session_state['busca_equip'] = ''
     st.session_state['descr_ini_ocr'] = ''
     st.session_state['prot_up'] = []
     st.session_state['bloq_chk'] = False
     st.session_state['obs_ocr'] = ''
+    st.session_state['id_ocorrencia'] = novo_id()
+
+
+def montar_ocorrencia():
+    """Registro do formulário com as colunas da planilha (DataFrame de uma linha).
+
+    O ID é gerado uma vez por preenchimento do formulário: gravar de novo a
+    mesma ocorrência (clique repetido) não cria um segundo registro.
+    """
+    estado = st.session_state
+    return pd.DataFrame([{
+        "Data de Início": estado.date_ini.strftime('%d/%m/%Y') if estado.date_ini else '',
+        "Hora de Início": estado.h_ini.strftime('%H:%M') if estado.h_ini else '',
+        "Data de Término": estado.date_0.strftime('%d/%m/%Y') if estado.date_0 else '-',
+        "Hora de Término": estado.h_0.strftime('%H:%M') if estado.h_0 else '-',
+        "UFV": estado.ufv_sel,
+        "Família do Equipamento": estado.fam_sel,
+        "SE": estado.se_sel,
+        "Equipamento": estado.equip_sel,
+        "Descrição da Ocorrência": estado.descr_ini_ocr,
+        "Proteções Atuantes": ", ".join(estado.prot_up),
+        "Atuação de Bloqueio": "Sim" if estado.bloq_chk else "Não",
+        "Observações": estado.obs_ocr,
+        COLUNA_ID: estado.id_ocorrencia,
+    }], columns=COLUNAS_PLANILHA)
+
+
+# O formulário só pode ser limpo antes de os widgets serem instanciados, por isso
+# a gravação marca a limpeza e ela é aplicada no início do rerun seguinte
+if st.session_state.pop('limpar_form', False):
+    clear_form()
+
+# Catálogo trocado em segundo plano: descarta as seleções que deixaram de existir
+if st.session_state.get('versao_catalogo') != atualizador_catalogo.versao:
+    st.session_state['versao_catalogo'] = atualizador_catalogo.versao
+    selecao = []
+    for chave in ('ufv_sel', 'fam_sel', 'se_sel', 'equip_sel'):
+        if st.session_state.get(chave) not in opcoes_cascata(indice_cascata, *selecao):
+            st.session_state[chave] = None
+        selecao.append(st.session_state.get(chave))
+
+
+# --- Gravação de Ocorrências ---
+
+# OCORRENCIAS_DB permite apontar o banco para outro arquivo (por exemplo nos benchmarks)
+CAMINHO_BANCO = Path(os.environ.get('OCORRENCIAS_DB', Path(__file__).with_name('ocorrencias.db')))
+
+
+def append_ocorrencias(novas_linhas):
+    """Acrescenta as linhas ao final da aba de ocorrências, sem reler nem reescrever o histórico."""
+    # A conexão vem do cache_resource; se ainda estiver sendo criada, a fila espera por ela
+    armazenamento = get_armazenamento()
+    with medir('planilha.add_rows'):
+        armazenamento.acrescentar(novas_linhas)
+
+
+def alterar_ocorrencias(alteracoes, posicoes, conferencias):
+    """Grava só as células alteradas (por exemplo o término de uma ocorrência encerrada) nas linhas da aba.
+
+    As linhas são conferidas pelo ID (ou, sem ID na aba, pelo conteúdo) antes
+    da gravação; retorna os IDs alterados.
+    """
+    armazenamento = get_armazenamento()
+    with medir('planilha.alterar'):
+        return armazenamento.alterar(alteracoes, posicoes, conferencias)
+
+
+def conferir_envio(linhas):
+    """Quais linhas do lote já estão na planilha (um envio que falhou pode ter sido aplicado).
+
+    Lê só a coluna de IDs da parte da aba ainda não sincronizada; as linhas
+    anteriores já foram conferidas pela sincronização no banco local.
+    """
+    if COLUNA_ID not in linhas:
+        return pd.Series(False, index=linhas.index)
+    banco = get_banco_ocorrencias()
+    inicio = banco.linhas_sincronizadas(ABA_OCORRENCIAS)
+    with medir('planilha.conferir_envio'):
+        na_aba = get_armazenamento().ids_presentes(inicio)
+    ids = linhas[COLUNA_ID].astype(str)
+    return ids.isin(na_aba) | ids.isin(list(banco.linhas_planilha(ids)))
+
+
+def localizar_ocorrencias(ids):
+    """Posição na aba das ocorrências já lidas de volta da planilha pela sincronização."""
+    return get_banco_ocorrencias().linhas_planilha(ids)
+
+
+# Criado aqui, na thread do script (lê st.secrets), antes que a fila e a sincronização o usem
+get_armazenamento()
+
+
+# A fila é o único ponto do processo que escreve na planilha: as gravações de todas as
+# sessões que chegam dentro da janela saem em uma chamada só, e as chamadas ficam
+# dentro da cota de escrita da API do Sheets (60 por minuto por usuário, por padrão)
+JANELA_AGRUPAMENTO = 1.0  # segundos
+COTA_ESCRITA_POR_MINUTO = 60
+
+
+# Journal local compartilhado por todas as sessões; a gravação retorna assim que a
+# linha está no disco e a thread da fila faz o envio para a planilha em lotes
+@st.cache_resource
+def get_fila_gravacao():
+    fila = FilaGravacao(CAMINHO_BANCO, enviar=append_ocorrencias, janela_agrupamento=JANELA_AGRUPAMENTO,
+                        cota_por_minuto=COTA_ESCRITA_POR_MINUTO, alterar=alterar_ocorrencias,
+                        localizar=localizar_ocorrencias, conferir=conferir_envio)
+    fila.iniciar()
+    return fila
+
+fila_gravacao = get_fila_gravacao()
+
+
+# Banco SQLite local é o armazenamento principal; a planilha é uma cópia replicada
+@st.cache_resource
+def get_banco_ocorrencias():
+    return BancoOcorrencias(CAMINHO_BANCO, fila=fila_gravacao)
+
+banco_ocorrencias = get_banco_ocorrencias()
+
+
+def buscar_cauda_ocorrencias(inicio):
+    """Lê da aba de ocorrências apenas as linhas a partir de `inicio` (na planilha, por um intervalo da conexão)."""
+    armazenamento = get_armazenamento()
+    with medir('planilha.ler_cauda'):
+        return armazenamento.ler_ocorrencias(inicio)
+
+
+# Sincronização incremental da planilha para o banco (linhas gravadas por outras instâncias
+# ou à mão); na primeira execução em um disco novo ela importa o histórico completo
+@st.cache_resource
+def get_sincronizador():
+    return SincronizadorPlanilha(banco_ocorrencias, ABA_OCORRENCIAS, buscar_cauda_ocorrencias, intervalo=5)
+
+sincronizador = get_sincronizador()
+# A busca das linhas novas da planilha roda em paralelo com o resto do rerun: o
+# formulário é exibido sem esperar e o histórico mostra o que já está no banco local
+sincronizador.sincronizar_em_segundo_plano()
 
 
 # --- Layout do Formulário ---
 
 st.header("Formulário de Registro de Ocorrência")
 
+if 'ultimo_resumo' in st.session_state:
+    st.success("Ocorrência gravada com sucesso! O envio para a planilha é feito em segundo plano.")
+    st.text_area("Resumo da Ocorrência (para copiar):", value=st.session_state.pop('ultimo_resumo'), height=250)
+
+# Cada seção do formulário é um fragmento: interagir com um widget (inclusive confirmar
+# um texto digitado) reexecuta só a seção dele, e não o script inteiro com a cascata e o
+# histórico. Os valores ficam no session_state, de onde a gravação (rerun completo) os lê.
+# O tempo e o número de execuções de cada seção aparecem no painel de métricas.
+
 # Seção de Data e Hora
-with st.container(border=True):
-    col1, col2 = st.columns(2)
-    interv_time = dt.timedelta(minutes=1)
-
-    with col1:
-        st.date_input('Data inicial da ocorrência:', format='DD/MM/YYYY', key='date_ini')
-        st.time_input('Hora inicial:', step=interv_time, key='h_ini')
-
-    with col2:
-        st.date_input('Data final da ocorrência:', format='DD/MM/YYYY', key='date_0')
-        st.time_input('Hora final:', step=interv_time, key='h_0')
-
-    # Validação das datas e horas
-    if st.session_state['date_0'] and st.session_state['h_0'] and st.session_state['date_ini'] and st.session_state[
-        'h_ini']:
-        data_hora_ini = dt.datetime.combine(st.session_state['date_ini'], st.session_state['h_ini'])
-        data_hora_fin = dt.datetime.combine(st.session_state['date_0'], st.session_state['h_0'])
-        if data_hora_fin < data_hora_ini:
-            st.error("A data e hora final não podem ser anteriores à data e hora inicial.")
+@st.fragment
+def secao_datas():
+    """Datas e horas de início e término, com a validação entre elas."""
+    with medir('fragmento.datas'), st.container(border=True):
+        col1, col2 = st.columns(2)
+        interv_time = dt.timedelta(minutes=1)
+
+        with col1:
+            st.date_input('Data inicial da ocorrência:', format='DD/MM/YYYY', key='date_ini')
+            st.time_input('Hora inicial:', step=interv_time, key='h_ini')
+
+        with col2:
+            st.date_input('Data final da ocorrência:', format='DD/MM/YYYY', key='date_0')
+            st.time_input('Hora final:', step=interv_time, key='h_0')
+
+        # Validação das datas e horas
+        motivo_datas = validar_ocorrencias(montar_ocorrencia(), regras=('datas',)).iloc[0]
+        if motivo_datas:
+            st.error(f"Verifique as datas: {motivo_datas}.")
+
+secao_datas()
 
 # Seção de Seleção de Equipamento com Lógica Corrigida
-with st.container(border=True):
-    st.subheader("Detalhes do Equipamento")
-
-    # --- Seletor de UFV ---
-    ufv_options = [None] + sorted(list(dados_equipamentos['UFV'].unique()))
-    ufv_index = ufv_options.index(st.session_state.get('ufv_sel', None))
-    st.selectbox('UFV:', ufv_options, index=ufv_index, key='ufv_sel', on_change=ufv_changed,
-                 format_func=lambda x: 'Selecione...' if x is None else x)
-
-    # --- Seletor de Família ---
-    if st.session_state.get('ufv_sel'):
-        fam_options = [None] + sorted(list(
-            dados_equipamentos[dados_equipamentos['UFV'] == st.session_state.get('ufv_sel')][
-                'família do equipamento'].unique()))
-        fam_index = fam_options.index(st.session_state.get('fam_sel', None))
-        st.selectbox('Tipo de equipamento:', fam_options, index=fam_index, key='fam_sel', on_change=fam_changed,
-                     format_func=lambda x: 'Selecione...' if x is None else x)
+@st.fragment
+def secao_equipamento():
+    """Busca direta e seletores em cascata de UFV, família, SE e equipamento."""
+    with medir('fragmento.equipamento'), st.container(border=True):
+        st.subheader("Detalhes do Equipamento")
+
+        # --- Busca direta de equipamento (preenche UFV, família, SE e equipamento de uma vez) ---
+        st.text_input('Buscar equipamento:', key='busca_equip',
+                      placeholder='Digite o nome do equipamento, SE ou UFV')
+        if st.session_state.get('busca_equip'):
+            with medir('cascata.busca'):
+                resultados = catalogo.busca.buscar(st.session_state['busca_equip'], limite=15)
+            if resultados:
+                st.session_state['busca_caminhos'] = {' › '.join(map(str, caminho)): caminho for caminho in resultados}
+                st.selectbox('Resultados da busca:', [None] + list(st.session_state['busca_caminhos']), index=0,
+                             key='busca_resultado', on_change=busca_selecionada,
+                             format_func=lambda x: 'Selecione...' if x is None else x)
+            else:
+                st.caption("Nenhum equipamento encontrado.")
 
-    # --- Seletor de SE ---
-    if st.session_state.get('fam_sel'):
-        se_options = [None] + sorted(list(dados_equipamentos[
-                                              (dados_equipamentos['UFV'] == st.session_state.get('ufv_sel')) & (
-                                                          dados_equipamentos[
-                                                              'família do equipamento'] == st.session_state.get(
-                                                      'fam_sel'))]['SE'].unique()))
-        se_index = se_options.index(st.session_state.get('se_sel', None))
-        st.selectbox('Parte da instalação:', se_options, index=se_index, key='se_sel', on_change=se_changed,
+        # --- Seletor de UFV ---
+        with medir('cascata.ufv'):
+            ufv_options = [None] + opcoes_cascata(indice_cascata)
+        ufv_index = ufv_options.index(st.session_state.get('ufv_sel', None))
+        st.selectbox('UFV:', ufv_options, index=ufv_index, key='ufv_sel', on_change=ufv_changed,
                      format_func=lambda x: 'Selecione...' if x is None else x)
 
-    # --- Seletor de Equipamento ---
-    if st.session_state.get('se_sel'):
-        equip_options = [None] + sorted(list(dados_equipamentos[
-                                                 (dados_equipamentos['UFV'] == st.session_state.get('ufv_sel')) & (
-                                                             dados_equipamentos[
-                                                                 'família do equipamento'] == st.session_state.get(
-                                                         'fam_sel')) & (
-                                                             dados_equipamentos['SE'] == st.session_state.get(
-                                                         'se_sel'))]['equipamento'].unique()))
-        equip_index = equip_options.index(st.session_state.get('equip_sel', None))
-        st.selectbox('Equipamento:', equip_options, index=equip_index, key='equip_sel',
-                     format_func=lambda x: 'Selecione...' if x is None else x)
+        # --- Seletor de Família ---
+        if st.session_state.get('ufv_sel'):
+            with medir('cascata.familia'):
+                fam_options = [None] + opcoes_cascata(indice_cascata, st.session_state.get('ufv_sel'))
+            fam_index = fam_options.index(st.session_state.get('fam_sel', None))
+            st.selectbox('Tipo de equipamento:', fam_options, index=fam_index, key='fam_sel', on_change=fam_changed,
+                         format_func=lambda x: 'Selecione...' if x is None else x)
+
+        # --- Seletor de SE ---
+        if st.session_state.get('fam_sel'):
+            with medir('cascata.se'):
+                se_options = [None] + opcoes_cascata(indice_cascata, st.session_state.get('ufv_sel'),
+                                                     st.session_state.get('fam_sel'))
+            se_index = se_options.index(st.session_state.get('se_sel', None))
+            st.selectbox('Parte da instalação:', se_options, index=se_index, key='se_sel', on_change=se_changed,
+                         format_func=lambda x: 'Selecione...' if x is None else x)
+
+        # --- Seletor de Equipamento ---
+        if st.session_state.get('se_sel'):
+            with medir('cascata.equipamento'):
+                equip_options = [None] + opcoes_cascata(indice_cascata, st.session_state.get('ufv_sel'),
+                                                        st.session_state.get('fam_sel'), st.session_state.get('se_sel'))
+            equip_index = equip_options.index(st.session_state.get('equip_sel', None))
+            st.selectbox('Equipamento:', equip_options, index=equip_index, key='equip_sel',
+                         format_func=lambda x: 'Selecione...' if x is None else x)
+
+secao_equipamento()
 
 # Seção de Descrição da Ocorrência
-with st.container(border=True):
-    st.subheader("Descrição da Ocorrência")
-    st.text_area('Descrição inicial:', key='descr_ini_ocr')
-    st.multiselect('Proteções atuantes:',
-                   ['21 - Prot. Distância', '27 - Subtensão', '59 - Sobretensão', '50 - Sobrecorrente Inst.',
-                    '51 - Sobrecorrente Temp.', '50/62BF - Falha de abertura DJ', '87T - Diferencial do TR',
-                    '87B - Diferencial de Barras', '81U/O - Sub/Sobrefrequência', 'Nenhuma atuação de proteção'],
-                   key='prot_up')
-    st.checkbox('Atuação de Bloqueio?', key='bloq_chk')
-    st.text_area('Observações:', key='obs_ocr')
+@st.fragment
+def secao_descricao():
+    """Descrição, proteções atuantes, bloqueio e observações."""
+    with medir('fragmento.descricao'), st.container(border=True):
+        st.subheader("Descrição da Ocorrência")
+        st.text_area('Descrição inicial:', key='descr_ini_ocr')
+        st.multiselect('Proteções atuantes:', PROTECOES, key='prot_up')
+        st.checkbox('Atuação de Bloqueio?', key='bloq_chk')
+        st.text_area('Observações:', key='obs_ocr')
+
+secao_descricao()
 
 # --- Botões de Ação ---
 
 col_btn1, col_btn2 = st.columns(2)
 
 with col_btn1:
-    # --- SUBSTITUA O BLOCO DO BOTÃO 'Gravar' POR ESTE ---
-
-    with col_btn1:
-        if st.button('Gravar Ocorrência', type="primary", use_container_width=True):
-            # Validação para garantir que os campos obrigatórios foram preenchidos
-            if not all([st.session_state.get(k) for k in
-                        ['date_ini', 'h_ini', 'ufv_sel', 'fam_sel', 'se_sel', 'equip_sel']]):
-                st.warning("Por favor, preencha todos os campos de data, hora e equipamento antes de gravar.")
-            else:
-                data_ini_formatada = st.session_state.date_ini.strftime('%d/%m/%Y')
-                hora_ini_formatada = st.session_state.h_ini.strftime('%H:%M')
-                data_fin_formatada = st.session_state.date_0.strftime('%d/%m/%Y') if st.session_state.date_0 else '-'
-                hora_fin_formatada = st.session_state.h_0.strftime('%H:%M') if st.session_state.h_0 else '-'
-
-                ocorrencia_data = pd.DataFrame([{
-                    "Data de Início": data_ini_formatada,
-                    "Hora de Início": hora_ini_formatada,
-                    "Data de Término": data_fin_formatada,
-                    "Hora de Término": hora_fin_formatada,
-                    "UFV": st.session_state.ufv_sel,
-                    "Família do Equipamento": st.session_state.fam_sel,
-                    "SE": st.session_state.se_sel,
-                    "Equipamento": st.session_state.equip_sel,
-                    "Descrição da Ocorrência": st.session_state.descr_ini_ocr,
-                    "Proteções Atuantes": ", ".join(st.session_state.prot_up),
-                    "Atuação de Bloqueio": "Sim" if st.session_state.bloq_chk else "Não",
-                    "Observações": st.session_state.obs_ocr
-                }])
-
-                try:
-                    # CORREÇÃO: Usando .add_rows para uma operação segura de acréscimo
-                    conn.add_rows(worksheet="Ocorrências", data=ocorrencia_data)
-
-                    st.success("Ocorrência gravada com sucesso!")
-
-                    # Gera o resumo para o usuário copiar
-                    txt_ocr = (
-                        f"- Data/hora de início: {data_ini_formatada} - {hora_ini_formatada}\n"
-                        f"- Data/hora de término: {data_fin_formatada} - {hora_fin_formatada}\n"
-                        f"- Equipamento: {st.session_state.se_sel} - {st.session_state.equip_sel}\n"
-                        f"- Proteção atuada: {', '.join(st.session_state.prot_up) or 'Nenhuma'}\n"
-                        f'- Bloqueio: {"Sim" if st.session_state.bloq_chk else "Não"}\n'
-                        f"- Descrição: {st.session_state.descr_ini_ocr}\n"
-                        f"- Observações: {st.session_state.obs_ocr}"
-                    )
-                    st.text_area("Resumo da Ocorrência (para copiar):", value=txt_ocr, height=250)
-
-                    # Limpa o formulário após o sucesso
-                    clear_form()
-                    st.rerun()  # Força a atualização da página para limpar campos e recarregar a lista
-
-                except Exception as e:
-                    st.error(f"Ocorreu um erro ao gravar a ocorrência: {e}")
-
+    if st.button('Gravar Ocorrência', type="primary", use_container_width=True):
+        ocorrencia_data = montar_ocorrencia()
+        # Mesmas regras da importação em lote: obrigatórios, datas, equipamento no catálogo e proteções
+        motivo = validar_ocorrencias(ocorrencia_data, catalogo.chaves_caminhos).iloc[0]
+        if motivo:
+            st.warning(f"Não foi possível gravar: {motivo}.")
+        else:
             try:
-                # Atualiza a planilha usando o nome da aba correto
-                aba_existente = conn.read(worksheet="Ocorrências", usecols=list(range(12)))
-                df_atualizado = pd.concat([aba_existente, ocorrencia_data], ignore_index=True)
-                conn.update(worksheet="Ocorrências", data=df_atualizado)
-
-                st.success("Ocorrência gravada com sucesso!")
-
-                # Gera o resumo para o usuário copiar
-                txt_ocr = (
-                    f"- Data/hora de início: {data_ini_formatada} - {hora_ini_formatada}\n"
-                    f"- Data/hora de término: {data_fin_formatada} - {hora_fin_formatada}\n"
-                    f"- Equipamento: {st.session_state.se_sel} - {st.session_state.equip_sel}\n"
-                    f"- Proteção atuada: {', '.join(st.session_state.prot_up) or 'Nenhuma'}\n"
-                    f'- Bloqueio: {"Sim" if st.session_state.bloq_chk else "Não"}\n'
-                    f"- Descrição: {st.session_state.descr_ini_ocr}\n"
-                    f"- Observações: {st.session_state.obs_ocr}"
-                )
-                st.text_area("Resumo da Ocorrência (para copiar):", value=txt_ocr, height=250)
-
-                # Limpa o formulário após o sucesso
-                clear_form()
-
+                with medir('gravar.banco_local'):
+                    banco_ocorrencias.inserir(ocorrencia_data)
             except Exception as e:
                 st.error(f"Ocorreu um erro ao gravar a ocorrência: {e}")
+            else:
+                # Gera o resumo para o usuário copiar; ele é exibido após o rerun que limpa o formulário
+                registro = ocorrencia_data.iloc[0]
+                st.session_state.setdefault('gravadas_na_sessao', []).append(
+                    (registro[COLUNA_ID], f"{registro['SE']} - {registro['Equipamento']}, "
+                                          f"{registro['Data de Início']} {registro['Hora de Início']}"))
+                st.session_state['ultimo_resumo'] = (
+                    f"- Data/hora de início: {registro['Data de Início']} - {registro['Hora de Início']}\n"
+                    f"- Data/hora de término: {registro['Data de Término']} - {registro['Hora de Término']}\n"
+                    f"- Equipamento: {registro['SE']} - {registro['Equipamento']}\n"
+                    f"- Proteção atuada: {registro['Proteções Atuantes'] or 'Nenhuma'}\n"
+                    f"- Bloqueio: {registro['Atuação de Bloqueio']}\n"
+                    f"- Descrição: {registro['Descrição da Ocorrência']}\n"
+                    f"- Observações: {registro['Observações']}"
+                )
+                st.session_state['limpar_form'] = True
+                st.rerun()  # Força a atualização da página para limpar campos e recarregar a lista
 
 with col_btn2:
     if st.button('Limpar Campos', on_click=clear_form, use_container_width=True):
         st.toast("Formulário limpo!")
 
+# Situação da fila de envio para a planilha
+n_pendentes = fila_gravacao.pendentes()
+if n_pendentes:
+    st.caption(f"{n_pendentes} ocorrência(s) aguardando envio para a planilha.")
+    if fila_gravacao.ultimo_erro:
+        espera = max(0, round((fila_gravacao.proxima_tentativa or time.time()) - time.time()))
+        if fila_gravacao.ultimo_status == 429:
+            st.info(f"Limite de gravações por minuto da planilha atingido; o envio continua em {espera} s. "
+                    "As ocorrências já estão salvas.")
+        else:
+            st.warning(f"Falha no último envio para a planilha ({fila_gravacao.ultimo_erro}); nova tentativa "
+                       f"em {espera} s. As ocorrências já estão salvas.")
+
+n_alteracoes = fila_gravacao.alteracoes_pendentes()
+if n_alteracoes:
+    st.caption(f"{n_alteracoes} encerramento(s) aguardando envio para a planilha.")
+    if fila_gravacao.ultimo_erro_alteracoes:
+        espera = max(0, round((fila_gravacao.proxima_alteracao or time.time()) - time.time()))
+        st.warning(f"Falha no último envio de encerramentos para a planilha ({fila_gravacao.ultimo_erro_alteracoes}); "
+                   f"nova tentativa em {espera} s. Os encerramentos já estão salvos.")
+descartadas = fila_gravacao.alteracoes_descartadas()
+if descartadas:
+    st.warning(f"{len(descartadas)} encerramento(s) não enviado(s): a linha da ocorrência não foi encontrada na "
+               "planilha (apagada ou alterada à mão). Os encerramentos estão salvos no banco local; preencha o "
+               "término dessas ocorrências diretamente na planilha.")
+    with st.expander("Encerramentos não enviados"):
+        st.dataframe(pd.DataFrame([{COLUNA_ID: uid, **valores} for uid, (valores, _) in descartadas.items()]),
+                     hide_index=True)
+
+# Situação das ocorrências gravadas por este operador: na fila ou já na planilha
+gravadas_na_sessao = st.session_state.get('gravadas_na_sessao', [])
+if gravadas_na_sessao:
+    na_fila = fila_gravacao.ids_pendentes(COLUNA_ID) if n_pendentes else set()
+    st.caption("Suas gravações nesta sessão:\n" + "\n".join(
+        f"- {resumo}: {'na fila para a planilha' if id_ in na_fila else 'enviada à planilha'}"
+        for id_, resumo in reversed(gravadas_na_sessao[-5:])))
+
+# --- Ocorrências em Aberto ---
+
+LIMITE_ABERTAS = 200  # Linhas listadas; o total é sempre mostrado
+
+
+@st.fragment
+def secao_abertas():
+    """Ocorrências gravadas sem término, com a ação de encerrar."""
+    with medir('fragmento.abertas'), st.expander("Ocorrências em Aberto"):
+        if 'ultimo_encerramento' in st.session_state:
+            st.success(st.session_state.pop('ultimo_encerramento'))
+        # Só o índice parcial das ocorrências em aberto é lido, qualquer que seja o tamanho do histórico
+        with medir('abertas.listar'):
+            abertas, total_abertas = banco_ocorrencias.abertas(limite=LIMITE_ABERTAS)
+        if abertas.empty:
+            st.caption("Nenhuma ocorrência em aberto.")
+            return
+        st.caption(f"{total_abertas} ocorrência(s) em aberto"
+                   + (f"; as {LIMITE_ABERTAS} mais recentes:" if total_abertas > LIMITE_ABERTAS else ":"))
+        st.dataframe(abertas[["Data de Início", "Hora de Início", "UFV", "SE", "Equipamento",
+                              "Descrição da Ocorrência"]], hide_index=True)
+
+        # Como no formulário, a seleção só pode ser limpa antes de o widget ser instanciado
+        if st.session_state.pop('limpar_encerramento', False):
+            st.session_state['encerrar_sel'] = None
+            st.session_state['encerrar_hora'] = None
+        resumos = {registro[COLUNA_ID]: f"{registro['SE']} - {registro['Equipamento']}, início "
+                                        f"{registro['Data de Início']} {registro['Hora de Início']}"
+                   for _, registro in abertas.iterrows()}
+        escolhida = st.selectbox('Ocorrência a encerrar:', [None] + list(resumos), key='encerrar_sel',
+                                 format_func=lambda x: 'Selecione...' if x is None else resumos[x])
+        col_enc1, col_enc2 = st.columns(2)
+        with col_enc1:
+            data_fim = st.date_input('Data de término:', format='DD/MM/YYYY', key='encerrar_data')
+        with col_enc2:
+            hora_fim = st.time_input('Hora de término:', value=None, step=dt.timedelta(minutes=1),
+                                     key='encerrar_hora')
+        if st.button('Encerrar Ocorrência', disabled=escolhida is None or hora_fim is None):
+            encerrada = abertas[abertas[COLUNA_ID] == escolhida].assign(**{
+                "Data de Término": data_fim.strftime('%d/%m/%Y'), "Hora de Término": hora_fim.strftime('%H:%M')})
+            motivo = validar_ocorrencias(encerrada, regras=('datas',)).iloc[0]
+            if motivo:
+                st.warning(f"Não foi possível encerrar: {motivo}.")
+                return
+            with medir('abertas.encerrar'):
+                alterada = banco_ocorrencias.encerrar(escolhida, data_fim.strftime('%d/%m/%Y'),
+                                                      hora_fim.strftime('%H:%M'))
+            if not alterada:
+                st.warning("Esta ocorrência já foi encerrada.")
+                return
+            st.session_state['ultimo_encerramento'] = (
+                f"Ocorrência encerrada: {resumos[escolhida]}, término {data_fim:%d/%m/%Y} {hora_fim:%H:%M}. "
+                "O envio para a planilha é feito em segundo plano.")
+            st.session_state['limpar_encerramento'] = True
+            st.rerun()  # Rerun completo: o histórico e os indicadores passam a mostrar o término
+
+secao_abertas()
+
+# --- Importação em Lote (exportações de eventos do SCADA / relés) ---
+
+with st.expander("Importar Ocorrências em Lote"):
+    arquivo_lote = st.file_uploader('Arquivo de eventos (CSV ou Excel):', type=['csv', 'txt', 'xlsx', 'xls'],
+                                    key='arquivo_lote')
+    if arquivo_lote is not None:
+        # Importado só quando há arquivo: a importação não entra no custo de abrir a página
+        from importacao import CAMPOS_IMPORTACAO, ler_arquivo, preparar_importacao, sugerir_mapeamento
+        try:
+            with medir('importacao.ler_arquivo'):
+                dados_lote = ler_arquivo(arquivo_lote.getvalue(), arquivo_lote.name)
+        except Exception as e:
+            st.error(f"Não foi possível ler o arquivo: {e}")
+        else:
+            st.caption(f"{len(dados_lote)} linha(s) no arquivo. Confira a correspondência das colunas:")
+            sugestao = sugerir_mapeamento(dados_lote.columns)
+            opcoes_coluna = [None] + list(dados_lote.columns)
+            mapeamento = {}
+            col_map1, col_map2 = st.columns(2)
+            for i, campo in enumerate(CAMPOS_IMPORTACAO):
+                with (col_map1 if i % 2 == 0 else col_map2):
+                    mapeamento[campo] = st.selectbox(
+                        f'{campo}:', opcoes_coluna, index=opcoes_coluna.index(sugestao[campo]),
+                        key=f'map_{campo}', format_func=lambda x: '(não importar)' if x is None else x)
+
+            with medir('importacao.conferir'):
+                validas, rejeitadas = preparar_importacao(dados_lote, mapeamento, dados_equipamentos,
+                                                          catalogo.chaves_caminhos)
+            st.write(f"**{len(validas)}** ocorrência(s) válida(s), **{len(rejeitadas)}** rejeitada(s).")
+
+            if not rejeitadas.empty:
+                st.dataframe(rejeitadas, hide_index=True)
+                st.download_button('Baixar relatório de rejeições', rejeitadas.to_csv(index=False).encode('utf-8-sig'),
+                                   file_name='rejeicoes_importacao.csv', mime='text/csv')
+
+            lotes_importados = st.session_state.setdefault('lotes_importados', set())
+            if arquivo_lote.file_id in lotes_importados:
+                st.info("Este arquivo já foi importado nesta sessão.")
+            elif not validas.empty and st.button(f'Importar {len(validas)} ocorrência(s) válida(s)', type="primary"):
+                try:
+                    # Uma única transação local; o envio à planilha sai em lotes pela fila
+                    with medir('importacao.gravar'):
+                        banco_ocorrencias.inserir(validas)
+                except Exception as e:
+                    st.error(f"Ocorreu um erro ao gravar as ocorrências importadas: {e}")
+                else:
+                    lotes_importados.add(arquivo_lote.file_id)
+                    st.success(f"{len(validas)} ocorrência(s) importada(s) com sucesso!")
+
+# --- Indicadores Operacionais ---
+
+@st.fragment
+def secao_indicadores():
+    """Totais e MTTR a partir dos agregados do banco local."""
+    with medir('fragmento.indicadores'), st.expander("Indicadores Operacionais"):
+        try:
+            with medir('indicadores.ler'):
+                agregados = banco_ocorrencias.indicadores_equipamento()
+                por_protecao = banco_ocorrencias.indicadores_protecao()
+        except Exception as e:
+            st.error(f"Não foi possível calcular os indicadores: {e}")
+        else:
+            if agregados.empty:
+                st.info("Nenhuma ocorrência registrada ainda.")
+            else:
+                total = agregados[['ocorrencias', 'fechadas', 'duracao_min', 'bloqueios']].sum()
+                col_ind1, col_ind2, col_ind3, col_ind4 = st.columns(4)
+                col_ind1.metric('Ocorrências', int(total['ocorrencias']))
+                col_ind2.metric('Encerradas', int(total['fechadas']))
+                col_ind3.metric('MTTR (h)', f"{total['duracao_min'] / total['fechadas'] / 60:.2f}"
+                                if total['fechadas'] else '-')
+                col_ind4.metric('Com bloqueio', int(total['bloqueios']))
+
+                nivel = st.radio('Agrupar por:', ['UFV', 'SE', 'Equipamento'], horizontal=True, key='nivel_indicadores')
+                niveis = {'UFV': ['UFV'], 'SE': ['UFV', 'SE'],
+                          'Equipamento': ['UFV', 'SE', 'Equipamento']}[nivel]
+                resumo = resumir(agregados, niveis).rename(columns={
+                    'ocorrencias': 'Ocorrências', 'fechadas': 'Encerradas', 'bloqueios': 'Bloqueios'})
+                resumo['Duração total (h)'] = resumo.pop('duracao_min') / 60
+                st.dataframe(resumo, hide_index=True)
+
+                if not por_protecao.empty:
+                    st.caption("Ocorrências por proteção atuante")
+                    st.bar_chart(por_protecao.set_index('protecao')['ocorrencias'], horizontal=True)
+
+secao_indicadores()
+
 # --- Seção para Exibir Dados Registrados ---
 
-with st.expander("Ver Ocorrências Registradas"):
-    try:
-        ocorrencias_df = conn.read(worksheet="Ocorrências", usecols=list(range(12)), ttl="10m")
-        if not ocorrencias_df.empty:
-            st.dataframe(ocorrencias_df.sort_index(ascending=False))
-        else:
-            st.info("Nenhuma ocorrência registrada ainda.")
-    except Exception as e:
-        st.error(f"Não foi possível ler as ocorrências da planilha: {e}")
\ No newline at end of file
+@st.fragment
+def secao_historico():
+    """Histórico filtrado e paginado do banco local, com exportação."""
+    with medir('fragmento.historico'), st.expander("Ver Ocorrências Registradas"):
+        if sincronizador.em_andamento:
+            st.caption("Buscando novas ocorrências na planilha...")
+        if sincronizador.ultimo_erro:
+            st.warning(f"Não foi possível buscar novas ocorrências da planilha: {sincronizador.ultimo_erro}")
+
+        # Filtros aplicados no banco local; só a página pedida é enviada ao navegador
+        def voltar_primeira_pagina():
+            st.session_state['filtro_pagina'] = 1
+
+        col_filtro1, col_filtro2 = st.columns(2)
+        with col_filtro1:
+            filtro_periodo = st.date_input('Período:', value=(), format='DD/MM/YYYY', key='filtro_periodo',
+                                           on_change=voltar_primeira_pagina)
+        with col_filtro2:
+            filtro_bloqueio = st.selectbox('Atuação de bloqueio:', [None, True, False], key='filtro_bloqueio',
+                                           on_change=voltar_primeira_pagina,
+                                           format_func=lambda x: 'Todas' if x is None else ('Sim' if x else 'Não'))
+
+        # UFV, família, SE e equipamento em cascata, com as opções do catálogo
+        col_filtro3, col_filtro4, col_filtro5, col_filtro6 = st.columns(4)
+        filtro_niveis = []
+        for coluna_filtro, rotulo, chave in ((col_filtro3, 'UFV:', 'filtro_ufv'),
+                                             (col_filtro4, 'Tipo de equipamento:', 'filtro_familia'),
+                                             (col_filtro5, 'Parte da instalação:', 'filtro_se'),
+                                             (col_filtro6, 'Equipamento:', 'filtro_equip')):
+            if not filtro_niveis or filtro_niveis[-1] is not None:
+                opcoes_filtro = opcoes_cascata(indice_cascata, *filtro_niveis)
+                if st.session_state.get(chave) is not None and st.session_state[chave] not in opcoes_filtro:
+                    st.session_state[chave] = None
+                with coluna_filtro:
+                    filtro_niveis.append(st.selectbox(rotulo, opcoes_filtro, index=None, key=chave, placeholder='Todas',
+                                                      on_change=voltar_primeira_pagina))
+            else:
+                st.session_state.pop(chave, None)
+                filtro_niveis.append(None)
+
+        col_filtro7, col_filtro8 = st.columns([3, 1])
+        with col_filtro7:
+            filtro_protecoes = st.multiselect('Proteções atuantes:', PROTECOES, key='filtro_protecoes',
+                                              on_change=voltar_primeira_pagina)
+        with col_filtro8:
+            todas_protecoes = st.toggle('Todas as selecionadas', key='filtro_todas_protecoes',
+                                        on_change=voltar_primeira_pagina)
+
+        filtros_historico = dict(
+            data_inicial=filtro_periodo[0] if len(filtro_periodo) > 0 else None,
+            data_final=filtro_periodo[1] if len(filtro_periodo) > 1 else None,
+            ufv=filtro_niveis[0], familia=filtro_niveis[1], se=filtro_niveis[2], equipamento=filtro_niveis[3],
+            protecoes=filtro_protecoes, todas_protecoes=todas_protecoes, bloqueio=filtro_bloqueio,
+        )
+
+        TAMANHO_PAGINA = 100
+        try:
+            pagina = st.session_state.get('filtro_pagina', 1)
+            with medir('historico.ler'):
+                ocorrencias_df, total_ocorrencias = banco_ocorrencias.consultar(
+                    pagina=pagina, tamanho_pagina=TAMANHO_PAGINA, **filtros_historico)
+            total_paginas = max(1, -(-total_ocorrencias // TAMANHO_PAGINA))
+            if pagina > total_paginas:
+                st.session_state['filtro_pagina'] = 1
+                st.rerun(scope='fragment')
+            if total_ocorrencias:
+                with medir('historico.exibir'):
+                    st.dataframe(ocorrencias_df)
+                col_pag1, col_pag2 = st.columns([1, 3], vertical_alignment='center')
+                with col_pag1:
+                    st.number_input('Página:', min_value=1, max_value=total_paginas, key='filtro_pagina')
+                with col_pag2:
+                    st.caption(f"{total_ocorrencias} ocorrência(s) encontrada(s) — página {pagina} de {total_paginas}")
+
+                # Exportação com os mesmos filtros: o arquivo só é gerado no clique, em outra
+                # thread, lendo o banco em blocos para um arquivo temporário (a memória usada
+                # na conversão não cresce com o histórico; só o arquivo final é entregue)
+                def gerar_exportacao(formato, filtros):
+                    with medir(f'exportacao.{FORMATOS[formato][0]}'):
+                        with exportar(banco_ocorrencias.exportar_blocos(**filtros), formato) as arquivo:
+                            return arquivo.read()
+
+                col_exp1, col_exp2 = st.columns([1, 2], vertical_alignment='bottom')
+                with col_exp1:
+                    formato_exportacao = st.selectbox('Exportar como:', list(FORMATOS), key='formato_exportacao')
+                with col_exp2:
+                    st.download_button(f'Exportar {total_ocorrencias} ocorrência(s)',
+                                       data=partial(gerar_exportacao, formato_exportacao, filtros_historico),
+                                       file_name=nome_arquivo(formato_exportacao),
+                                       mime=FORMATOS[formato_exportacao][1], on_click='ignore',
+                                       use_container_width=True)
+            else:
+                st.info("Nenhuma ocorrência encontrada.")
+        except Exception as e:
+            st.error(f"Não foi possível ler as ocorrências registradas: {e}")
+
+secao_historico()
+
+# --- Painel de Métricas (somente administradores) ---
+
+# Aberto com ?admin=<token> na URL, quando "admin_token" está definido nos secrets
+CAMINHO_METRICAS = Path(os.environ.get('OCORRENCIAS_METRICAS', Path(__file__).with_name('metricas.jsonl')))
+
+try:
+    token_admin = st.secrets.get("admin_token")
+except FileNotFoundError:  # Sem secrets.toml, como ao usar um armazenamento local
+    token_admin = None
+if token_admin and st.query_params.get("admin") == token_admin:
+    with st.expander("Métricas de desempenho (processo)", expanded=True):
+        st.dataframe(metricas.resumo(), hide_index=True)
+        if fila_gravacao.cota is not None:
+            st.caption(f"Envios à planilha: {fila_gravacao.chamadas} chamada(s) com {fila_gravacao.linhas_enviadas} "
+                       f"linha(s); cota restante no último minuto: {fila_gravacao.cota.restante()} de "
+                       f"{fila_gravacao.cota.limite}.")
+        col_met1, col_met2 = st.columns(2)
+        with col_met1:
+            if st.button('Exportar métricas', use_container_width=True):
+                metricas.exportar(CAMINHO_METRICAS)
+                st.toast(f"Métricas gravadas em {CAMINHO_METRICAS.name}")
+        with col_met2:
+            if st.button('Zerar métricas', use_container_width=True):
+                metricas.limpar()
+                st.rerun()
+
+metricas.registrar('rerun', time.perf_counter() - inicio_rerun)
+
+
+# Início rápido: com a página já desenhada, a conexão é criada em segundo plano
+# (uma vez por processo), antes que a fila precise dela para o primeiro envio
+@st.cache_resource
+def preparar_conexao_em_segundo_plano():
+    return em_paralelo(0, conexao=conectar_armazenamento)['conexao']
+
+if INICIO_RAPIDO:
+    preparar_conexao_em_segundo_plano()
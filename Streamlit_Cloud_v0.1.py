@@ -1,18 +1,21 @@
-import pandas as pd
 import streamlit as st
 import datetime as dt
+from pathlib import Path
+from catalogo import CatalogoCompartilhado, carregar_catalogo, opcoes_cascata
 
 st.set_page_config(page_title="Modelo de Ocorrência")
 
-@st.cache_data
+@st.cache_resource
 def load_data_from_gsheets(spreadsheet_url):
-    spreadsheet_id = spreadsheet_url.split("/d/")[1].split("/")[0]
-    url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/gviz/tq?tqx=out:csv&tqs=0"
-    df = pd.read_csv(url)
-    return df
+    # Lê o snapshot colunar local; o CSV da planilha só é baixado de novo quando muda.
+    # Uma única instância por processo, compartilhada por todas as sessões. Snapshot próprio
+    # deste script, que lê uma origem diferente da dos outros
+    return CatalogoCompartilhado(carregar_catalogo(spreadsheet_url,
+                                                   Path(__file__).with_name('catalogo_streamlit_cloud_v0.1.arrow')))
 
 gsheets_url = "https://docs.google.com/spreadsheets/d/1lUzy2PInVjaL2k7U5R4Wofc-9mvID-EF/edit?usp=sharing&ouid=111800672169498816048&rtpof=true&sd=true" # Substitua pela sua URL
-dados = load_data_from_gsheets(gsheets_url)
+catalogo = load_data_from_gsheets(gsheets_url)
+dados = catalogo.dados
 
 required_columns = ['UFV','família do equipamento','SE','equipamento']
 missing_columns = [col for col in required_columns if col not in dados.columns]
@@ -50,24 +53,24 @@ if date_0 and h_0 and date_ini and h_ini:
 if missing_columns:
     st.error(f'Colunas faltando no arquivo Excel: {", ".join(missing_columns)}')
 else:
-    ufv_0 = dados['UFV'].unique()
+    indice = catalogo.indice
+
+    ufv_0 = opcoes_cascata(indice)
     ufv_sel = st.selectbox('Selecione a UFV: ', ufv_0, index=None)
 
     fam_sel = None  # Inicializa para evitar erros se ufv_sel for None
     if ufv_sel:
-        fam_0 = dados[dados['UFV'] == ufv_sel]['família do equipamento'].unique()
+        fam_0 = opcoes_cascata(indice, ufv_sel)
         fam_sel = st.selectbox('Selecione o tipo de equipamento: ', fam_0, index=None)
 
     se_sel = None  # Inicializa
     if fam_sel:
-        se_0 = dados[(dados['UFV'] == ufv_sel) & (dados['família do equipamento'] == fam_sel)]['SE'].unique()
+        se_0 = opcoes_cascata(indice, ufv_sel, fam_sel)
         se_sel = st.selectbox('Selecione parte da instalação: ', se_0, index=None)
 
     equip_sel = None  # Inicializa
     if se_sel:
-        equip_0 = dados[(dados['UFV'] == ufv_sel) &
-                        (dados['família do equipamento'] == fam_sel) &
-                        (dados['SE'] == se_sel)]['equipamento'].unique()
+        equip_0 = opcoes_cascata(indice, ufv_sel, fam_sel, se_sel)
         equip_sel = st.selectbox('Selecione o Equipamento: ', equip_0, index=None)
 
     descr_ini_ocr = st.text_area('Descrição inicial da Ocorrência:')
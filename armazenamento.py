@@ -0,0 +1,529 @@
+# --- Armazenamento do Catálogo e das Ocorrências ---
+#
+# Uma única interface para de onde vem o catálogo de equipamentos e para onde
+# vão (e de onde voltam) as ocorrências replicadas, com as implementações:
+#
+#   ArmazenamentoPlanilha  planilha Google: catálogo pela exportação CSV (gviz),
+#                          leitura e gravação das ocorrências pela conexão
+#                          autenticada (ConexaoGSheets ou ConexaoSheetsHTTP)
+#   ArmazenamentoExcel     arquivos xlsx locais (como a Minuta_0)
+#   ArmazenamentoBanco     banco SQLite embarcado, sem rede
+#
+# A ConexaoSheetsHTTP fala o formato da API de valores do Sheets (v4) e, junto
+# com o servidor_planilha_local.py, permite rodar o formulário e os testes de
+# carga sem o serviço do Google. Para escolher pela variável de ambiente
+# OCORRENCIAS_ARMAZENAMENTO, veja ``abrir_armazenamento``.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from itertools import zip_longest
+from pathlib import Path
+from urllib.parse import quote, urlencode, urlsplit
+
+import pandas as pd
+
+from banco_ocorrencias import COLUNA_ID, COLUNAS_PLANILHA
+from catalogo import assinatura_origem, ler_origem
+
+ABA_OCORRENCIAS = "Ocorrências"
+
+
+class Armazenamento(ABC):
+    """Interface comum dos armazenamentos.
+
+    ``ler_catalogo`` e ``assinatura_catalogo`` servem o catálogo (a assinatura
+    identifica a versão sem baixá-la; None quando não há como saber) e
+    ``identificacao_catalogo`` diz de onde ele vem, para o snapshot local.
+    ``acrescentar`` grava linhas no final da aba de ocorrências e
+    ``ler_ocorrencias(inicio)`` devolve as linhas a partir da posição
+    ``inicio`` (0 = primeira linha após o cabeçalho), com as colunas de
+    COLUNAS_PLANILHA; ``ids_presentes(inicio)`` devolve só os IDs dessas
+    linhas, para conferir um envio incerto antes de repeti-lo. ``alterar({ID: {coluna: valor}}, posicoes, conferencias)``
+    grava só as células indicadas das linhas com esses IDs e retorna os IDs
+    alterados (os que não estão na aba ficam de fora); ``posicoes`` ({ID:
+    posição}, na numeração de ``ler_ocorrencias``) são só uma indicação de
+    onde procurar, conferida antes de gravar. Linhas sem ID na aba
+    (históricas ou digitadas à mão) são reconhecidas pelo conteúdo em
+    ``conferencias`` ({ID: {coluna: valor}}) e recebem o ID junto com a
+    alteração.
+
+    Os métodos abstratos são obrigatórios: um armazenamento que não implemente
+    algum deles falha ao ser criado, e não na thread de gravação.
+    """
+
+    nome = 'armazenamento'
+
+    @abstractmethod
+    def ler_catalogo(self):
+        ...
+
+    def assinatura_catalogo(self):
+        return None
+
+    def identificacao_catalogo(self):
+        return self.nome
+
+    @abstractmethod
+    def acrescentar(self, linhas):
+        ...
+
+    @abstractmethod
+    def ler_ocorrencias(self, inicio=0):
+        ...
+
+    @abstractmethod
+    def ids_presentes(self, inicio=0):
+        ...
+
+    @abstractmethod
+    def alterar(self, alteracoes, posicoes=None, conferencias=None):
+        ...
+
+
+def _colunas_planilha(linhas):
+    """Ajusta as colunas lidas ao layout da aba (posição, não nome), completando as que faltam."""
+    linhas = linhas.iloc[:, :len(COLUNAS_PLANILHA)]
+    linhas.columns = COLUNAS_PLANILHA[:linhas.shape[1]]
+    return linhas.reindex(columns=COLUNAS_PLANILHA)
+
+
+def _valores(linhas):
+    """Linhas do DataFrame como listas de texto, com '' no lugar de valores ausentes."""
+    linhas = linhas.reindex(columns=COLUNAS_PLANILHA).astype(object)
+    return linhas.where(linhas.notna(), '').astype(str).values.tolist()
+
+
+# --- Planilha Google (ou o servidor local que a emula) ---
+
+def _id_planilha(spreadsheet_url):
+    return spreadsheet_url.split("/d/")[1].split("/")[0]
+
+
+def _letras(coluna):
+    """Letras da coluna da aba (A, B, ..., AA) pelo nome em COLUNAS_PLANILHA."""
+    numero, letras = COLUNAS_PLANILHA.index(coluna) + 1, ''
+    while numero:
+        numero, resto = divmod(numero - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+
+def _celula(aba, posicao, coluna):
+    """Referência A1 (por exemplo 'Ocorrências'!C12) da coluna na linha de dados ``posicao``."""
+    return f"'{aba}'!{_letras(coluna)}{int(posicao) + 2}"  # +2: cabeçalho e numeração a partir de 1
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _confere(linha, conferencia):
+    """A linha ({coluna: valor}) não tem ID e tem os valores de ``conferencia`` nas colunas dela."""
+    return (not _texto(linha.get(COLUNA_ID))
+            and all(_texto(linha.get(coluna)) == _texto(valor) for coluna, valor in conferencia.items()))
+
+
+def _localizar_linhas(linhas, uids, conferencias, ocupadas=()):
+    """Posições das linhas ({coluna: valor}, a partir da primeira de dados) pelo ID ou, sem ID, pelo conteúdo.
+
+    Retorna ``({ID: posição}, IDs achados pelo conteúdo)``; posições em
+    ``ocupadas`` (já atribuídas a outro ID) não são reaproveitadas.
+    """
+    por_id, sem_id = {}, []
+    for posicao, linha in enumerate(linhas):
+        uid = _texto(linha.get(COLUNA_ID))
+        if uid:
+            por_id.setdefault(uid, posicao)
+        else:
+            sem_id.append(posicao)
+    encontradas, por_conteudo, usadas = {}, set(), set(ocupadas)
+    for uid in uids:
+        if uid in por_id:
+            encontradas[uid] = por_id[uid]
+        elif uid in conferencias:
+            posicao = next((p for p in sem_id if p not in usadas and _confere(linhas[p], conferencias[uid])), None)
+            if posicao is not None:
+                encontradas[uid] = posicao
+                por_conteudo.add(uid)
+                usadas.add(posicao)
+    return encontradas, por_conteudo
+
+
+def _base_url(spreadsheet_url):
+    partes = urlsplit(spreadsheet_url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+
+class ArmazenamentoPlanilha(Armazenamento):
+    """Planilha Google: catálogo em uma planilha, ocorrências em uma aba de outra (ou da mesma).
+
+    O catálogo vem da exportação CSV do link ``url_catalogo``; as ocorrências
+    são lidas e gravadas só pela conexão, sem exigir que a aba seja pública.
+    ``obter_conexao`` é chamado a cada acesso e deve devolver um objeto com
+    ``add_rows(worksheet=, data=)``, ``get_ranges(ranges)`` e
+    ``update_ranges(data=)``, como a ConexaoGSheets (guardada em cache pelo
+    chamador) ou a ConexaoSheetsHTTP.
+    """
+
+    nome = 'planilha'
+
+    def __init__(self, url_catalogo, obter_conexao, aba=ABA_OCORRENCIAS):
+        self.url_catalogo = url_catalogo
+        self.obter_conexao = obter_conexao
+        self.aba = aba
+
+    def ler_catalogo(self):
+        return ler_origem(self.url_catalogo)
+
+    def assinatura_catalogo(self):
+        return assinatura_origem(self.url_catalogo)
+
+    def identificacao_catalogo(self):
+        return f"{self.nome}:{self.url_catalogo}"
+
+    def acrescentar(self, linhas):
+        self.obter_conexao().add_rows(worksheet=self.aba, data=linhas)
+
+    def ler_ocorrencias(self, inicio=0):
+        """Só as linhas a partir de ``inicio``, em uma leitura de intervalo (batchGet) pela conexão.
+
+        Os valores chegam como o texto exibido na aba, sem inferência de tipo
+        (datas, horas e '-' ficam como digitados); células vazias viram
+        ausentes, como nos demais armazenamentos.
+        """
+        intervalo = f"'{self.aba}'!A{int(inicio) + 2}:{_letras(COLUNAS_PLANILHA[-1])}"
+        linhas, = self.obter_conexao().get_ranges([intervalo])
+        cauda = _colunas_planilha(pd.DataFrame(linhas, dtype=object))
+        return cauda.where(cauda.notna() & (cauda != ''))
+
+    def ids_presentes(self, inicio=0):
+        """IDs da coluna de IDs a partir de ``inicio``, em uma leitura só dessa coluna."""
+        letras = _letras(COLUNA_ID)
+        coluna, = self.obter_conexao().get_ranges([f"'{self.aba}'!{letras}{int(inicio) + 2}:{letras}"])
+        return {_texto(valores[0]) for valores in coluna if valores and _texto(valores[0])}
+
+    def alterar(self, alteracoes, posicoes=None, conferencias=None):
+        """Confere as linhas nas posições indicadas e grava todas as células em uma chamada (batchUpdate).
+
+        A conferência lê, em uma única leitura, cada linha indicada: vale o
+        ID ou, se a célula de ID está vazia, o conteúdo de ``conferencias``
+        (e então o ID é gravado junto). Se a aba foi reordenada ou teve
+        linhas apagadas, as que não conferem são procuradas na coluna de IDs
+        (e nas colunas conferidas) inteira.
+        """
+        conexao = self.obter_conexao()
+        posicoes, conferencias = posicoes or {}, conferencias or {}
+        ultima = _letras(COLUNAS_PLANILHA[-1])
+        indicadas = [uid for uid in alteracoes if uid in posicoes]
+        lidas = conexao.get_ranges([f"'{self.aba}'!A{int(posicoes[uid]) + 2}:{ultima}{int(posicoes[uid]) + 2}"
+                                    for uid in indicadas])
+        encontradas, por_conteudo = {}, set()
+        for uid, valores in zip(indicadas, lidas):
+            linha = dict(zip(COLUNAS_PLANILHA, valores[0] if valores else []))
+            if _texto(linha.get(COLUNA_ID)) == uid:
+                encontradas[uid] = posicoes[uid]
+            elif uid in conferencias and _confere(linha, conferencias[uid]):
+                encontradas[uid] = posicoes[uid]
+                por_conteudo.add(uid)
+
+        faltam = [uid for uid in alteracoes if uid not in encontradas]
+        if faltam:
+            conferidas = {coluna for uid in faltam for coluna in conferencias.get(uid, {})}
+            colunas = [c for c in COLUNAS_PLANILHA if c == COLUNA_ID or c in conferidas]
+            lidas = conexao.get_ranges([f"'{self.aba}'!{_letras(c)}2:{_letras(c)}" for c in colunas])
+            celulas = [[valores[0] if valores else '' for valores in coluna] for coluna in lidas]
+            linhas = [dict(zip(colunas, linha)) for linha in zip_longest(*celulas, fillvalue='')]
+            achadas, conteudo = _localizar_linhas(linhas, faltam, conferencias, encontradas.values())
+            encontradas.update(achadas)
+            por_conteudo |= conteudo
+
+        if encontradas:
+            conexao.update_ranges(data={
+                _celula(self.aba, posicao, coluna): [[str(valor)]]
+                for uid, posicao in encontradas.items()
+                for coluna, valor in {**alteracoes[uid], **({COLUNA_ID: uid} if uid in por_conteudo else {})}.items()
+            })
+        return set(encontradas)
+
+
+class ConexaoSheetsHTTP:
+    """Cliente da API de valores do Sheets (v4) com os métodos usados do GSheetsConnection.
+
+    Aponta para o servidor_planilha_local.py (ou, com ``token``, para
+    https://sheets.googleapis.com). Erros HTTP (por exemplo 429 de cota)
+    sobem como urllib.error.HTTPError.
+    """
+
+    def __init__(self, spreadsheet_url, base_api=None, token=None, tempo_limite=30):
+        self.id = _id_planilha(spreadsheet_url)
+        self.base_api = base_api or _base_url(spreadsheet_url)
+        self.token = token
+        self.tempo_limite = tempo_limite
+
+    def _requisitar(self, metodo, caminho, corpo=None):
+        requisicao = urllib.request.Request(
+            f"{self.base_api}/v4/spreadsheets/{self.id}/values{caminho}", method=metodo,
+            data=None if corpo is None else json.dumps(corpo).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        if self.token:
+            requisicao.add_header('Authorization', f'Bearer {self.token}')
+        with urllib.request.urlopen(requisicao, timeout=self.tempo_limite) as resposta:
+            return json.loads(resposta.read() or b'{}')
+
+    def read(self, worksheet, **kwargs):
+        valores = self._requisitar('GET', f"/{quote(worksheet)}").get('values', [])
+        if not valores:
+            return pd.DataFrame()
+        cabecalho, linhas = valores[0], valores[1:]
+        return pd.DataFrame([linha + [''] * (len(cabecalho) - len(linha)) for linha in linhas], columns=cabecalho)
+
+    def add_rows(self, worksheet, data):
+        self._requisitar('POST', f"/{quote(worksheet)}:append?valueInputOption=RAW&insertDataOption=INSERT_ROWS",
+                         {'values': _valores(data)})
+
+    def get_ranges(self, ranges):
+        """Valores (como texto, como exibidos na planilha) de vários intervalos A1 em uma única chamada."""
+        if not ranges:
+            return []
+        consulta = urlencode([('ranges', intervalo) for intervalo in ranges] + [('valueRenderOption', 'FORMATTED_VALUE')])
+        resposta = self._requisitar('GET', f":batchGet?{consulta}")
+        return [intervalo.get('values', []) for intervalo in resposta.get('valueRanges', [])]
+
+    def update_ranges(self, data):
+        """Grava vários intervalos ({'Aba'!A1: [[valores]]}) em uma única chamada."""
+        self._requisitar('POST', ':batchUpdate', {
+            'valueInputOption': 'RAW',
+            'data': [{'range': intervalo, 'values': valores} for intervalo, valores in data.items()],
+        })
+
+    def update(self, worksheet, data):
+        cabecalho = [str(c) for c in data.columns]
+        linhas = data.astype(object).where(data.notna(), '').astype(str).values.tolist()
+        self._requisitar('PUT', f"/{quote(worksheet)}?valueInputOption=RAW", {'values': [cabecalho] + linhas})
+
+
+class ConexaoGSheets:
+    """GSheetsConnection com as leituras e gravações por intervalo da API de valores.
+
+    O GSheetsConnection só lê e grava abas inteiras. ``get_ranges`` e
+    ``update_ranges`` usam a planilha gspread que ele abre com a conta de
+    serviço dos secrets (``type = "service_account"``); os demais métodos
+    (``add_rows``, ``read``...) são os do GSheetsConnection.
+    """
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self._planilha = None
+
+    def __getattr__(self, nome):
+        return getattr(self.conexao, nome)
+
+    def _spreadsheet(self):
+        if self._planilha is None:
+            abrir = getattr(self.conexao.client, '_open_spreadsheet', None)
+            if abrir is None:
+                raise RuntimeError('A conexão "gsheets" precisa de uma conta de serviço (type = "service_account" '
+                                   'nos secrets) para ler e gravar intervalos da planilha.')
+            self._planilha = abrir()
+        return self._planilha
+
+    def get_ranges(self, ranges):
+        if not ranges:
+            return []
+        resposta = self._spreadsheet().values_batch_get(list(ranges), params={'valueRenderOption': 'FORMATTED_VALUE'})
+        return [intervalo.get('values', []) for intervalo in resposta.get('valueRanges', [])]
+
+    def update_ranges(self, data):
+        self._spreadsheet().values_batch_update(body={
+            'valueInputOption': 'RAW',
+            'data': [{'range': intervalo, 'values': valores} for intervalo, valores in data.items()],
+        })
+
+
+# --- Arquivos Excel locais ---
+
+class ArmazenamentoExcel(Armazenamento):
+    """Catálogo e ocorrências em arquivos xlsx locais.
+
+    Cada gravação reabre e salva o arquivo de ocorrências inteiro (o xlsx não
+    permite acrescentar no lugar); serve para uso local e testes, não para
+    históricos grandes.
+    """
+
+    nome = 'excel'
+
+    def __init__(self, caminho_catalogo, caminho_ocorrencias, aba=ABA_OCORRENCIAS):
+        self.caminho_catalogo = Path(caminho_catalogo)
+        self.caminho_ocorrencias = Path(caminho_ocorrencias)
+        self.aba = aba
+        self._lock = threading.Lock()
+
+    def ler_catalogo(self):
+        return ler_origem(self.caminho_catalogo)
+
+    def assinatura_catalogo(self):
+        return assinatura_origem(str(self.caminho_catalogo))
+
+    def identificacao_catalogo(self):
+        return f"{self.nome}:{self.caminho_catalogo.resolve()}"
+
+    def acrescentar(self, linhas):
+        from openpyxl import Workbook, load_workbook
+
+        with self._lock:
+            if self.caminho_ocorrencias.exists():
+                pasta = load_workbook(self.caminho_ocorrencias)
+            else:
+                pasta = Workbook()
+                pasta.active.title = self.aba
+            planilha = pasta[self.aba] if self.aba in pasta.sheetnames else pasta.create_sheet(self.aba)
+            if planilha.cell(1, 1).value is None:  # Aba nova: grava o cabeçalho na primeira linha
+                for coluna, nome in enumerate(COLUNAS_PLANILHA, start=1):
+                    planilha.cell(1, coluna, nome)
+            for registro in _valores(linhas):
+                planilha.append(registro)
+            temporario = self.caminho_ocorrencias.with_name(self.caminho_ocorrencias.name + '.tmp')
+            pasta.save(temporario)
+            os.replace(temporario, self.caminho_ocorrencias)
+
+    def ler_ocorrencias(self, inicio=0):
+        if not self.caminho_ocorrencias.exists():
+            return pd.DataFrame(columns=COLUNAS_PLANILHA)
+        with self._lock:
+            linhas = pd.read_excel(self.caminho_ocorrencias, sheet_name=self.aba, dtype=str)
+        return _colunas_planilha(linhas.iloc[int(inicio):])
+
+    def ids_presentes(self, inicio=0):
+        return {_texto(uid) for uid in self.ler_ocorrencias(inicio)[COLUNA_ID].dropna() if _texto(uid)}
+
+    def alterar(self, alteracoes, posicoes=None, conferencias=None):
+        """Procura as linhas pelo ID ou pelo conteúdo (o arquivo inteiro é lido de qualquer forma)."""
+        from openpyxl import load_workbook
+
+        if not self.caminho_ocorrencias.exists():
+            return set()
+        with self._lock:
+            pasta = load_workbook(self.caminho_ocorrencias)
+            planilha = pasta[self.aba]
+            linhas = [dict(zip(COLUNAS_PLANILHA, valores))
+                      for valores in planilha.iter_rows(min_row=2, max_col=len(COLUNAS_PLANILHA), values_only=True)]
+            encontradas, por_conteudo = _localizar_linhas(linhas, alteracoes, conferencias or {})
+            for uid, posicao in encontradas.items():
+                for coluna, valor in {**alteracoes[uid], **({COLUNA_ID: uid} if uid in por_conteudo else {})}.items():
+                    planilha.cell(posicao + 2, COLUNAS_PLANILHA.index(coluna) + 1, str(valor))
+            if encontradas:
+                temporario = self.caminho_ocorrencias.with_name(self.caminho_ocorrencias.name + '.tmp')
+                pasta.save(temporario)
+                os.replace(temporario, self.caminho_ocorrencias)
+        return set(encontradas)
+
+
+# --- Banco SQLite embarcado ---
+
+class ArmazenamentoBanco(Armazenamento):
+    """Catálogo e aba de ocorrências como tabelas de um arquivo SQLite, sem rede.
+
+    Use um arquivo diferente do banco local de ocorrências (BancoOcorrencias),
+    que é o armazenamento principal; este faz o papel da planilha replicada.
+    O catálogo é gravado com ``gravar_catalogo``.
+    """
+
+    nome = 'banco'
+
+    def __init__(self, caminho):
+        self.caminho = str(caminho)
+        colunas = ", ".join('"' + c.replace('"', '""') + '" TEXT' for c in COLUNAS_PLANILHA)
+        with self._conectar() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(f"CREATE TABLE IF NOT EXISTS aba_ocorrencias (linha INTEGER PRIMARY KEY AUTOINCREMENT, {colunas})")
+            db.execute("CREATE TABLE IF NOT EXISTS versao_catalogo (versao INTEGER NOT NULL)")
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def gravar_catalogo(self, dados):
+        with self._conectar() as db:
+            dados.to_sql('catalogo', db, if_exists='replace', index=False)
+            db.execute("DELETE FROM versao_catalogo")
+            db.execute("INSERT INTO versao_catalogo VALUES (?)", (int.from_bytes(os.urandom(6), 'big'),))
+
+    def ler_catalogo(self):
+        with self._conectar() as db:
+            return pd.read_sql_query("SELECT * FROM catalogo", db)
+
+    def assinatura_catalogo(self):
+        with self._conectar() as db:
+            linha = db.execute("SELECT versao FROM versao_catalogo").fetchone()
+        return None if linha is None else str(linha[0])
+
+    def identificacao_catalogo(self):
+        return f"{self.nome}:{Path(self.caminho).resolve()}"
+
+    def acrescentar(self, linhas):
+        marcadores = ", ".join("?" * len(COLUNAS_PLANILHA))
+        with self._conectar() as db:
+            db.executemany(f"INSERT INTO aba_ocorrencias VALUES (NULL, {marcadores})", _valores(linhas))
+
+    def ler_ocorrencias(self, inicio=0):
+        with self._conectar() as db:
+            linhas = pd.read_sql_query("SELECT * FROM aba_ocorrencias ORDER BY linha LIMIT -1 OFFSET ?", db,
+                                       params=(int(inicio),))
+        return linhas.drop(columns='linha').reindex(columns=COLUNAS_PLANILHA)
+
+    def ids_presentes(self, inicio=0):
+        with self._conectar() as db:
+            linhas = db.execute(f'SELECT "{COLUNA_ID}" FROM aba_ocorrencias ORDER BY linha LIMIT -1 OFFSET ?',
+                                (int(inicio),)).fetchall()
+        return {_texto(uid) for uid, in linhas if _texto(uid)}
+
+    def alterar(self, alteracoes, posicoes=None, conferencias=None):
+        """Altera as linhas pela coluna de IDs ou, nas linhas sem ID, pelo conteúdo (gravando o ID)."""
+        conferencias = conferencias or {}
+        alteradas = set()
+        with self._conectar() as db:
+            for uid, valores in alteracoes.items():
+                atribuicoes = ", ".join('"' + c.replace('"', '""') + '" = ?' for c in valores)
+                parametros = [str(v) for v in valores.values()]
+                cursor = db.execute(f'UPDATE aba_ocorrencias SET {atribuicoes} WHERE "{COLUNA_ID}" = ?',
+                                    parametros + [uid])
+                if not cursor.rowcount and uid in conferencias:
+                    condicao = " AND ".join('coalesce("' + c.replace('"', '""') + '", \'\') = ?'
+                                            for c in conferencias[uid])
+                    cursor = db.execute(
+                        f'UPDATE aba_ocorrencias SET {atribuicoes}, "{COLUNA_ID}" = ? WHERE linha = ('
+                        f'SELECT linha FROM aba_ocorrencias WHERE coalesce("{COLUNA_ID}", \'\') = \'\''
+                        f' AND {condicao} ORDER BY linha LIMIT 1)',
+                        parametros + [uid] + [_texto(v) for v in conferencias[uid].values()])
+                if cursor.rowcount:
+                    alteradas.add(uid)
+        return alteradas
+
+
+def abrir_armazenamento(especificacao, pasta=None):
+    """Armazenamento a partir de uma especificação de texto (variável OCORRENCIAS_ARMAZENAMENTO).
+
+    - ``http://host:porta``: servidor_planilha_local.py, com as planilhas
+      "catalogo" e "ocorrencias";
+    - ``excel:<catálogo.xlsx>[;<ocorrências.xlsx>]``: arquivos locais;
+    - ``banco:<arquivo.db>``: SQLite embarcado.
+
+    Caminhos relativos são resolvidos a partir de ``pasta``.
+    """
+    pasta = Path(pasta or '.')
+    if re.match(r'https?://', especificacao):
+        base = especificacao.rstrip('/')
+        conexao = ConexaoSheetsHTTP(f"{base}/spreadsheets/d/ocorrencias/edit")
+        return ArmazenamentoPlanilha(f"{base}/spreadsheets/d/catalogo/edit", lambda: conexao)
+    tipo, _, argumento = especificacao.partition(':')
+    if tipo == 'excel':
+        catalogo, _, ocorrencias = argumento.partition(';')
+        return ArmazenamentoExcel(pasta / catalogo, pasta / (ocorrencias or 'ocorrencias.xlsx'))
+    if tipo == 'banco':
+        return ArmazenamentoBanco(pasta / argumento)
+    raise ValueError(f"Armazenamento desconhecido: {especificacao!r}")
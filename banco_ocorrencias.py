@@ -0,0 +1,478 @@
+# --- Banco Local de Ocorrências ---
+#
+# Banco SQLite embarcado que passa a ser o armazenamento principal das
+# ocorrências. A planilha do Google vira uma cópia replicada: cada inserção
+# também entra na fila de envio (fila_gravacao.py), na mesma transação.
+# Os indicadores operacionais (indicadores.py) são atualizados na mesma
+# transação de cada inserção.
+#
+# As proteções atuantes são gravadas também como máscara de bits (coluna
+# "protecoes", bit i = validacao.PROTECOES[i]); o texto continua na coluna
+# "Proteções Atuantes", que é a replicada para a planilha.
+#
+# Cada ocorrência tem um ID gerado (UUID, coluna "ID da Ocorrência" da
+# planilha). Inserções com um ID já gravado são ignoradas, de modo que um
+# clique repetido em "Gravar" ou um lote reenviado não duplica registros. As
+# gravações concorrentes das sessões do processo passam por uma trava única
+# (fila de espera sem as novas tentativas do SQLite ocupado) e, entre
+# processos, pela trava de escrita do SQLite (BEGIN IMMEDIATE); nenhuma delas
+# relê a planilha.
+#
+# Ocorrências gravadas sem término ("Data/Hora de Término" = '-') ficam em
+# aberto. Um índice parcial do SQLite contém só essas linhas, então a lista
+# de ocorrências em aberto não percorre o histórico. Ao encerrar uma delas
+# (``encerrar``), só as duas colunas de término daquela linha mudam, e a
+# fila envia à planilha só essas duas células. A posição de cada ocorrência
+# na aba (coluna "linha_planilha") é conhecida quando a sincronização a lê
+# de volta.
+
+import datetime as dt
+import sqlite3
+from contextlib import closing
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+import indicadores
+from validacao import bits_protecoes, mascara_protecoes
+
+COLUNAS_OCORRENCIA = [
+    "Data de Início", "Hora de Início", "Data de Término", "Hora de Término",
+    "UFV", "Família do Equipamento", "SE", "Equipamento",
+    "Descrição da Ocorrência", "Proteções Atuantes", "Atuação de Bloqueio", "Observações",
+]
+
+COLUNA_ID = "ID da Ocorrência"
+# Colunas da aba de ocorrências: as do formulário e, na última coluna, o ID
+COLUNAS_PLANILHA = COLUNAS_OCORRENCIA + [COLUNA_ID]
+
+# Linhas da planilha sem ID recebem um ID derivado da aba e da posição da linha,
+# igual em qualquer instância que as importe
+_NAMESPACE_PLANILHA = uuid.UUID('6f1c3a52-2d0e-4f8b-9a61-3c7e5b0d9f24')
+
+
+def _coluna(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+SELECT_COLUNAS = "SELECT " + ", ".join(_coluna(c) for c in COLUNAS_OCORRENCIA) + " FROM ocorrencias"
+
+COLUNAS_TERMINO = ["Data de Término", "Hora de Término"]
+# Identificam na aba uma linha sem ID (histórica ou digitada à mão) ao encerrá-la
+COLUNAS_CONFERENCIA = ["Data de Início", "Hora de Início", "Equipamento"]
+# Sem data ou sem hora de término. O texto é o mesmo no índice parcial e nas consultas,
+# para que o SQLite use o índice.
+CONDICAO_ABERTA = " OR ".join(f"coalesce({_coluna(c)}, '') IN ('', '-')" for c in COLUNAS_TERMINO)
+
+
+def novo_id():
+    """ID de uma nova ocorrência."""
+    return str(uuid.uuid4())
+
+
+def _id_planilha(aba, linha):
+    return str(uuid.uuid5(_NAMESPACE_PLANILHA, f"{aba}:{linha}"))
+
+
+def _ids(linhas):
+    """Coluna de IDs como texto, com None onde não há ID."""
+    if COLUNA_ID not in linhas:
+        return pd.Series(None, index=linhas.index, dtype=object)
+    ids = linhas[COLUNA_ID].astype('string').str.strip()
+    return ids.astype(object).where(ids.notna() & (ids != ''), None)
+
+
+def calcular_inicio(linhas):
+    """Data/hora de início em ISO ('AAAA-MM-DD HH:MM'), ordenável como texto para o índice."""
+    inicio = pd.to_datetime(
+        linhas["Data de Início"].astype(str) + " " + linhas["Hora de Início"].astype(str),
+        format="%d/%m/%Y %H:%M", errors="coerce",
+    )
+    return inicio.dt.strftime("%Y-%m-%d %H:%M").where(inicio.notna(), None)
+
+
+def _registros(linhas):
+    """Tuplas com os valores das colunas como texto (ou None), na ordem de COLUNAS_OCORRENCIA."""
+    valores = linhas[COLUNAS_OCORRENCIA].astype(object)
+    valores = valores.where(valores.notna(), None)
+    return [tuple(None if v is None else str(v) for v in registro)
+            for registro in valores.itertuples(index=False, name=None)]
+
+
+class BancoOcorrencias:
+    """Armazenamento local das ocorrências, indexado por UFV, equipamento e início."""
+
+    def __init__(self, caminho, fila=None):
+        self.caminho = str(caminho)
+        self.fila = fila
+        self._escrita = threading.Lock()
+
+        colunas = ", ".join(f"{_coluna(c)} TEXT" for c in COLUNAS_OCORRENCIA)
+        with self._conectar() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS ocorrencias ("
+                f" id INTEGER PRIMARY KEY AUTOINCREMENT, inicio TEXT, {colunas},"
+                f" na_planilha INTEGER NOT NULL DEFAULT 0, protecoes INTEGER NOT NULL DEFAULT 0)"
+            )
+            existentes = {linha[1] for linha in db.execute("PRAGMA table_info(ocorrencias)")}
+            if "na_planilha" not in existentes:
+                db.execute("ALTER TABLE ocorrencias ADD COLUMN na_planilha INTEGER NOT NULL DEFAULT 0")
+            if "protecoes" not in existentes:
+                db.execute("ALTER TABLE ocorrencias ADD COLUMN protecoes INTEGER NOT NULL DEFAULT 0")
+                self._preencher_protecoes(db)
+            if "uid" not in existentes:
+                db.execute("ALTER TABLE ocorrencias ADD COLUMN uid TEXT")
+                sem_id = db.execute("SELECT id FROM ocorrencias WHERE uid IS NULL").fetchall()
+                db.executemany("UPDATE ocorrencias SET uid = ? WHERE id = ?", [(novo_id(), i) for i, in sem_id])
+            db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_ocorrencias_uid ON ocorrencias (uid)")
+            db.execute("CREATE TABLE IF NOT EXISTS sincronizacao (aba TEXT PRIMARY KEY, linhas INTEGER NOT NULL)")
+            if "linha_planilha" not in existentes:
+                db.execute("ALTER TABLE ocorrencias ADD COLUMN linha_planilha INTEGER")
+                # As posições na aba só são conhecidas lendo-a: a próxima sincronização relê a aba inteira
+                db.execute("DELETE FROM sincronizacao")
+            db.execute('CREATE INDEX IF NOT EXISTS idx_ocorrencias_ufv ON ocorrencias ("UFV")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_ocorrencias_equip ON ocorrencias ("Equipamento")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_ocorrencias_familia ON ocorrencias ("Família do Equipamento")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_ocorrencias_se ON ocorrencias ("SE")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_ocorrencias_inicio ON ocorrencias (inicio)')
+            db.execute(f'CREATE INDEX IF NOT EXISTS idx_ocorrencias_abertas ON ocorrencias ("Equipamento")'
+                       f' WHERE {CONDICAO_ABERTA}')
+            if indicadores.criar_tabelas(db):
+                # Banco anterior aos indicadores: calcula uma única vez a partir do histórico
+                indicadores.reconstruir(db, SELECT_COLUNAS)
+
+    @staticmethod
+    def _preencher_protecoes(db, tamanho_bloco=50_000):
+        """Calcula a máscara de proteções das linhas gravadas antes da coluna existir."""
+        consulta = 'SELECT id, "Proteções Atuantes" FROM ocorrencias'
+        for bloco in pd.read_sql_query(consulta, db, index_col="id", chunksize=tamanho_bloco):
+            mascaras = mascara_protecoes(bloco["Proteções Atuantes"])
+            db.executemany("UPDATE ocorrencias SET protecoes = ? WHERE id = ?",
+                           [(int(m), int(i)) for i, m in mascaras[mascaras != 0].items()])
+
+    def _conectar(self):
+        db = sqlite3.connect(self.caminho, timeout=30)
+        db.execute("PRAGMA synchronous=FULL")
+        return db
+
+    def inserir(self, linhas, replicar=True):
+        """Insere as linhas (colunas de COLUNAS_OCORRENCIA) em uma única transação.
+
+        Linhas sem "ID da Ocorrência" recebem um ID novo; linhas cujo ID já
+        está gravado são ignoradas. Com ``replicar=True`` as linhas inseridas
+        entram na fila de envio para a planilha (com o ID); use
+        ``replicar=False`` ao importar dados que já vieram dela. Retorna
+        quantas ocorrências foram inseridas.
+        """
+        linhas = linhas.reindex(columns=COLUNAS_PLANILHA)
+        ids = _ids(linhas)
+        linhas[COLUNA_ID] = [novo_id() if i is None else i for i in ids]
+        linhas = linhas.drop_duplicates(subset=COLUNA_ID)
+        # A conversão das linhas é feita fora da trava; dentro dela ficam só as instruções SQL
+        preparadas = self._preparar(linhas, na_planilha=not replicar)
+        with self._escrita, self._conectar() as db:
+            # Reserva a escrita antes de consultar os IDs, para que outro processo não grave entre os dois passos
+            db.execute("BEGIN IMMEDIATE")
+            gravados = self._ids_gravados(db, linhas[COLUNA_ID])
+            if gravados:
+                linhas = linhas[~linhas[COLUNA_ID].isin(gravados)]
+                preparadas = self._preparar(linhas, na_planilha=not replicar)
+            self._gravar(db, preparadas)
+            if replicar and self.fila is not None and not linhas.empty:
+                self.fila.enfileirar(linhas, db=db)
+        return len(linhas)
+
+    @staticmethod
+    def _ids_gravados(db, ids, tamanho_bloco=500):
+        """Quais dos ``ids`` já estão no banco."""
+        ids = list(ids)
+        gravados = set()
+        for inicio in range(0, len(ids), tamanho_bloco):
+            bloco = ids[inicio:inicio + tamanho_bloco]
+            marcadores = ", ".join("?" * len(bloco))
+            gravados.update(i for i, in db.execute(f"SELECT uid FROM ocorrencias WHERE uid IN ({marcadores})", bloco))
+        return gravados
+
+    def _inserir(self, db, linhas, na_planilha):
+        self._gravar(db, self._preparar(linhas, na_planilha))
+
+    @staticmethod
+    def _preparar(linhas, na_planilha):
+        """Valores das linhas para o INSERT e variações dos indicadores, sem tocar no banco."""
+        if linhas.empty:
+            return [], ([], [])
+        mascaras = mascara_protecoes(linhas["Proteções Atuantes"].reset_index(drop=True))
+        valores = [
+            (inicio, *registro, int(na_planilha), int(mascara), uid)
+            for inicio, registro, mascara, uid in zip(calcular_inicio(linhas), _registros(linhas), mascaras,
+                                                      linhas[COLUNA_ID])
+        ]
+        return valores, indicadores.variacoes(linhas)
+
+    @staticmethod
+    def _gravar(db, preparadas):
+        valores, variacoes = preparadas
+        colunas = ", ".join(["inicio"] + [_coluna(c) for c in COLUNAS_OCORRENCIA]
+                            + ["na_planilha", "protecoes", "uid"])
+        marcadores = ", ".join("?" * (len(COLUNAS_OCORRENCIA) + 4))
+        db.executemany(f"INSERT INTO ocorrencias ({colunas}) VALUES ({marcadores})", valores)
+        indicadores.aplicar(db, variacoes)
+
+    def linhas_sincronizadas(self, aba):
+        """Quantas linhas de dados da aba já foram incorporadas ao banco."""
+        with self._conectar() as db:
+            linha = db.execute("SELECT linhas FROM sincronizacao WHERE aba = ?", (aba,)).fetchone()
+        return linha[0] if linha else 0
+
+    def mesclar_da_planilha(self, aba, cauda):
+        """Incorpora as linhas novas lidas do final da aba e avança a marca de sincronização.
+
+        Linhas com ID já gravado (por exemplo as que este processo enviou e
+        que ainda aguardavam aparecer na planilha) são apenas marcadas como
+        replicadas, sem duplicar o registro. Linhas sem ID (digitadas à mão ou
+        anteriores à coluna) são comparadas pelo conteúdo e recebem um ID
+        derivado da posição na aba. A posição de cada ocorrência na aba fica
+        em "linha_planilha" (a primeira, se a linha aparece repetida). Retorna
+        quantas ocorrências novas foram inseridas.
+        """
+        cauda = cauda.reindex(columns=COLUNAS_PLANILHA).reset_index(drop=True)
+        ids = _ids(cauda).tolist()
+        condicao = " AND ".join(f"{_coluna(c)} IS ?" for c in COLUNAS_OCORRENCIA)
+        novas = []
+        with self._escrita, self._conectar() as db:
+            db.execute("BEGIN IMMEDIATE")
+            linha = db.execute("SELECT linhas FROM sincronizacao WHERE aba = ?", (aba,)).fetchone()
+            primeira_linha = linha[0] if linha else 0
+            gravados = self._ids_gravados(db, [i for i in ids if i is not None])
+            marcar = "UPDATE ocorrencias SET na_planilha = 1, linha_planilha = coalesce(linha_planilha, ?) WHERE "
+            for posicao, registro in enumerate(_registros(cauda)):
+                uid = ids[posicao]
+                linha_aba = primeira_linha + posicao
+                if uid is None and all(v is None for v in registro):
+                    continue  # Linha em branco na planilha: só conta para a marca
+                if uid is None:
+                    propria = db.execute(
+                        f"SELECT id FROM ocorrencias WHERE na_planilha = 0 AND {condicao} ORDER BY id LIMIT 1",
+                        registro,
+                    ).fetchone()
+                    if propria:
+                        db.execute(marcar + "id = ?", (linha_aba, *propria))
+                        continue
+                    uid = ids[posicao] = _id_planilha(aba, linha_aba)
+                    gravados.update(self._ids_gravados(db, [uid]))  # Linha já importada em uma releitura da aba
+                if uid in gravados:
+                    db.execute(marcar + "uid = ?", (linha_aba, uid))
+                    continue
+                gravados.add(uid)  # Um lote reenviado pode repetir o mesmo ID na cauda
+                novas.append(posicao)
+            if novas:
+                cauda[COLUNA_ID] = ids
+                self._inserir(db, cauda.iloc[novas], na_planilha=True)
+                db.executemany("UPDATE ocorrencias SET linha_planilha = ? WHERE uid = ?",
+                               [(primeira_linha + p, ids[p]) for p in novas])
+            db.execute(
+                "INSERT INTO sincronizacao (aba, linhas) VALUES (?, ?)"
+                " ON CONFLICT(aba) DO UPDATE SET linhas = linhas + excluded.linhas",
+                (aba, len(cauda)),
+            )
+        return len(novas)
+
+    def encerrar(self, uid, data_termino, hora_termino, replicar=True):
+        """Preenche a data e a hora de término ('DD/MM/AAAA', 'HH:MM') de uma ocorrência em aberto.
+
+        Altera só essas duas colunas da linha (e os indicadores do
+        equipamento), sem depender do tamanho do histórico. Com
+        ``replicar=True`` as duas células entram na fila de envio para a
+        planilha, com o início e o equipamento para reconhecer a linha se
+        ela não tiver ID na aba. Retorna False se não há ocorrência em
+        aberto com esse ID.
+        """
+        with self._escrita, self._conectar() as db:
+            db.execute("BEGIN IMMEDIATE")
+            linha = db.execute(f"SELECT id, {', '.join(_coluna(c) for c in COLUNAS_OCORRENCIA)} FROM ocorrencias"
+                               f" WHERE uid = ? AND ({CONDICAO_ABERTA})", (uid,)).fetchone()
+            if linha is None:
+                return False
+            antes = pd.DataFrame([linha[1:]], columns=COLUNAS_OCORRENCIA)
+            depois = antes.assign(**{"Data de Término": data_termino, "Hora de Término": hora_termino})
+            db.execute('UPDATE ocorrencias SET "Data de Término" = ?, "Hora de Término" = ? WHERE id = ?',
+                       (data_termino, hora_termino, linha[0]))
+            indicadores.acumular(db, antes, sinal=-1)
+            indicadores.acumular(db, depois)
+            if replicar and self.fila is not None:
+                self.fila.enfileirar_alteracao(uid, dict(zip(COLUNAS_TERMINO, (data_termino, hora_termino))), db=db,
+                                               conferencia={c: antes.at[0, c] for c in COLUNAS_CONFERENCIA})
+        return True
+
+    def abertas(self, limite=None, **filtros):
+        """Ocorrências em aberto (sem término), da mais recente para a mais antiga, e quantas são.
+
+        Aceita os mesmos filtros de ``consultar``; a consulta percorre só o
+        índice parcial das ocorrências em aberto. Retorna ``(df, total)``.
+        """
+        onde, parametros = self._filtros(**filtros)
+        onde = f"{onde} AND ({CONDICAO_ABERTA})" if onde else f" WHERE {CONDICAO_ABERTA}"
+        # Sem INDEXED BY, a ordem por id leva o SQLite a preferir percorrer a tabela inteira
+        origem = "ocorrencias INDEXED BY idx_ocorrencias_abertas"
+        sql = f"SELECT id, {self._colunas_leitura()} FROM {origem}{onde} ORDER BY id DESC"
+        with self._conectar() as db:
+            total = db.execute(f"SELECT COUNT(*) FROM {origem}{onde}", parametros).fetchone()[0]
+            if limite is not None:
+                sql += " LIMIT ?"
+                parametros = parametros + [int(limite)]
+            return pd.read_sql_query(sql, db, params=parametros, index_col="id"), total
+
+    def linhas_planilha(self, uids):
+        """Posição na aba (0 = primeira linha após o cabeçalho) das ocorrências já lidas de volta dela."""
+        uids = list(uids)
+        with self._conectar() as db:
+            marcadores = ", ".join("?" * len(uids))
+            return dict(db.execute(f"SELECT uid, linha_planilha FROM ocorrencias WHERE uid IN ({marcadores})"
+                                   " AND linha_planilha IS NOT NULL", uids).fetchall())
+
+    def indicadores_equipamento(self):
+        """Agregados por equipamento (ocorrências, encerradas, duração total, bloqueios)."""
+        with self._conectar() as db:
+            return indicadores.por_equipamento(db)
+
+    def indicadores_protecao(self):
+        """Ocorrências por proteção atuante."""
+        with self._conectar() as db:
+            return indicadores.por_protecao(db)
+
+    @staticmethod
+    def _filtros(data_inicial=None, data_final=None, ufv=None, familia=None, se=None, equipamento=None,
+                 protecoes=None, todas_protecoes=False, bloqueio=None):
+        """Cláusula WHERE (ou '') e parâmetros para os filtros informados."""
+        condicoes, parametros = [], []
+        # "inicio" é ISO ('AAAA-MM-DD HH:MM'): o intervalo de datas vira um intervalo do índice
+        if data_inicial is not None:
+            condicoes.append("inicio >= ?")
+            parametros.append(data_inicial.strftime("%Y-%m-%d"))
+        if data_final is not None:
+            condicoes.append("inicio < ?")
+            parametros.append((data_final + dt.timedelta(days=1)).strftime("%Y-%m-%d"))
+        for coluna, valor in (("UFV", ufv), ("Família do Equipamento", familia), ("SE", se),
+                              ("Equipamento", equipamento)):
+            if valor is not None:
+                condicoes.append(f"{_coluna(coluna)} = ?")
+                parametros.append(str(valor))
+        if protecoes:
+            alvo = bits_protecoes(protecoes)
+            if todas_protecoes:
+                condicoes.append("protecoes & ? = ?")
+                parametros += [alvo, alvo]
+            else:
+                condicoes.append("protecoes & ? != 0")
+                parametros.append(alvo)
+        if bloqueio is not None:
+            condicoes.append('"Atuação de Bloqueio" = ?')
+            parametros.append("Sim" if bloqueio else "Não")
+        return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+    @staticmethod
+    def _colunas_leitura():
+        return ", ".join([_coluna(c) for c in COLUNAS_OCORRENCIA] + [f"uid AS {_coluna(COLUNA_ID)}"])
+
+    def ler(self, limite=None, **filtros):
+        """Ocorrências da mais recente para a mais antiga, com as colunas da planilha (COLUNAS_PLANILHA).
+
+        Aceita os mesmos filtros de ``consultar``. Com ``protecoes`` (rótulos de
+        PROTECOES), só as ocorrências em que atuou alguma delas, ou todas com
+        ``todas_protecoes=True``; o filtro usa a máscara de bits, sem ler o texto.
+        """
+        onde, parametros = self._filtros(**filtros)
+        sql = f"SELECT id, {self._colunas_leitura()} FROM ocorrencias{onde} ORDER BY id DESC"
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        with self._conectar() as db:
+            return pd.read_sql_query(sql, db, params=parametros, index_col="id")
+
+    def exportar_blocos(self, tamanho_bloco=10_000, **filtros):
+        """Gerador com as ocorrências que atendem aos filtros, em DataFrames de até ``tamanho_bloco`` linhas.
+
+        Aceita os mesmos filtros de ``consultar``; a ordem é a de gravação (a
+        mais antiga primeiro). A consulta é lida do cursor aos poucos, então
+        só um bloco fica em memória por vez.
+        """
+        onde, parametros = self._filtros(**filtros)
+        sql = f"SELECT {self._colunas_leitura()} FROM ocorrencias{onde} ORDER BY id"
+        with closing(self._conectar()) as db:
+            yield from pd.read_sql_query(sql, db, params=parametros, chunksize=tamanho_bloco)
+
+    def consultar(self, pagina=1, tamanho_pagina=100, **filtros):
+        """Uma página das ocorrências que atendem aos filtros, da mais recente para a mais antiga.
+
+        Filtros: ``data_inicial``/``data_final`` (datas, inclusive), ``ufv``,
+        ``familia``, ``se``, ``equipamento``, ``protecoes`` com
+        ``todas_protecoes`` e ``bloqueio`` (True/False); ``None`` não filtra.
+        Retorna ``(pagina_df, total)``, com ``total`` = ocorrências encontradas.
+        """
+        onde, parametros = self._filtros(**filtros)
+        with self._conectar() as db:
+            total = db.execute(f"SELECT COUNT(*) FROM ocorrencias{onde}", parametros).fetchone()[0]
+            pagina_df = pd.read_sql_query(
+                f"SELECT id, {self._colunas_leitura()} FROM ocorrencias{onde} ORDER BY id DESC LIMIT ? OFFSET ?", db,
+                params=parametros + [int(tamanho_pagina), (max(int(pagina), 1) - 1) * int(tamanho_pagina)],
+                index_col="id",
+            )
+        return pagina_df, total
+
+
+class SincronizadorPlanilha:
+    """Leitura incremental da aba de ocorrências para o banco local.
+
+    ``buscar_cauda(inicio)`` deve retornar um DataFrame com as linhas de dados
+    da aba a partir da posição ``inicio`` (0 = primeira linha após o
+    cabeçalho). Assim cada sincronização baixa só o que foi acrescentado desde
+    a anterior. Chamadas mais próximas que ``intervalo`` segundos são ignoradas,
+    de modo que várias sessões podem chamar ``sincronizar`` a cada rerun.
+    """
+
+    def __init__(self, banco, aba, buscar_cauda, intervalo=5.0):
+        self.banco = banco
+        self.aba = aba
+        self.buscar_cauda = buscar_cauda
+        self.intervalo = intervalo
+        self.ultima_execucao = 0.0
+        self.ultimo_erro = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def em_andamento(self):
+        return self._lock.locked()
+
+    def sincronizar_em_segundo_plano(self):
+        """Dispara ``sincronizar`` em uma thread e retorna sem esperar; o erro fica em ``ultimo_erro``."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._sincronizar_registrando_erro,
+                                            name='sincronizador-planilha', daemon=True)
+            self._thread.start()
+
+    def _sincronizar_registrando_erro(self):
+        try:
+            self.sincronizar()
+        except Exception as e:
+            self.ultimo_erro = f"{type(e).__name__}: {e}"
+        else:
+            self.ultimo_erro = None
+
+    def sincronizar(self, forcar=False):
+        """Busca e incorpora as linhas novas. Retorna quantas ocorrências foram inseridas."""
+        if not self._lock.acquire(blocking=False):
+            return 0  # Outra sessão já está sincronizando
+        try:
+            if not forcar and time.monotonic() - self.ultima_execucao < self.intervalo:
+                return 0
+            cauda = self.buscar_cauda(self.banco.linhas_sincronizadas(self.aba))
+            self.ultima_execucao = time.monotonic()
+            if cauda.empty:
+                return 0
+            return self.banco.mesclar_da_planilha(self.aba, cauda)
+        finally:
+            self._lock.release()
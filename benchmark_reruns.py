@@ -0,0 +1,245 @@
+# --- Benchmark de Reruns ---
+#
+# Executa os scripts do formulário sem navegador (streamlit.testing AppTest)
+# com catálogos e históricos sintéticos, trocando os acessos de rede por dados
+# locais, e mede o tempo de cada etapa que o operador sente:
+#
+#   inicio_frio   primeira execução com os caches do processo vazios
+#   rerun         nova execução sem nenhuma interação
+#   cascata_N     rerun após escolher o N-ésimo seletor (UFV, família, SE, equipamento)
+#   gravar        clique em "Gravar Ocorrência" (somente v0.2)
+#
+# Na v0.2 o histórico de ocorrências tem o mesmo número de linhas do catálogo.
+# A importação dele para o banco local roda em segundo plano, em paralelo com
+# o início frio (que mede só o que já chegou ao banco); a medida espera a
+# importação terminar antes das etapas seguintes, que veem o histórico inteiro:
+#
+#   importacao         do fim do início frio até o histórico inteiro no banco
+#   historico_pagina   ir para a página 2 do histórico
+#   historico_ufv      filtrar o histórico por uma UFV
+#   historico_protecao filtrar também por uma proteção atuante
+#
+#     python benchmark_reruns.py --tamanhos 1000 10000 --saida bench.csv
+
+import argparse
+import datetime as dt
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from streamlit.connections import BaseConnection
+from streamlit.testing.v1 import AppTest
+
+RAIZ = Path(__file__).resolve().parent
+sys.path.insert(0, str(RAIZ))
+
+import banco_ocorrencias  # noqa: E402
+import catalogo  # noqa: E402
+from validacao import PROTECOES, SEM_PROTECAO  # noqa: E402
+
+SCRIPTS = {
+    'Minuta_0.py': {'chaves_cascata': None, 'gravar': False, 'historico': False},
+    'Streamlit_Cloud_v0.1.py': {'chaves_cascata': None, 'gravar': False, 'historico': False},
+    'Ocorrências-Streamlit_Cloud_v0.2.py': {
+        'chaves_cascata': ['ufv_sel', 'fam_sel', 'se_sel', 'equip_sel'],
+        'gravar': True,
+        'historico': True,
+    },
+}
+
+# Sincronizadores criados pelos scripts, para esperar a importação do histórico
+sincronizadores = []
+
+# Proteções sorteadas para o histórico sintético (a lista vazia equivale a nenhuma atuação)
+PROTECOES_ATUANTES = [p for p in PROTECOES if p != SEM_PROTECAO]
+
+
+def gerar_catalogo(n_linhas, semente=0):
+    """Catálogo sintético com ~n_linhas equipamentos distribuídos em UFVs, famílias e SEs."""
+    aleatorio = random.Random(semente)
+    familias = ['Disjuntor', 'Seccionadora', 'Transformador', 'Inversor', 'Religador', 'TC', 'TP', 'Para-raios']
+    n_ufv = max(1, int(n_linhas ** 0.4))
+    linhas = []
+    for i in range(n_linhas):
+        ufv = f'UFV {aleatorio.randrange(n_ufv):04d}'
+        familia = aleatorio.choice(familias)
+        se = f'SE {aleatorio.randrange(12):02d}'
+        linhas.append((ufv, familia, se, f'{familia[:2].upper()}-{i:07d}'))
+    return pd.DataFrame(linhas, columns=catalogo.COLUNAS_CASCATA)
+
+
+def gerar_historico(equipamentos, n_linhas, semente=0):
+    """Histórico sintético de ocorrências com as 12 colunas gravadas pelo formulário."""
+    aleatorio = random.Random(semente)
+    caminhos = list(equipamentos.itertuples(index=False, name=None))
+    inicio = dt.datetime(2020, 1, 1)
+    linhas = []
+    for _ in range(n_linhas):
+        ufv, familia, se, equipamento = aleatorio.choice(caminhos)
+        comeco = inicio + dt.timedelta(minutes=aleatorio.randrange(60 * 24 * 365 * 5))
+        fim = comeco + dt.timedelta(minutes=aleatorio.randrange(5, 600))
+        linhas.append({
+            "Data de Início": comeco.strftime('%d/%m/%Y'),
+            "Hora de Início": comeco.strftime('%H:%M'),
+            "Data de Término": fim.strftime('%d/%m/%Y'),
+            "Hora de Término": fim.strftime('%H:%M'),
+            "UFV": ufv,
+            "Família do Equipamento": familia,
+            "SE": se,
+            "Equipamento": equipamento,
+            "Descrição da Ocorrência": "Desligamento automático",
+            "Proteções Atuantes": ", ".join(aleatorio.sample(PROTECOES_ATUANTES, aleatorio.randrange(0, 3))),
+            "Atuação de Bloqueio": aleatorio.choice(["Sim", "Não"]),
+            "Observações": "",
+        })
+    return pd.DataFrame(linhas, columns=banco_ocorrencias.COLUNAS_OCORRENCIA)
+
+
+class ConexaoLocal(BaseConnection):
+    """Substituto local do GSheetsConnection: guarda as linhas acrescentadas em memória."""
+
+    linhas = []
+
+    def _connect(self, **kwargs):
+        return None
+
+    def add_rows(self, worksheet, data):
+        ConexaoLocal.linhas.append(data)
+
+    def read(self, worksheet=None, **kwargs):
+        return pd.DataFrame(columns=banco_ocorrencias.COLUNAS_OCORRENCIA)
+
+
+def instalar_fixtures(equipamentos, historico):
+    """Troca os acessos de rede dos scripts pelas fixtures locais."""
+    modulo = sys.modules.get('st_gsheets_connection') or types.ModuleType('st_gsheets_connection')
+    modulo.GSheetsConnection = ConexaoLocal
+    sys.modules['st_gsheets_connection'] = modulo
+
+    catalogo.carregar_catalogo = lambda origem, destino: equipamentos
+
+    # A sincronização incremental lê a cauda do histórico local em vez da planilha
+    init_original = banco_ocorrencias.SincronizadorPlanilha.__dict__.get('_init_original')
+    if init_original is None:
+        init_original = banco_ocorrencias.SincronizadorPlanilha.__init__
+        banco_ocorrencias.SincronizadorPlanilha._init_original = init_original
+
+    def init_local(self, banco, aba, buscar_cauda, intervalo=5.0):
+        init_original(self, banco, aba, lambda inicio: historico.iloc[inicio:], intervalo)
+        sincronizadores.append(self)
+
+    banco_ocorrencias.SincronizadorPlanilha.__init__ = init_local
+
+
+def cronometrar(acao):
+    inicio = time.perf_counter()
+    acao()
+    return time.perf_counter() - inicio
+
+
+def aguardar_importacao(n_linhas, limite=3600):
+    """Espera a sincronização do script deixar as ``n_linhas`` do histórico no banco local."""
+    sincronizador = sincronizadores[-1]
+    prazo = time.monotonic() + limite
+    while sincronizador.banco.linhas_sincronizadas(sincronizador.aba) < n_linhas:
+        if time.monotonic() > prazo:
+            raise TimeoutError("importação do histórico não terminou")
+        if not sincronizador.em_andamento:
+            sincronizador.sincronizar_em_segundo_plano()
+        time.sleep(0.05)
+
+
+def novo_app(script):
+    app = AppTest.from_file(str(RAIZ / script), default_timeout=600)
+    app.secrets['connections'] = {'gsheets': {'spreadsheet': 'https://docs.google.com/spreadsheets/d/local/edit'}}
+    return app
+
+
+def medir_script(script, config, n_linhas, repeticoes):
+    """Mede as etapas de um script para um tamanho de catálogo/histórico."""
+    tempos = {}
+
+    def registrar(etapa, segundos):
+        tempos.setdefault(etapa, []).append(segundos)
+
+    for _ in range(repeticoes):
+        # Banco novo por repetição: o histórico é importado pela sincronização no início frio
+        with tempfile.TemporaryDirectory() as pasta:
+            os.environ['OCORRENCIAS_DB'] = os.path.join(pasta, 'ocorrencias.db')
+            st.cache_data.clear()
+            st.cache_resource.clear()
+
+            app = novo_app(script)
+            sincronizadores.clear()
+            registrar('inicio_frio', cronometrar(app.run))
+            if config['historico']:
+                registrar('importacao', cronometrar(lambda: aguardar_importacao(n_linhas)))
+            registrar('rerun', cronometrar(app.run))
+
+            chaves = config['chaves_cascata']
+            for nivel in range(4):
+                if chaves:
+                    seletor = app.selectbox(key=chaves[nivel])
+                    seletor.select_index(1)
+                else:
+                    seletor = app.selectbox[nivel]
+                    seletor.select_index(0)
+                registrar(f'cascata_{nivel + 1}', cronometrar(app.run))
+
+            if config['gravar']:
+                app.time_input(key='h_ini').set_value(dt.time(10, 0))
+                app.run()
+                botao = next(b for b in app.button if b.label == 'Gravar Ocorrência')
+                botao.click()
+                registrar('gravar', cronometrar(app.run))
+
+            if config['historico']:
+                app.number_input(key='filtro_pagina').set_value(2)
+                registrar('historico_pagina', cronometrar(app.run))
+                app.selectbox(key='filtro_ufv').select_index(0)
+                registrar('historico_ufv', cronometrar(app.run))
+                app.multiselect(key='filtro_protecoes').select(PROTECOES_ATUANTES[0])
+                registrar('historico_protecao', cronometrar(app.run))
+
+            if app.exception:
+                raise RuntimeError(f"{script} falhou: {app.exception[0].message}")
+
+    return {etapa: statistics.median(valores) for etapa, valores in tempos.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de reruns dos scripts do formulário.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="Linhas do catálogo sintético (e do histórico de ocorrências)")
+    parser.add_argument('--scripts', nargs='+', default=list(SCRIPTS), choices=list(SCRIPTS))
+    parser.add_argument('--repeticoes', type=int, default=3, help="Repetições por medida (usa a mediana)")
+    parser.add_argument('--saida', help="Arquivo CSV para gravar os resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    for n_linhas in args.tamanhos:
+        equipamentos = gerar_catalogo(n_linhas)
+        historico = gerar_historico(equipamentos, n_linhas)
+        instalar_fixtures(equipamentos, historico)
+        for script in args.scripts:
+            print(f"{script} com {n_linhas} linhas...", file=sys.stderr)
+            tempos = medir_script(script, SCRIPTS[script], n_linhas, args.repeticoes)
+            for etapa, segundos in tempos.items():
+                resultados.append({'script': script, 'linhas': n_linhas, 'etapa': etapa, 'ms': segundos * 1000})
+
+    tabela = pd.DataFrame(resultados)
+    print(tabela.pivot_table(index=['script', 'linhas'], columns='etapa', values='ms', sort=False)
+          .to_string(float_format='{:.1f}'.format))
+    if args.saida:
+        tabela.to_csv(args.saida, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# --- Teste de Carga da Gravação ---
+#
+# Simula dezenas de operadores clicando em "Gravar" ao mesmo tempo em um único
+# processo, com o banco local, a fila de envio e uma planilha substituta em
+# memória (com latência e falhas ocasionais no envio: antes de acrescentar as
+# linhas, ou depois, como um tempo esgotado em que a planilha já recebeu o
+# lote). Ao final confere que:
+#
+#   - cada ocorrência gravada está uma única vez no banco e na planilha;
+#   - cliques repetidos (mesmo ID) não criaram registros a mais;
+#   - a sincronização de volta da planilha não insere nada de novo.
+#
+#     python carga_gravacao.py --operadores 50 --gravacoes 20
+#
+# Sai com código 1 se alguma conferência falhar.
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent
+sys.path.insert(0, str(RAIZ))
+
+from banco_ocorrencias import (  # noqa: E402
+    COLUNA_ID, COLUNAS_PLANILHA, BancoOcorrencias, SincronizadorPlanilha, novo_id,
+)
+from fila_gravacao import FilaGravacao  # noqa: E402
+from validacao import PROTECOES  # noqa: E402
+
+ABA = "Ocorrências"
+
+
+class PlanilhaLocal:
+    """Substituto da aba de ocorrências: acrescenta linhas em memória, com latência e falhas simuladas."""
+
+    def __init__(self, latencia=0.05, taxa_falha=0.1, taxa_falha_apos=0.05, semente=0):
+        self.latencia = latencia
+        self.taxa_falha = taxa_falha
+        self.taxa_falha_apos = taxa_falha_apos
+        self.linhas = pd.DataFrame(columns=COLUNAS_PLANILHA)
+        self.envios = 0
+        self.falhas = 0
+        self.falhas_apos = 0
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+
+    def add_rows(self, data):
+        time.sleep(self.latencia)
+        with self._lock:
+            if self._aleatorio.random() < self.taxa_falha:
+                self.falhas += 1
+                raise ConnectionError("falha simulada da API")
+            self.linhas = pd.concat([self.linhas, data.reindex(columns=COLUNAS_PLANILHA)], ignore_index=True)
+            self.envios += 1
+            if self._aleatorio.random() < self.taxa_falha_apos:
+                # Lote acrescentado, mas a resposta não chega a quem enviou
+                self.falhas_apos += 1
+                raise TimeoutError("falha simulada da API depois de acrescentar o lote")
+
+    def cauda(self, inicio):
+        with self._lock:
+            return self.linhas.iloc[inicio:].copy()
+
+    def ids_presentes(self, inicio=0):
+        with self._lock:
+            return set(self.linhas[COLUNA_ID].iloc[inicio:].dropna())
+
+
+def ocorrencia(operador, numero):
+    """Uma ocorrência do formulário (DataFrame de uma linha) com ID novo."""
+    return pd.DataFrame([{
+        "Data de Início": "01/03/2025",
+        "Hora de Início": f"{numero % 24:02d}:{operador % 60:02d}",
+        "Data de Término": "-",
+        "Hora de Término": "-",
+        "UFV": f"UFV {operador % 7:02d}",
+        "Família do Equipamento": "Disjuntor",
+        "SE": f"SE {numero % 5:02d}",
+        "Equipamento": f"DJ-{operador:03d}-{numero:03d}",
+        "Descrição da Ocorrência": f"Operador {operador}, gravação {numero}",
+        "Proteções Atuantes": PROTECOES[(operador + numero) % len(PROTECOES)],
+        "Atuação de Bloqueio": "Sim" if numero % 2 else "Não",
+        "Observações": "",
+        COLUNA_ID: novo_id(),
+    }], columns=COLUNAS_PLANILHA)
+
+
+def executar(operadores, gravacoes, taxa_repeticao, latencia, taxa_falha, taxa_falha_apos, caminho):
+    planilha = PlanilhaLocal(latencia=latencia, taxa_falha=taxa_falha, taxa_falha_apos=taxa_falha_apos)
+    # Como no formulário: antes de reenviar, confere pela coluna de IDs o que já chegou à planilha
+    fila = FilaGravacao(caminho, enviar=planilha.add_rows, tamanho_lote=50, intervalo=0.05, espera_maxima=0.5,
+                        conferir=lambda linhas: linhas[COLUNA_ID].isin(planilha.ids_presentes()))
+    banco = BancoOcorrencias(caminho, fila=fila)
+    fila.iniciar()
+
+    largada = threading.Barrier(operadores)
+    tempos, ids_gravados, erros = [], [], []
+    lock = threading.Lock()
+
+    def operador(n):
+        aleatorio = random.Random(n)
+        largada.wait()
+        for numero in range(gravacoes):
+            linha = ocorrencia(n, numero)
+            cliques = 2 if aleatorio.random() < taxa_repeticao else 1
+            for _ in range(cliques):
+                inicio = time.perf_counter()
+                try:
+                    banco.inserir(linha)
+                except Exception as e:
+                    with lock:
+                        erros.append(f"{type(e).__name__}: {e}")
+                    continue
+                with lock:
+                    tempos.append(time.perf_counter() - inicio)
+            with lock:
+                ids_gravados.append(linha[COLUNA_ID].iloc[0])
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=operador, args=(n,)) for n in range(operadores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao_gravacao = time.perf_counter() - inicio
+
+    # Aguarda a fila esvaziar (com as novas tentativas após as falhas simuladas)
+    limite = time.monotonic() + 120
+    while fila.pendentes() and time.monotonic() < limite:
+        time.sleep(0.05)
+    duracao_total = time.perf_counter() - inicio
+
+    inseridas_na_volta = SincronizadorPlanilha(banco, ABA, planilha.cauda).sincronizar(forcar=True)
+
+    no_banco = banco.ler()[COLUNA_ID]
+    na_planilha = planilha.linhas[COLUNA_ID]
+    esperados = set(ids_gravados)
+    conferencias = {
+        'sem erros na gravação': not erros,
+        'fila vazia': fila.pendentes() == 0,
+        'banco: uma linha por ocorrência': len(no_banco) == len(esperados) and set(no_banco) == esperados,
+        'planilha: uma linha por ocorrência': len(na_planilha) == len(esperados) and set(na_planilha) == esperados,
+        'sincronização sem linhas novas': inseridas_na_volta == 0,
+    }
+
+    print(f"{operadores} operadores x {gravacoes} gravações: {len(esperados)} ocorrências, "
+          f"{len(tempos)} cliques em {duracao_gravacao:.2f} s "
+          f"(planilha em dia após {duracao_total:.2f} s)")
+    if tempos:
+        quantis = statistics.quantiles(tempos, n=100)
+        print(f"gravação local: p50 {quantis[49] * 1000:.1f} ms, p95 {quantis[94] * 1000:.1f} ms, "
+              f"máx {max(tempos) * 1000:.1f} ms")
+    print(f"planilha: {planilha.envios} lotes enviados, {planilha.falhas} falhas simuladas antes do envio, "
+          f"{planilha.falhas_apos} depois ({fila.linhas_ja_enviadas} linhas conferidas e não reenviadas)")
+    for erro in erros[:5]:
+        print(f"  erro: {erro}")
+    for descricao, ok in conferencias.items():
+        print(f"  [{'ok' if ok else 'FALHOU'}] {descricao}")
+    return all(conferencias.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da gravação concorrente de ocorrências.")
+    parser.add_argument('--operadores', type=int, default=50, help="Sessões gravando ao mesmo tempo")
+    parser.add_argument('--gravacoes', type=int, default=20, help="Ocorrências gravadas por operador")
+    parser.add_argument('--repeticao', type=float, default=0.2,
+                        help="Fração das gravações com clique repetido (mesmo ID)")
+    parser.add_argument('--latencia', type=float, default=0.05, help="Latência simulada de cada envio (s)")
+    parser.add_argument('--falhas', type=float, default=0.1, help="Fração dos envios que falham")
+    parser.add_argument('--falhas-apos', type=float, default=0.05,
+                        help="Fração dos envios que falham depois de a planilha acrescentar o lote")
+    parser.add_argument('--banco', help="Arquivo do banco (padrão: pasta temporária)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = args.banco or str(Path(pasta) / 'carga.db')
+        ok = executar(args.operadores, args.gravacoes, args.repeticao, args.latencia, args.falhas,
+                      args.falhas_apos, caminho)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
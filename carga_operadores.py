@@ -0,0 +1,369 @@
+# --- Teste de Carga com Vários Operadores ---
+#
+# Sobe o formulário (Ocorrências-Streamlit_Cloud_v0.2.py) em um servidor
+# Streamlit de verdade, apontado para o servidor_planilha_local.py, e abre N
+# sessões simultâneas pelo mesmo websocket que o navegador usa. Cada sessão
+# percorre a cascata (UFV, família, SE, equipamento), preenche o formulário e
+# clica em "Gravar Ocorrência", repetindo ``--gravacoes`` vezes.
+#
+# Para cada N (de --sessoes) o servidor e a planilha são novos, e o relatório
+# traz:
+#
+#   gravações/s        gravações confirmadas na tela por segundo de teste
+#   gravar p50/p99     tempo do clique em "Gravar" até a página voltar
+#   interação p50/p99  tempo dos demais reruns (cascata, campos)
+#   reruns             execuções completas do script e execuções só de um fragmento
+#   erros              exceções na página, avisos de falha ou tempo esgotado
+#   perdidas           gravações confirmadas que não chegaram ao banco ou à planilha
+#   envios à planilha  chamadas de acréscimo feitas pelo servidor (e quantas levaram 429)
+#   memória            RSS do processo do servidor depois de aquecido e o pico
+#
+#     python carga_operadores.py --sessoes 1 10 50 100 200 --gravacoes 3 --latencia 0.3
+#
+# Como o navegador, a sessão pede só o rerun do fragmento (st.fragment) quando
+# o widget alterado está dentro de um. Com ``--modo ambos`` cada N roda também
+# com reruns sempre completos, para comparar com o comportamento anterior aos
+# fragmentos.
+#
+# O cliente usa o pacote websockets e a leitura de páginas do
+# streamlit.testing; a memória é lida de /proc (só Linux).
+
+import argparse
+import collections
+import datetime as dt
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState, WidgetStates
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+from websockets.sync.client import connect
+
+RAIZ = Path(__file__).resolve().parent
+sys.path.insert(0, str(RAIZ))
+
+from banco_ocorrencias import BancoOcorrencias  # noqa: E402
+from fila_gravacao import FilaGravacao  # noqa: E402
+from servidor_planilha_local import ABA_PADRAO, catalogo_sintetico, iniciar  # noqa: E402
+
+SCRIPT = RAIZ / 'Ocorrências-Streamlit_Cloud_v0.2.py'
+CHAVES_CASCATA = ['ufv_sel', 'fam_sel', 'se_sel', 'equip_sel']
+COLUNA_MARCADOR = "Descrição da Ocorrência"
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memoria_mb(pid):
+    """RSS atual e pico (VmHWM) do processo, em MB; (None, None) fora do Linux."""
+    try:
+        linhas = Path(f'/proc/{pid}/status').read_text().splitlines()
+    except OSError:
+        return None, None
+    valores = {nome: int(valor.split()[0]) / 1024 for nome, _, valor in (l.partition(':') for l in linhas)
+               if nome in ('VmRSS', 'VmHWM')}
+    return valores.get('VmRSS'), valores.get('VmHWM')
+
+
+class ServidorFormulario:
+    """``streamlit run`` do formulário em um subprocesso, com banco e snapshot em uma pasta própria."""
+
+    def __init__(self, pasta, armazenamento, prazo=120):
+        self.porta = porta_livre()
+        self.caminho_banco = str(Path(pasta) / 'ocorrencias.db')
+        ambiente = dict(os.environ, OCORRENCIAS_ARMAZENAMENTO=armazenamento, OCORRENCIAS_DB=self.caminho_banco,
+                        OCORRENCIAS_SNAPSHOT=str(Path(pasta) / 'catalogo.arrow'),
+                        OCORRENCIAS_METRICAS=str(Path(pasta) / 'metricas.jsonl'))
+        self.log = open(Path(pasta) / 'streamlit.log', 'wb')
+        self.processo = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', str(SCRIPT), '--server.headless', 'true',
+             '--server.port', str(self.porta), '--browser.gatherUsageStats', 'false',
+             '--server.fileWatcherType', 'none'],
+            env=ambiente, cwd=pasta, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        limite = time.monotonic() + prazo
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f"O servidor Streamlit terminou ao iniciar (veja {self.log.name})")
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{self.porta}/_stcore/health', timeout=1)
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise TimeoutError("O servidor Streamlit não respondeu a tempo")
+
+    @property
+    def url_websocket(self):
+        return f'ws://127.0.0.1:{self.porta}/_stcore/stream'
+
+    def encerrar(self):
+        self.processo.terminate()
+        try:
+            self.processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+        self.log.close()
+
+
+class Sessao:
+    """Uma aba do navegador: envia os widgets alterados e espera o script terminar de rodar.
+
+    Use com ``with``: a conexão é aberta ao entrar e fechada ao sair. Com
+    ``fragmentos=False`` todo rerun é do script inteiro, mesmo para widgets
+    dentro de um st.fragment.
+    """
+
+    def __init__(self, url, tempo_limite=60, fragmentos=True):
+        self._conectar = connect(url, subprotocols=['streamlit'], max_size=None, open_timeout=tempo_limite)
+        self.conexao = None
+        self.tempo_limite = tempo_limite
+        self.fragmentos = fragmentos
+        self.pagina = None
+        self.mensagens = []  # Mensagens que compõem a página atual
+        self.fragmento_do_widget = {}  # id do widget → id do fragmento que o desenhou
+        self.execucoes = {'completas': 0, 'fragmento': 0}
+
+    def __enter__(self):
+        self.conexao = self._conectar.__enter__()
+        return self
+
+    def __exit__(self, *erro):
+        self._conectar.__exit__(*erro)
+
+    def rerun(self, *alterados):
+        """Roda o script com os widgets ``alterados`` (WidgetState); retorna a página final (após st.rerun).
+
+        Só os widgets alterados são enviados: os demais mantêm no servidor o
+        valor da execução anterior, como se o navegador os reenviasse. Se
+        todos estão no mesmo fragmento, só ele roda e seus elementos
+        substituem os da página anterior.
+        """
+        mensagem = BackMsg()
+        mensagem.rerun_script.query_string = ''
+        mensagem.rerun_script.page_script_hash = ''
+        mensagem.rerun_script.widget_states.CopyFrom(WidgetStates(widgets=alterados))
+        fragmentos = {self.fragmento_do_widget.get(w.id, '') for w in alterados}
+        if self.fragmentos and len(fragmentos) == 1 and '' not in fragmentos:
+            mensagem.rerun_script.fragment_id = fragmentos.pop()
+        self.conexao.send(mensagem.SerializeToString())
+
+        while True:
+            recebida = ForwardMsg()
+            recebida.ParseFromString(self.conexao.recv(timeout=self.tempo_limite))
+            tipo = recebida.WhichOneof('type')
+            if tipo == 'new_session':
+                # Nova execução (inclusive após st.rerun); a de um fragmento mantém o resto da página
+                if recebida.new_session.fragment_ids_this_run:
+                    self.execucoes['fragmento'] += 1
+                else:
+                    self.execucoes['completas'] += 1
+                    self.mensagens = []
+            elif tipo == 'delta' and recebida.delta.WhichOneof('type') == 'new_element':
+                elemento = recebida.delta.new_element
+                widget = getattr(elemento, elemento.WhichOneof('type') or '', None)
+                if getattr(widget, 'id', None):
+                    self.fragmento_do_widget[widget.id] = recebida.delta.fragment_id
+            self.mensagens.append(recebida)
+            if tipo == 'script_finished' and recebida.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.pagina = parse_tree_from_messages(self.mensagens)
+        return self.pagina
+
+
+def estado(widget, **valor):
+    """Estado de um widget da página como o navegador envia (string_value, trigger_value...)."""
+    return WidgetState(id=widget.id, **valor)
+
+
+def operador(url, numero, gravacoes, pausa, largada, resultados, lock, fragmentos=True):
+    """Roteiro de uma sessão: cascata, preenchimento e gravação, ``gravacoes`` vezes."""
+    aleatorio = random.Random(numero)
+    tempos_gravar, tempos_interacao, erros, confirmadas = [], [], [], []
+
+    def interagir(sessao, lista, *alterados):
+        inicio = time.perf_counter()
+        pagina = sessao.rerun(*alterados)
+        lista.append(time.perf_counter() - inicio)
+        if pagina.exception:
+            raise RuntimeError(pagina.exception[0].message.splitlines()[0])
+        return pagina
+
+    largada.wait()
+    execucoes = {}
+    try:
+        with Sessao(url, fragmentos=fragmentos) as sessao:
+            execucoes = sessao.execucoes
+            interagir(sessao, tempos_interacao)
+            for n in range(gravacoes):
+                try:
+                    for chave in CHAVES_CASCATA:
+                        seletor = sessao.pagina.selectbox(key=chave)
+                        opcao = seletor.options[aleatorio.randrange(1, len(seletor.options))]  # 0 é "Selecione..."
+                        interagir(sessao, tempos_interacao, estado(seletor, string_value=opcao))
+                        time.sleep(pausa * aleatorio.random())
+                    marcador = f"carga {numero}-{n}"
+                    hora = dt.time(aleatorio.randrange(24), aleatorio.randrange(60)).strftime('%H:%M')
+                    interagir(sessao, tempos_interacao,
+                              estado(sessao.pagina.time_input(key='h_ini'), string_value=hora),
+                              estado(sessao.pagina.text_area(key='descr_ini_ocr'), string_value=marcador))
+                    gravar = next(b for b in sessao.pagina.button if b.label == 'Gravar Ocorrência')
+                    pagina = interagir(sessao, tempos_gravar, estado(gravar, trigger_value=True))
+                    if pagina.success:
+                        confirmadas.append(marcador)
+                    else:
+                        avisos = [e.value for e in (*pagina.error, *pagina.warning)]
+                        erros.append(f"gravação sem confirmação: {avisos[:1]}")
+                except Exception as e:  # Segue para a próxima gravação, como o operador faria
+                    erros.append(f"{type(e).__name__}: {e}")
+    except Exception as e:  # Conexão recusada ou perdida
+        erros.append(f"{type(e).__name__}: {e}")
+    with lock:
+        resultados['gravar'].extend(tempos_gravar)
+        resultados['interacao'].extend(tempos_interacao)
+        resultados['erros'].extend(erros)
+        resultados['confirmadas'].extend(confirmadas)
+        for tipo, quantidade in execucoes.items():
+            resultados['execucoes'][tipo] += quantidade
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def executar_nivel(n_sessoes, gravacoes, pausa, latencia, taxa_erro, cota, espera_envio, catalogo,
+                   fragmentos=True):
+    """Um servidor novo com ``n_sessoes`` operadores simultâneos; retorna a linha do relatório."""
+    planilha = iniciar(0, latencia=latencia, variacao=latencia / 2, taxa_erro=taxa_erro, cota=cota)
+    planilha.planilhas.definir('catalogo', ABA_PADRAO, catalogo)
+    with tempfile.TemporaryDirectory() as pasta:
+        servidor = ServidorFormulario(pasta, planilha.url)
+        try:
+            # Primeira sessão sozinha: carrega o catálogo e aquece o processo antes da medição
+            with Sessao(servidor.url_websocket) as aquecimento:
+                aquecimento.rerun()
+            rss_inicial, _ = memoria_mb(servidor.processo.pid)
+
+            resultados = {'gravar': [], 'interacao': [], 'erros': [], 'confirmadas': [],
+                          'execucoes': collections.Counter()}
+            lock = threading.Lock()
+            largada = threading.Barrier(n_sessoes)
+            rss_pico = [rss_inicial]
+            terminou = threading.Event()
+
+            def amostrar_memoria():
+                while not terminou.wait(0.25):
+                    rss, _ = memoria_mb(servidor.processo.pid)
+                    if rss is not None:
+                        rss_pico[0] = max(rss_pico[0] or 0, rss)
+
+            amostrador = threading.Thread(target=amostrar_memoria, daemon=True)
+            amostrador.start()
+            threads = [threading.Thread(target=operador, args=(servidor.url_websocket, i, gravacoes, pausa,
+                                                               largada, resultados, lock, fragmentos))
+                       for i in range(n_sessoes)]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duracao = time.perf_counter() - inicio
+            terminou.set()
+
+            # Espera a fila do servidor enviar tudo para a planilha antes de conferir
+            fila = FilaGravacao(servidor.caminho_banco, enviar=None)
+            limite = time.monotonic() + espera_envio
+            while fila.pendentes() and time.monotonic() < limite:
+                time.sleep(0.2)
+            no_banco = BancoOcorrencias(servidor.caminho_banco).ler()[COLUNA_MARCADOR]
+            valores = planilha.planilhas.ler('ocorrencias', 'Ocorrências')
+            na_planilha = pd.DataFrame(valores[1:], columns=valores[0])[COLUNA_MARCADOR] if valores else pd.Series()
+        finally:
+            servidor.encerrar()
+            planilha.shutdown()
+
+    confirmadas = set(resultados['confirmadas'])
+    gravar, interacao = resultados['gravar'], resultados['interacao']
+    return {
+        'sessões': n_sessoes,
+        'modo': 'fragmentos' if fragmentos else 'completo',
+        'gravações': len(confirmadas),
+        'gravações/s': len(confirmadas) / duracao,
+        'gravar p50 (ms)': _ms(percentil(gravar, 50)),
+        'gravar p99 (ms)': _ms(percentil(gravar, 99)),
+        'interação p50 (ms)': _ms(percentil(interacao, 50)),
+        'interação p99 (ms)': _ms(percentil(interacao, 99)),
+        'reruns completos': resultados['execucoes']['completas'],
+        'reruns de fragmento': resultados['execucoes']['fragmento'],
+        'erros': len(resultados['erros']),
+        'perdidas no banco': len(confirmadas - set(no_banco)),
+        'perdidas na planilha': len(confirmadas - set(na_planilha)),
+        'duplicadas na planilha': int(na_planilha[na_planilha.isin(confirmadas)].duplicated().sum()),
+        'envios à planilha': planilha.requisicoes['acrescimo'],
+        'respostas 429': planilha.requisicoes['429'],
+        'RSS inicial (MB)': rss_inicial,
+        'RSS pico (MB)': rss_pico[0],
+    }, resultados['erros']
+
+
+def _ms(segundos):
+    return None if segundos is None else segundos * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga de vários operadores no formulário, por websocket.")
+    parser.add_argument('--sessoes', type=int, nargs='+', default=[1, 10, 50, 100, 200],
+                        help="Números de sessões simultâneas a testar")
+    parser.add_argument('--gravacoes', type=int, default=3, help="Ocorrências gravadas por sessão")
+    parser.add_argument('--pausa', type=float, default=0.5, help="Pausa máxima entre interações (s)")
+    parser.add_argument('--latencia', type=float, default=0.3, help="Latência da planilha local (s)")
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help="Fração das requisições à planilha com 503")
+    parser.add_argument('--cota', type=int, help="Requisições por minuto aceitas pela planilha local (429 acima)")
+    parser.add_argument('--espera-envio', type=float, default=120,
+                        help="Tempo máximo de espera pelo envio da fila ao final (s)")
+    parser.add_argument('--equipamentos', type=int, default=40, help="Equipamentos por SE no catálogo sintético")
+    parser.add_argument('--modo', choices=['fragmentos', 'completo', 'ambos'], default='fragmentos',
+                        help="Reruns só do fragmento alterado (como o navegador), sempre do script inteiro, ou os dois")
+    parser.add_argument('--saida', help="Arquivo CSV para gravar o relatório")
+    args = parser.parse_args()
+
+    catalogo = catalogo_sintetico(equipamentos=args.equipamentos)
+    modos = {'fragmentos': [True], 'completo': [False], 'ambos': [False, True]}[args.modo]
+    linhas = []
+    for n in args.sessoes:
+        for fragmentos in modos:
+            print(f"{n} sessão(ões), reruns {'de fragmento' if fragmentos else 'completos'}...", flush=True)
+            linha, erros = executar_nivel(n, args.gravacoes, args.pausa, args.latencia, args.taxa_erro, args.cota,
+                                          args.espera_envio, catalogo, fragmentos)
+            linhas.append(linha)
+            for erro in erros[:3]:
+                print(f"  erro: {erro}")
+
+    relatorio = pd.DataFrame(linhas).set_index(['sessões', 'modo'])
+    print()
+    print(relatorio.to_string(float_format='{:.1f}'.format))
+    if args.saida:
+        relatorio.to_csv(args.saida)
+    perdidas = relatorio[['perdidas no banco', 'perdidas na planilha', 'duplicadas na planilha']].to_numpy().sum()
+    sys.exit(1 if perdidas else 0)
+
+
+if __name__ == '__main__':
+    main()
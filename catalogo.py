@@ -0,0 +1,482 @@
+# --- Catálogo de Equipamentos ---
+#
+# Funções compartilhadas pelos scripts do formulário para carregar a listagem
+# de equipamentos e montar, a partir dela, as estruturas usadas nos seletores.
+#
+# A listagem original (xlsx local ou CSV exportado da planilha) é compilada em
+# um snapshot colunar no disco, com colunas categóricas. Na inicialização o
+# snapshot é lido por memory-map e a origem só é lida de novo quando mudar:
+#
+#     python catalogo.py "Listagem de equipamentos.xlsx" catalogo.arrow
+#
+# Em memória o catálogo fica em um único CatalogoCompartilhado por processo,
+# lido por todas as sessões sem cópia. O AtualizadorCatalogo verifica a origem
+# em segundo plano e, quando ela muda, monta o novo catálogo (com os índices)
+# fora das requisições e o troca de uma vez. Para ver o consumo por linha:
+#
+#     python catalogo.py --memoria "Listagem de equipamentos.xlsx"
+
+import bisect
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+import unicodedata
+import urllib.request
+from functools import cached_property
+from pathlib import Path
+
+import pandas as pd
+
+COLUNAS_CASCATA = ['UFV', 'família do equipamento', 'SE', 'equipamento']
+
+# Snapshots de origens sem assinatura confiável (URLs sem ETag/Last-Modified) valem por este tempo
+VALIDADE_SNAPSHOT_URL = 60 * 60
+
+
+def _pyarrow():
+    """Módulo pyarrow, importado no primeiro uso (só o snapshot precisa dele); None se não instalado."""
+    try:
+        import pyarrow as pa
+        import pyarrow.feather  # noqa: F401
+    except ImportError:  # Sem pyarrow o snapshot é gravado em pickle
+        return None
+    return pa
+
+
+def _eh_url(origem):
+    return str(origem).startswith(('http://', 'https://'))
+
+
+def url_csv_planilha(spreadsheet_url):
+    """URL de exportação CSV (gviz) a partir do link de compartilhamento da planilha.
+
+    Mantém o servidor do link, para que a mesma rotina leia do Google ou do
+    servidor_planilha_local.py.
+    """
+    servidor, spreadsheet_id = re.match(r"(https?://[^/]+)/spreadsheets/d/([^/]+)", spreadsheet_url).groups()
+    return f"{servidor}/spreadsheets/d/{spreadsheet_id}/gviz/tq?tqx=out:csv&tqs=0"
+
+
+def ler_origem(origem):
+    """Lê a listagem de equipamentos da origem: link de planilha Google, CSV, xlsx ou um Armazenamento."""
+    if hasattr(origem, 'ler_catalogo'):
+        return origem.ler_catalogo()
+    origem = str(origem)
+    if _eh_url(origem):
+        if "/spreadsheets/d/" in origem and "gviz" not in origem:
+            origem = url_csv_planilha(origem)
+        return pd.read_csv(origem)
+    if origem.lower().endswith('.csv'):
+        return pd.read_csv(origem)
+    return pd.read_excel(origem)
+
+
+def assinatura_origem(origem):
+    """Identifica a versão da origem sem baixá-la; None quando não há como saber."""
+    if hasattr(origem, 'assinatura_catalogo'):
+        return origem.assinatura_catalogo()
+    if not _eh_url(origem):
+        estado = os.stat(origem)
+        return f"{estado.st_mtime_ns}-{estado.st_size}"
+    url = url_csv_planilha(origem) if "/spreadsheets/d/" in origem and "gviz" not in origem else origem
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method='HEAD'), timeout=5) as resposta:
+            cabecalho = resposta.headers.get('ETag') or resposta.headers.get('Last-Modified')
+    except OSError:
+        return None
+    return cabecalho
+
+
+def identificar_origem(origem):
+    """Texto que identifica de onde o catálogo vem, guardado junto do snapshot."""
+    if hasattr(origem, 'identificacao_catalogo'):
+        return origem.identificacao_catalogo()
+    if _eh_url(origem):
+        return str(origem)
+    return str(Path(origem).resolve())
+
+
+def _caminho_meta(destino):
+    return Path(str(destino) + '.json')
+
+
+def compactar_catalogo(dados):
+    """Converte as colunas de texto em categóricas: cada texto distinto é guardado uma única vez."""
+    compacto = dados.copy()
+    for coluna in compacto.columns:
+        if compacto[coluna].dtype == object or pd.api.types.is_string_dtype(compacto[coluna]):
+            compacto[coluna] = compacto[coluna].astype('category')
+    return compacto
+
+
+def compilar_snapshot(dados, destino, assinatura=None, origem=None):
+    """Grava o catálogo como snapshot colunar, com as colunas de texto categóricas.
+
+    ``origem`` (ver ``identificar_origem``) fica registrada nos metadados para
+    que um snapshot compilado de outra origem nunca seja reaproveitado.
+    """
+    destino = Path(destino)
+    compacto = compactar_catalogo(dados)
+
+    temporario = destino.with_name(destino.name + '.tmp')
+    pa = _pyarrow()
+    if pa is not None:
+        pa.feather.write_feather(compacto.reset_index(drop=True), temporario, compression='uncompressed')
+    else:
+        with open(temporario, 'wb') as arquivo:
+            pickle.dump(compacto, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, destino)
+    _caminho_meta(destino).write_text(
+        json.dumps({'origem': origem, 'assinatura': assinatura, 'compilado_em': time.time()}), encoding='utf-8')
+
+
+def ler_snapshot(destino):
+    """Lê o snapshot; com pyarrow o arquivo é mapeado em memória em vez de copiado."""
+    pa = _pyarrow()
+    if pa is not None:
+        with pa.memory_map(str(destino), 'r') as fonte:
+            tabela = pa.ipc.open_file(fonte).read_all()
+        return tabela.to_pandas()
+    with open(destino, 'rb') as arquivo:
+        return pickle.load(arquivo)
+
+
+def carregar_catalogo(origem, destino):
+    """Carrega o catálogo do snapshot, recompilando-o apenas se a origem mudou.
+
+    Um snapshot compilado de outra origem (mesmo arquivo de destino usado por
+    scripts diferentes) é sempre recompilado, com ou sem assinatura.
+    """
+    destino = Path(destino)
+    identificacao = identificar_origem(origem)
+    meta = {}
+    if destino.exists() and _caminho_meta(destino).exists():
+        meta = json.loads(_caminho_meta(destino).read_text(encoding='utf-8'))
+    if meta.get('origem') != identificacao:
+        meta = {}
+
+    assinatura = assinatura_origem(origem)
+    if meta:
+        if assinatura is not None and meta.get('assinatura') == assinatura:
+            return ler_snapshot(destino)
+        if assinatura is None and time.time() - meta.get('compilado_em', 0) < VALIDADE_SNAPSHOT_URL:
+            return ler_snapshot(destino)
+
+    compilar_snapshot(ler_origem(origem), destino, assinatura, identificacao)
+    return ler_snapshot(destino)
+
+
+def relatorio_memoria(dados):
+    """Bytes ocupados por coluna e por linha do catálogo (inclui o conteúdo dos textos)."""
+    uso = dados.memory_usage(deep=True, index=True)
+    uso['Total'] = uso.sum()
+    return pd.DataFrame({'bytes': uso, 'bytes por linha': uso / max(len(dados), 1)})
+
+
+class CatalogoCompartilhado:
+    """Catálogo mantido uma única vez por processo e lido por todas as sessões.
+
+    Guarde a instância com ``st.cache_resource`` (que não serializa nem copia o
+    valor, ao contrário de ``st.cache_data``). ``dados`` devolve uma cópia rasa:
+    nenhum dado é copiado na leitura, e o DataFrame recebido deve ser tratado
+    como somente leitura. Só com copy-on-write (padrão a partir do pandas 3,
+    ou ``mode.copy_on_write`` ligado pelo script) uma sessão que o altere não
+    afeta as demais. O índice da cascata é montado junto e também é
+    compartilhado, somente para leitura.
+    """
+
+    def __init__(self, dados):
+        self._dados = compactar_catalogo(dados)
+        if set(COLUNAS_CASCATA) <= set(self._dados.columns):
+            self.indice = construir_indice_cascata(self._dados)
+        else:
+            self.indice = {}
+
+    @property
+    def dados(self):
+        return self._dados.copy(deep=False)
+
+    @cached_property
+    def busca(self):
+        """Índice de busca por digitação sobre todos os caminhos de equipamento."""
+        return IndiceBusca(caminhos_cascata(self.indice))
+
+    def __len__(self):
+        return len(self._dados)
+
+    @cached_property
+    def chaves_caminhos(self):
+        """Caminhos completos do catálogo em forma de chave, para conferências vetorizadas."""
+        if not set(COLUNAS_CASCATA) <= set(self._dados.columns):
+            return pd.Index([], dtype=object)
+        return chaves_caminhos(self._dados[COLUNAS_CASCATA])
+
+    def relatorio_memoria(self):
+        return relatorio_memoria(self._dados)
+
+
+def hash_conteudo(dados):
+    """Hash do conteúdo do catálogo (colunas e valores), igual para texto e categóricas."""
+    hash_ = hashlib.sha1('\x1f'.join(map(str, dados.columns)).encode('utf-8'))
+    hash_.update(pd.util.hash_pandas_object(dados, index=False).to_numpy().tobytes())
+    return hash_.hexdigest()
+
+
+class AtualizadorCatalogo:
+    """Mantém o catálogo do processo em dia sem que nenhuma sessão espere pela recarga.
+
+    Uma thread em segundo plano consulta a origem a cada ``intervalo``
+    segundos. A assinatura (mtime/tamanho do arquivo ou ETag/Last-Modified da
+    URL) evita o download quando nada mudou; sem assinatura, a listagem é
+    baixada e comparada pelo hash do conteúdo. Só quando o conteúdo muda o
+    novo CatalogoCompartilhado é montado, com os índices da cascata e da
+    busca prontos, e entra no lugar do anterior em uma única atribuição.
+    Sessões que já leram ``atual`` seguem com o catálogo antigo até o rerun.
+    """
+
+    def __init__(self, origem, destino, intervalo=300.0, espera_maxima=3600.0):
+        self.origem = origem
+        self.destino = Path(destino)
+        self.intervalo = intervalo
+        self.espera_maxima = espera_maxima
+        self.versao = 0
+        self.atualizado_em = None
+        self.ultimo_erro = None
+        self.falhas_seguidas = 0
+        self._atual = CatalogoCompartilhado(pd.DataFrame())
+        self._assinatura = None
+        self._hash = None
+        self._thread = None
+
+    @property
+    def atual(self):
+        return self._atual
+
+    def _trocar(self, dados, assinatura, hash_, preparar_indices):
+        novo = CatalogoCompartilhado(dados)
+        if preparar_indices:
+            novo.busca, novo.chaves_caminhos  # noqa: B018 — monta os índices antes da troca
+        self._assinatura, self._hash = assinatura, hash_
+        self._atual = novo
+        self.versao += 1
+        self.atualizado_em = time.time()
+
+    def carregar(self):
+        """Carga inicial, pelo snapshot local quando ele está em dia (``carregar_catalogo``)."""
+        dados = carregar_catalogo(self.origem, self.destino)
+        meta = json.loads(_caminho_meta(self.destino).read_text(encoding='utf-8')) \
+            if _caminho_meta(self.destino).exists() else {}
+        self._trocar(dados, meta.get('assinatura'), hash_conteudo(dados), preparar_indices=False)
+
+    def verificar(self):
+        """Confere a origem uma vez e troca o catálogo se o conteúdo mudou. Retorna True se trocou."""
+        assinatura = assinatura_origem(self.origem)
+        if assinatura is not None and assinatura == self._assinatura:
+            return False
+        dados = ler_origem(self.origem)
+        hash_ = hash_conteudo(compactar_catalogo(dados))
+        if hash_ == self._hash:
+            self._assinatura = assinatura
+            return False
+        compilar_snapshot(dados, self.destino, assinatura, identificar_origem(self.origem))
+        self._trocar(dados, assinatura, hash_, preparar_indices=True)
+        return True
+
+    def iniciar(self):
+        """Inicia a thread de verificação, se ainda não estiver rodando."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._executar, name='atualizador-catalogo', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            # Após falhas (origem fora do ar) o intervalo dobra, até espera_maxima
+            time.sleep(min(self.intervalo * 2 ** self.falhas_seguidas, self.espera_maxima))
+            try:
+                self.verificar()
+            except Exception as e:
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                self.falhas_seguidas += 1
+            else:
+                self.ultimo_erro = None
+                self.falhas_seguidas = 0
+
+
+def construir_indice_cascata(dados):
+    """Monta o índice aninhado UFV → família → SE → [equipamentos], já ordenado.
+
+    O DataFrame é percorrido uma única vez; cada nível do dicionário é criado
+    em ordem alfabética, de forma que as chaves já saem prontas para os
+    seletores sem novos filtros ou ordenações a cada rerun.
+    """
+    base = dados[COLUNAS_CASCATA].dropna().drop_duplicates().sort_values(COLUNAS_CASCATA)
+
+    indice = {}
+    for ufv, fam, se, equip in base.itertuples(index=False, name=None):
+        indice.setdefault(ufv, {}).setdefault(fam, {}).setdefault(se, []).append(equip)
+    return indice
+
+
+def opcoes_cascata(indice, *selecao):
+    """Retorna as opções do próximo nível da cascata para a seleção informada.
+
+    Exemplos: ``opcoes_cascata(indice)`` lista as UFVs;
+    ``opcoes_cascata(indice, ufv, fam)`` lista as SEs daquela UFV/família.
+    Seleções inexistentes retornam lista vazia.
+    """
+    nivel = indice
+    for chave in selecao:
+        nivel = nivel.get(chave, {}) if isinstance(nivel, dict) else {}
+    return list(nivel)
+
+
+
+SEPARADOR_CHAVE = '\x1f'
+
+
+def chaves_caminhos(niveis):
+    """Junta as quatro colunas (UFV, família, SE, equipamento) em uma chave de texto por linha.
+
+    Aceita qualquer DataFrame com os quatro níveis nessa ordem, com os nomes
+    do catálogo ou os da planilha de ocorrências.
+    """
+    colunas = [niveis.iloc[:, i].astype('string').fillna('').str.strip() for i in range(4)]
+    chaves = colunas[0]
+    for coluna in colunas[1:]:
+        chaves = chaves + SEPARADOR_CHAVE + coluna
+    return pd.Index(chaves.astype(object))
+
+
+def caminhos_cascata(indice):
+    """Lista os caminhos completos (UFV, família, SE, equipamento) do índice da cascata."""
+    return [
+        (ufv, fam, se, equip)
+        for ufv, familias in indice.items()
+        for fam, subestacoes in familias.items()
+        for se, equipamentos in subestacoes.items()
+        for equip in equipamentos
+    ]
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos, para comparar o que é digitado com o catálogo."""
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _tokens(texto):
+    return [t for t in re.split(r'[^0-9a-z]+', normalizar(texto)) if t]
+
+
+class IndiceBusca:
+    """Busca por digitação sobre os caminhos UFV → família → SE → equipamento.
+
+    Cada palavra de cada caminho entra em uma lista ordenada de (palavra, id),
+    de forma que uma palavra digitada pela metade vira um intervalo encontrado
+    por busca binária. Com várias palavras, parte-se da mais seletiva e as
+    demais filtram os caminhos do intervalo dela, que é percorrido até juntar
+    MAX_CANDIDATOS caminhos que atendem a todas. Se nenhuma palavra casar
+    como prefixo, a busca cai para trigramas, que encontram trechos no meio
+    dos nomes (por exemplo "52-1" em "DJ52-1").
+    """
+
+    # Caminhos que atendem a todas as palavras ordenados por relevância em cada consulta;
+    # limita o custo de palavras muito comuns
+    MAX_CANDIDATOS = 500
+
+    def __init__(self, caminhos):
+        self.caminhos = list(caminhos)
+        self._textos = [' '.join(normalizar(p) for p in caminho) for caminho in self.caminhos]
+        self._palavras_caminho = [tuple(set(_tokens(texto))) for texto in self._textos]
+        self._equipamentos = [normalizar(caminho[3]) for caminho in self.caminhos]
+        self._palavras_equip = [tuple(_tokens(equipamento)) for equipamento in self._equipamentos]
+        self._compactos = [re.sub(r'[^0-9a-z]', '', equipamento) for equipamento in self._equipamentos]
+
+        pares = sorted((token, i) for i, palavras in enumerate(self._palavras_caminho) for token in palavras)
+        self._palavras = [token for token, _ in pares]
+        self._ids = [i for _, i in pares]
+
+        self._trigramas = {}
+        for i, compacto in enumerate(self._compactos):
+            for trigrama in {compacto[j:j + 3] for j in range(len(compacto) - 2)}:
+                self._trigramas.setdefault(trigrama, []).append(i)
+
+    def __len__(self):
+        return len(self.caminhos)
+
+    def _intervalo(self, prefixo):
+        inicio = bisect.bisect_left(self._palavras, prefixo)
+        fim = bisect.bisect_left(self._palavras, prefixo + '\uffff')
+        return inicio, fim
+
+    def _por_prefixo(self, termos):
+        intervalos = sorted((self._intervalo(t) for t in termos), key=lambda r: r[1] - r[0])
+        inicio, fim = intervalos[0]
+        # Todas as palavras são aplicadas durante a varredura; o limite vale só para o que atende a todas
+        encontrados, vistos = [], set()
+        for i in self._ids[inicio:fim]:
+            if i in vistos:
+                continue
+            vistos.add(i)
+            if len(termos) == 1 or all(any(p.startswith(t) for p in self._palavras_caminho[i]) for t in termos):
+                encontrados.append(i)
+                if len(encontrados) >= self.MAX_CANDIDATOS:
+                    break
+        return encontrados
+
+    def _por_trigrama(self, consulta):
+        compacto = re.sub(r'[^0-9a-z]', '', consulta)
+        grupos = [self._trigramas.get(compacto[j:j + 3], []) for j in range(len(compacto) - 2)]
+        if not grupos:
+            return []
+        grupos.sort(key=len)
+        candidatos = set(grupos[0])
+        for grupo in grupos[1:]:
+            candidatos.intersection_update(grupo)
+        return [i for i in sorted(candidatos) if compacto in self._compactos[i]][:self.MAX_CANDIDATOS]
+
+    def buscar(self, consulta, limite=10):
+        """Retorna até ``limite`` caminhos (UFV, família, SE, equipamento), os mais relevantes primeiro."""
+        consulta = normalizar(consulta).strip()
+        termos = _tokens(consulta)
+        if not termos:
+            return []
+
+        encontrados = self._por_prefixo(termos) or self._por_trigrama(consulta)
+
+        def relevancia(i):
+            equipamento = self._equipamentos[i]
+            if equipamento == consulta:
+                nivel = 0
+            elif equipamento.startswith(consulta):
+                nivel = 1
+            elif all(any(p.startswith(t) for p in self._palavras_equip[i]) for t in termos):
+                nivel = 2
+            else:
+                nivel = 3
+            return nivel, len(equipamento), self._textos[i]
+
+        return [self.caminhos[i] for i in sorted(encontrados, key=relevancia)[:limite]]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--memoria':
+        original = ler_origem(sys.argv[2])
+        print(f"Catálogo com {len(original)} linhas\n")
+        print("Como lido da origem:")
+        print(relatorio_memoria(original).to_string(float_format='{:.1f}'.format))
+        print("\nCompartilhado (colunas categóricas):")
+        print(CatalogoCompartilhado(original).relatorio_memoria().to_string(float_format='{:.1f}'.format))
+        sys.exit()
+    if len(sys.argv) != 3:
+        sys.exit('uso: python catalogo.py <origem: xlsx, csv ou link da planilha> <snapshot de destino>\n'
+                 '     python catalogo.py --memoria <origem>')
+    origem_cli, destino_cli = sys.argv[1], sys.argv[2]
+    compilar_snapshot(ler_origem(origem_cli), destino_cli, assinatura_origem(origem_cli),
+                      identificar_origem(origem_cli))
+    print(f"Snapshot gravado em {destino_cli}")
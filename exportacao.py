@@ -0,0 +1,96 @@
+# --- Exportação do Histórico de Ocorrências ---
+#
+# Grava o histórico em CSV, Parquet ou Excel lendo o banco local em blocos
+# (BancoOcorrencias.exportar_blocos): cada bloco é escrito no arquivo e
+# descartado antes do próximo, de modo que a memória usada pelos dados não
+# cresce com o tamanho do histórico. O arquivo é montado em um arquivo
+# temporário no disco, não em memória.
+
+import io
+import tempfile
+
+import pandas as pd
+
+# Formato → (extensão, tipo MIME)
+FORMATOS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Excel (XLSX)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# Uma planilha do Excel tem no máximo 1.048.576 linhas, contando o cabeçalho
+LIMITE_LINHAS_XLSX = 1_048_575
+
+
+def escrever_csv(blocos, arquivo):
+    """CSV em UTF-8 com BOM (abre com acentos corretos no Excel); ``arquivo`` é binário."""
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='', write_through=True)
+    linhas = 0
+    for bloco in blocos:
+        bloco.to_csv(texto, header=linhas == 0, index=False)
+        linhas += len(bloco)
+    texto.detach()  # Devolve o arquivo sem fechá-lo
+    return linhas
+
+
+def escrever_parquet(blocos, arquivo):
+    """Parquet com um row group por bloco; todas as colunas como texto."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    linhas = 0
+    try:
+        for bloco in blocos:
+            if escritor is None:
+                esquema = pa.schema([(str(coluna), pa.string()) for coluna in bloco.columns])
+                escritor = pq.ParquetWriter(arquivo, esquema, compression='zstd')
+            escritor.write_table(pa.Table.from_pandas(bloco.astype('string'), schema=esquema, preserve_index=False))
+            linhas += len(bloco)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return linhas
+
+
+def escrever_xlsx(blocos, arquivo):
+    """Excel no modo de escrita sequencial do openpyxl, que não mantém as células em memória."""
+    from openpyxl import Workbook
+
+    pasta = Workbook(write_only=True)
+    planilha = pasta.create_sheet('Ocorrências')
+    linhas = 0
+    for bloco in blocos:
+        if linhas == 0:
+            planilha.append([str(coluna) for coluna in bloco.columns])
+        if linhas + len(bloco) > LIMITE_LINHAS_XLSX:
+            raise ValueError(f"O Excel comporta no máximo {LIMITE_LINHAS_XLSX} linhas; "
+                             "aplique filtros ou exporte em CSV/Parquet.")
+        for registro in bloco.astype(object).where(bloco.notna(), None).itertuples(index=False, name=None):
+            planilha.append(registro)
+        linhas += len(bloco)
+    pasta.save(arquivo)
+    return linhas
+
+
+_ESCRITORES = {'CSV': escrever_csv, 'Parquet': escrever_parquet, 'Excel (XLSX)': escrever_xlsx}
+
+
+def exportar(blocos, formato, arquivo=None):
+    """Escreve os blocos (iterável de DataFrames com as mesmas colunas) no formato pedido.
+
+    Sem ``arquivo``, usa um arquivo temporário que é apagado ao ser fechado.
+    Retorna o arquivo binário posicionado no início, pronto para leitura.
+    """
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    if arquivo is None:
+        arquivo = tempfile.TemporaryFile()
+    _ESCRITORES[formato](blocos, arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def nome_arquivo(formato, prefixo='ocorrencias'):
+    """Nome do arquivo de download com a data e hora da exportação."""
+    return f"{prefixo}_{pd.Timestamp.now():%Y%m%d_%H%M}.{FORMATOS[formato][0]}"
@@ -0,0 +1,367 @@
+# --- Fila Local de Gravação (write-ahead) ---
+#
+# As ocorrências são gravadas primeiro em um journal SQLite no disco local e
+# uma thread em segundo plano, compartilhada por todas as sessões do processo,
+# envia as linhas pendentes para a planilha em lotes, com novas tentativas.
+#
+# Um envio que falha sem resposta clara (tempo esgotado, 5xx) pode ter sido
+# aplicado mesmo assim. Antes de reenviar esse lote, a fila confere quais
+# linhas já estão no destino e só envia as demais, para não duplicá-las.
+#
+# A thread é o único ponto do processo que chama a API da planilha: as
+# gravações que chegam dentro de uma janela curta saem juntas em uma só
+# chamada, as chamadas respeitam a cota por minuto da API e, em erros (429 de
+# cota, 5xx), a nova tentativa espera um tempo exponencial com variação
+# aleatória, para que várias instâncias não tentem todas ao mesmo tempo.
+#
+# Além dos acréscimos, a fila guarda alterações de células de linhas que já
+# estão na planilha (por exemplo o término de uma ocorrência encerrada). Elas
+# esperam até a linha ter posição conhecida na aba e saem, várias por
+# chamada, depois dos acréscimos. Falhas nas alterações têm contagem, espera
+# e mensagem próprias: não atrasam os acréscimos. Uma alteração cuja linha não
+# é mais encontrada na aba (apagada ou modificada à mão) não é tentada de novo:
+# vai para a tabela alteracoes_descartadas, para ser conferida e corrigida.
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+
+def codigo_http(erro):
+    """Status HTTP de um erro de API (urllib, gspread, googleapiclient); None se não houver."""
+    for origem in (erro, getattr(erro, 'response', None), getattr(erro, 'resp', None)):
+        for atributo in ('code', 'status_code', 'status'):
+            valor = getattr(origem, atributo, None)
+            if isinstance(valor, int):
+                return valor
+    return None
+
+
+def _retry_after(erro):
+    """Segundos pedidos no cabeçalho Retry-After da resposta de erro, se houver."""
+    cabecalhos = getattr(erro, 'headers', None) or getattr(getattr(erro, 'response', None), 'headers', None)
+    try:
+        return float(cabecalhos.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class CotaPorMinuto:
+    """Chamadas feitas à API nos últimos 60 s, para não passar do limite por minuto."""
+
+    def __init__(self, limite, janela=60.0):
+        self.limite = limite
+        self.janela = janela
+        self._chamadas = deque()
+        self._bloqueada_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _descartar_antigas(self, agora):
+        while self._chamadas and agora - self._chamadas[0] >= self.janela:
+            self._chamadas.popleft()
+
+    def restante(self):
+        """Chamadas ainda disponíveis na janela atual."""
+        agora = time.monotonic()
+        with self._lock:
+            if agora < self._bloqueada_ate:
+                return 0
+            self._descartar_antigas(agora)
+            return max(0, self.limite - len(self._chamadas))
+
+    def espera(self):
+        """Segundos até a próxima chamada caber na cota (0 se já cabe)."""
+        agora = time.monotonic()
+        with self._lock:
+            self._descartar_antigas(agora)
+            livre_em = self._chamadas[0] + self.janela if len(self._chamadas) >= self.limite else agora
+            return max(0.0, livre_em - agora, self._bloqueada_ate - agora)
+
+    def registrar(self):
+        with self._lock:
+            self._chamadas.append(time.monotonic())
+
+    def esgotar(self, segundos):
+        """A API respondeu que a cota acabou (429): nenhuma chamada pelos próximos ``segundos``."""
+        with self._lock:
+            self._bloqueada_ate = max(self._bloqueada_ate, time.monotonic() + segundos)
+
+
+class FilaGravacao:
+    """Journal local de ocorrências ainda não enviadas ao destino remoto.
+
+    ``enviar`` recebe um DataFrame com um lote de linhas e deve acrescentá-las
+    no destino (por exemplo ``conn.add_rows``). As linhas só saem do journal
+    depois que o envio do lote termina sem erro. ``conferir`` recebe o lote
+    antes de um reenvio (após uma falha, ou na primeira vez, para o que
+    ficou de uma execução anterior) e devolve uma máscara das linhas que já
+    estão no destino; essas saem do journal sem serem enviadas de novo.
+
+    ``localizar(ids)`` devolve {id: posição na aba} das linhas que já estão
+    no destino. ``alterar`` recebe {id: {coluna: valor}}, essas posições (só
+    uma indicação, que o destino confere) e as conferências de conteúdo das
+    linhas sem ID ({id: {coluna: valor}}), grava as células e retorna os IDs
+    alterados. Sem eles as alterações ficam só no journal.
+
+    ``janela_agrupamento`` é quanto o envio espera, depois de acordado por uma
+    gravação, para juntar as que chegarem em seguida no mesmo lote.
+    ``cota_por_minuto`` limita as chamadas a ``enviar`` e ``alterar`` (None: sem limite).
+    """
+
+    def __init__(self, caminho, enviar, tamanho_lote=100, intervalo=2.0, espera_maxima=60.0,
+                 janela_agrupamento=0.0, cota_por_minuto=None, alterar=None, localizar=None, conferir=None):
+        self.caminho = str(caminho)
+        self.enviar = enviar
+        self.conferir = conferir
+        self.alterar = alterar
+        self.localizar = localizar
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.espera_maxima = espera_maxima
+        self.janela_agrupamento = janela_agrupamento
+        self.cota = CotaPorMinuto(cota_por_minuto) if cota_por_minuto else None
+        self.ultimo_erro = None
+        self.ultimo_status = None
+        self.falhas_seguidas = 0
+        self.proxima_tentativa = None  # time.time() da próxima tentativa após uma falha
+        self.ultimo_erro_alteracoes = None
+        self.falhas_alteracoes = 0
+        self.proxima_alteracao = None  # time.time() da próxima tentativa das alterações após uma falha
+        self.chamadas = 0
+        self.linhas_enviadas = 0
+        self.linhas_ja_enviadas = 0  # Encontradas no destino na conferência antes de um reenvio
+        self._envio_incerto = False  # O último envio falhou e pode ter sido aplicado
+        self._acordar = threading.Event()
+        self._thread = None
+
+        with self._conectar() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pendentes ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " dados TEXT NOT NULL,"
+                " criado_em REAL NOT NULL)"
+            )
+            # Uma alteração pendente por linha: alterar de novo antes do envio substitui a anterior
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS alteracoes_pendentes ("
+                " uid TEXT PRIMARY KEY,"
+                " valores TEXT NOT NULL,"
+                " criado_em REAL NOT NULL)"
+            )
+            if "conferencia" not in {linha[1] for linha in db.execute("PRAGMA table_info(alteracoes_pendentes)")}:
+                db.execute("ALTER TABLE alteracoes_pendentes ADD COLUMN conferencia TEXT")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS alteracoes_descartadas ("
+                " uid TEXT PRIMARY KEY,"
+                " valores TEXT NOT NULL,"
+                " motivo TEXT NOT NULL,"
+                " criado_em REAL NOT NULL)"
+            )
+        # Linhas que ficaram de uma execução anterior podem ter sido enviadas logo antes da interrupção
+        self._envio_incerto = self.pendentes() > 0
+
+    def _conectar(self):
+        db = sqlite3.connect(self.caminho, timeout=30)
+        db.execute("PRAGMA synchronous=FULL")
+        return db
+
+    def enfileirar(self, linhas, db=None):
+        """Grava as linhas do DataFrame no journal local e acorda o envio.
+
+        Se ``db`` for informado, a inserção usa essa conexão (que deve apontar
+        para o mesmo arquivo) e entra na transação de quem chamou.
+        """
+        registros = linhas.to_dict(orient='records')
+        agora = time.time()
+        valores = [(json.dumps(r, ensure_ascii=False, default=str), agora) for r in registros]
+        if db is not None:
+            db.executemany("INSERT INTO pendentes (dados, criado_em) VALUES (?, ?)", valores)
+        else:
+            with self._conectar() as db:
+                db.executemany("INSERT INTO pendentes (dados, criado_em) VALUES (?, ?)", valores)
+        self._acordar.set()
+
+    def enfileirar_alteracao(self, uid, valores, db=None, conferencia=None):
+        """Grava no journal a alteração ({coluna: valor}) da linha com ID ``uid`` e acorda o envio.
+
+        ``conferencia`` ({coluna: valor}) identifica a linha pelo conteúdo
+        caso ela não tenha ID na aba. ``db`` tem o mesmo papel que em
+        ``enfileirar``.
+        """
+        parametros = (uid, json.dumps(valores, ensure_ascii=False, default=str),
+                      None if conferencia is None else json.dumps(conferencia, ensure_ascii=False, default=str),
+                      time.time())
+        sql = ("INSERT INTO alteracoes_pendentes (uid, valores, conferencia, criado_em) VALUES (?, ?, ?, ?)"
+               " ON CONFLICT(uid) DO UPDATE SET valores = excluded.valores, conferencia = excluded.conferencia,"
+               " criado_em = excluded.criado_em")
+        if db is not None:
+            db.execute(sql, parametros)
+        else:
+            with self._conectar() as db:
+                db.execute(sql, parametros)
+        self._acordar.set()
+
+    def alteracoes_pendentes(self):
+        """Quantidade de alterações aguardando envio."""
+        with self._conectar() as db:
+            return db.execute("SELECT COUNT(*) FROM alteracoes_pendentes").fetchone()[0]
+
+    def alteracoes_descartadas(self):
+        """Alterações abandonadas porque a linha não foi encontrada na aba: {ID: (valores, motivo)}."""
+        with self._conectar() as db:
+            linhas = db.execute("SELECT uid, valores, motivo FROM alteracoes_descartadas ORDER BY criado_em").fetchall()
+        return {uid: (json.loads(valores), motivo) for uid, valores, motivo in linhas}
+
+    def pendentes(self):
+        """Quantidade de linhas aguardando envio."""
+        with self._conectar() as db:
+            return db.execute("SELECT COUNT(*) FROM pendentes").fetchone()[0]
+
+    def ids_pendentes(self, coluna_id):
+        """Valores da coluna ``coluna_id`` das linhas ainda não enviadas."""
+        with self._conectar() as db:
+            linhas = db.execute("SELECT json_extract(dados, ?) FROM pendentes", (f'$."{coluna_id}"',)).fetchall()
+        return {valor for valor, in linhas if valor is not None}
+
+    def iniciar(self):
+        """Inicia a thread de envio, se ainda não estiver rodando."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._executar, name='fila-gravacao', daemon=True)
+            self._thread.start()
+
+    def drenar_lote(self):
+        """Envia um lote de pendentes. Retorna o número de linhas enviadas."""
+        with self._conectar() as db:
+            lote = db.execute(
+                "SELECT id, dados FROM pendentes ORDER BY id LIMIT ?", (self.tamanho_lote,)
+            ).fetchall()
+        if not lote:
+            return 0
+
+        ids = [id_ for id_, _ in lote]
+        linhas = pd.DataFrame([json.loads(dados) for _, dados in lote])
+        if self._envio_incerto and self.conferir is not None:
+            # O último envio falhou sem resposta clara e pode ter sido aplicado
+            ja_enviadas = pd.Series(self.conferir(linhas), index=linhas.index).astype(bool).to_numpy()
+            with self._conectar() as db:
+                db.executemany("DELETE FROM pendentes WHERE id = ?",
+                               [(id_,) for id_, enviada in zip(ids, ja_enviadas) if enviada])
+            self.linhas_ja_enviadas += int(ja_enviadas.sum())
+            ids = [id_ for id_, enviada in zip(ids, ja_enviadas) if not enviada]
+            linhas = linhas[~ja_enviadas].reset_index(drop=True)
+        self._envio_incerto = False
+        if linhas.empty:
+            return len(lote)
+
+        if self.cota is not None:
+            self.cota.registrar()
+        self.chamadas += 1
+        self._envio_incerto = True
+        self.enviar(linhas)
+
+        with self._conectar() as db:
+            db.executemany("DELETE FROM pendentes WHERE id = ?", [(id_,) for id_ in ids])
+        self._envio_incerto = False
+        self.linhas_enviadas += len(ids)
+        return len(lote)
+
+    def drenar_alteracoes(self):
+        """Envia em uma chamada as alterações de linhas com posição conhecida. Retorna quantas foram enviadas.
+
+        As que o destino não encontra (nem pelo ID nem pelo conteúdo) saem
+        do journal para alteracoes_descartadas: a linha já foi lida da aba
+        antes, então uma nova tentativa também não a encontraria.
+        """
+        if self.alterar is None or self.localizar is None:
+            return 0
+        with self._conectar() as db:
+            lote = db.execute("SELECT uid, valores, conferencia FROM alteracoes_pendentes ORDER BY criado_em LIMIT ?",
+                              (self.tamanho_lote,)).fetchall()
+        if not lote:
+            return 0
+        posicoes = self.localizar([uid for uid, _, _ in lote])
+        prontas = [(uid, valores, conferencia) for uid, valores, conferencia in lote if uid in posicoes]
+        if not prontas:
+            return 0  # Linhas ainda não lidas de volta da planilha: ficam para o próximo ciclo
+
+        if self.cota is not None:
+            self.cota.registrar()
+        self.chamadas += 1
+        alteradas = self.alterar({uid: json.loads(valores) for uid, valores, _ in prontas},
+                                 {uid: posicoes[uid] for uid, _, _ in prontas},
+                                 {uid: json.loads(conferencia) for uid, _, conferencia in prontas if conferencia})
+
+        perdidas = [(uid, valores) for uid, valores, _ in prontas if uid not in alteradas]
+        with self._conectar() as db:
+            # Só apaga se não foi alterada de novo durante o envio
+            db.executemany("DELETE FROM alteracoes_pendentes WHERE uid = ? AND valores = ?",
+                           [(uid, valores) for uid, valores, _ in prontas if uid in alteradas])
+            db.executemany(
+                "INSERT OR REPLACE INTO alteracoes_descartadas (uid, valores, motivo, criado_em)"
+                " SELECT uid, valores, ?, ? FROM alteracoes_pendentes WHERE uid = ? AND valores = ?",
+                [("linha não encontrada na planilha", time.time(), uid, valores) for uid, valores in perdidas])
+            db.executemany("DELETE FROM alteracoes_pendentes WHERE uid = ? AND valores = ?", perdidas)
+        return len(alteradas)
+
+    def _espera_nova_tentativa(self, erro, falhas):
+        """Espera exponencial com variação aleatória (metade fixa, metade sorteada)."""
+        base = min(self.intervalo * 2 ** falhas, self.espera_maxima)
+        espera = base / 2 + random.uniform(0, base / 2)
+        pedida = _retry_after(erro)
+        if codigo_http(erro) == 429 and self.cota is not None:
+            # Cota esgotada: espera pelo menos o que a API pediu, ou até a janela liberar
+            self.cota.esgotar(pedida or base)
+        return max(espera, pedida or 0.0)
+
+    def _tentar_alteracoes(self):
+        """Envia as alterações, se não estão esperando nova tentativa e a cota tem espaço neste ciclo."""
+        if self.proxima_alteracao is not None and time.time() < self.proxima_alteracao:
+            return
+        if self.cota is not None and self.cota.espera():
+            return
+        try:
+            self.drenar_alteracoes()
+        except Exception as e:
+            # As alterações ficam no journal; a espera vale só para elas
+            self.ultimo_erro_alteracoes = f"{type(e).__name__}: {e}"
+            self.falhas_alteracoes += 1
+            self.proxima_alteracao = time.time() + self._espera_nova_tentativa(e, self.falhas_alteracoes)
+        else:
+            self.ultimo_erro_alteracoes = None
+            self.falhas_alteracoes = 0
+            self.proxima_alteracao = None
+
+    def _executar(self):
+        while True:
+            if self.cota is not None and (espera := self.cota.espera()):
+                time.sleep(espera)
+            try:
+                enviados = self.drenar_lote()
+            except Exception as e:
+                # Mantém as linhas no journal e tenta de novo com espera exponencial
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                self.ultimo_status = codigo_http(e)
+                self.falhas_seguidas += 1
+                espera = self._espera_nova_tentativa(e, self.falhas_seguidas)
+                self.proxima_tentativa = time.time() + espera
+                time.sleep(espera)
+                continue
+
+            self.ultimo_erro = None
+            self.ultimo_status = None
+            self.falhas_seguidas = 0
+            self.proxima_tentativa = None
+            if enviados < self.tamanho_lote:
+                # Alterações depois dos acréscimos
+                self._tentar_alteracoes()
+                # Journal vazio (ou lote parcial): aguarda novas gravações ou o próximo ciclo
+                if self._acordar.wait(self.intervalo) and self.janela_agrupamento:
+                    # Gravações de várias sessões em sequência saem juntas em um só envio
+                    time.sleep(self.janela_agrupamento)
+                self._acordar.clear()
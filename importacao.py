@@ -0,0 +1,186 @@
+# --- Importação de Ocorrências em Lote ---
+#
+# Converte exportações de sequência de eventos (SOE) do SCADA ou de relés, em
+# CSV ou Excel, para as 12 colunas gravadas pelo formulário. Todas as linhas
+# são conferidas de uma vez contra o catálogo de equipamentos (junção
+# vetorizada, sem laço por linha) e separadas em válidas e rejeitadas.
+
+import io
+
+import pandas as pd
+
+from banco_ocorrencias import COLUNAS_OCORRENCIA
+from catalogo import COLUNAS_CASCATA, chaves_caminhos, normalizar
+from validacao import normalizar_protecoes, validar_ocorrencias
+
+# Campos que podem ser mapeados a partir do arquivo; data e hora podem vir juntas ou separadas
+CAMPOS_IMPORTACAO = [
+    "Data/Hora de Início", "Data de Início", "Hora de Início",
+    "Data/Hora de Término", "Data de Término", "Hora de Término",
+    "UFV", "Família do Equipamento", "SE", "Equipamento",
+    "Descrição da Ocorrência", "Proteções Atuantes", "Atuação de Bloqueio", "Observações",
+]
+
+# Nomes de coluna comuns nas exportações, já normalizados (minúsculas, sem acento)
+SINONIMOS = {
+    "Data/Hora de Início": ['data/hora de inicio', 'data/hora', 'data hora', 'timestamp', 'datetime',
+                            'inicio', 'data/hora do evento', 'time stamp'],
+    "Data de Início": ['data de inicio', 'data inicio', 'data', 'date'],
+    "Hora de Início": ['hora de inicio', 'hora inicio', 'hora', 'time'],
+    "Data/Hora de Término": ['data/hora de termino', 'termino', 'fim', 'normalizacao', 'retorno'],
+    "Data de Término": ['data de termino', 'data termino', 'data fim'],
+    "Hora de Término": ['hora de termino', 'hora termino', 'hora fim'],
+    "UFV": ['ufv', 'usina', 'planta', 'site'],
+    "Família do Equipamento": ['familia do equipamento', 'familia', 'tipo', 'tipo de equipamento'],
+    "SE": ['se', 'subestacao', 'parte da instalacao', 'bay', 'vao'],
+    "Equipamento": ['equipamento', 'tag', 'ponto', 'point', 'objeto', 'object', 'dispositivo'],
+    "Descrição da Ocorrência": ['descricao da ocorrencia', 'descricao', 'evento', 'mensagem', 'message', 'texto'],
+    "Proteções Atuantes": ['protecoes atuantes', 'protecao', 'protecoes', 'funcao', 'ansi', 'trip'],
+    "Atuação de Bloqueio": ['atuacao de bloqueio', 'bloqueio', '86', 'lockout'],
+    "Observações": ['observacoes', 'observacao', 'obs', 'comentario'],
+}
+
+VALORES_SIM = {'sim', 's', 'x', '1', 'true', 'verdadeiro', 'yes', 'y', 'on'}
+
+
+def ler_arquivo(conteudo, nome):
+    """Lê o arquivo enviado (bytes) como texto, detectando o separador dos CSVs."""
+    if nome.lower().endswith(('.xlsx', '.xls')):
+        return pd.read_excel(io.BytesIO(conteudo), dtype=str)
+    texto = conteudo.decode('utf-8-sig', errors='replace')
+    return pd.read_csv(io.StringIO(texto), sep=None, engine='python', dtype=str)
+
+
+def sugerir_mapeamento(colunas):
+    """Sugere, para cada campo, a coluna do arquivo com nome conhecido (ou None)."""
+    por_nome = {normalizar(c).strip(): c for c in colunas}
+    mapeamento = {}
+    for campo in CAMPOS_IMPORTACAO:
+        candidatos = [normalizar(campo)] + SINONIMOS.get(campo, [])
+        mapeamento[campo] = next((por_nome[c] for c in candidatos if c in por_nome), None)
+    # Com data e hora separadas, a coluna combinada não é usada
+    if mapeamento["Data de Início"] and mapeamento["Hora de Início"]:
+        mapeamento["Data/Hora de Início"] = None
+    if mapeamento["Data de Término"] and mapeamento["Hora de Término"]:
+        mapeamento["Data/Hora de Término"] = None
+    return mapeamento
+
+
+def _texto(serie):
+    return serie.astype('string').str.strip().replace('', pd.NA)
+
+
+def _chave(serie):
+    """Versão vetorizada de ``normalizar`` para comparar nomes: minúsculas, sem acento nem espaços nas pontas."""
+    return (serie.astype('string').str.normalize('NFKD')
+            .str.encode('ascii', errors='ignore').str.decode('ascii')
+            .str.lower().str.strip())
+
+
+def _data_hora(dados, coluna_combinada, coluna_data, coluna_hora):
+    """Data/hora como datetime, a partir da coluna combinada ou de data + hora."""
+    if coluna_combinada in dados:
+        return pd.to_datetime(dados[coluna_combinada], dayfirst=True, errors='coerce', format='mixed')
+    if coluna_data in dados and coluna_hora in dados:
+        return pd.to_datetime(dados[coluna_data] + ' ' + dados[coluna_hora],
+                              dayfirst=True, errors='coerce', format='mixed')
+    return pd.Series(pd.NaT, index=dados.index)
+
+
+def mapear(arquivo, mapeamento):
+    """Aplica o mapeamento campo → coluna do arquivo; campos não mapeados ficam de fora."""
+    selecionadas = {campo: coluna for campo, coluna in mapeamento.items() if coluna is not None}
+    dados = pd.DataFrame({campo: _texto(arquivo[coluna]) for campo, coluna in selecionadas.items()},
+                         index=arquivo.index)
+    return dados
+
+
+def conferir_catalogo(dados, catalogo_df):
+    """Localiza cada linha no catálogo pelo equipamento e pelos níveis informados (UFV, família, SE).
+
+    Retorna um DataFrame com o caminho completo encontrado e um Series com o
+    motivo da rejeição (vazio quando a linha foi encontrada exatamente uma vez).
+    """
+    niveis = ["UFV", "Família do Equipamento", "SE", "Equipamento"]
+    caminhos = (catalogo_df[COLUNAS_CASCATA].dropna().drop_duplicates()
+                .astype(str).set_axis(niveis, axis=1))
+    chaves = caminhos.apply(_chave).add_suffix('_chave')
+    caminhos = pd.concat([caminhos, chaves], axis=1)
+
+    linhas = pd.DataFrame(index=dados.index)
+    for nivel in niveis:
+        valores = dados[nivel] if nivel in dados else pd.Series(pd.NA, index=dados.index, dtype='string')
+        linhas[nivel + '_chave'] = _chave(valores)
+    linhas['linha'] = dados.index
+
+    cruzamento = linhas.dropna(subset=['Equipamento_chave']).merge(
+        caminhos, on='Equipamento_chave', how='inner', suffixes=('', '_cat'))
+    compativel = pd.Series(True, index=cruzamento.index)
+    for nivel in niveis[:-1]:
+        informado = cruzamento[nivel + '_chave']
+        compativel &= informado.isna() | (informado == cruzamento[nivel + '_chave_cat'])
+    cruzamento = cruzamento[compativel]
+
+    ocorrencias_por_linha = cruzamento['linha'].value_counts()
+    unicos = cruzamento[cruzamento['linha'].map(ocorrencias_por_linha) == 1].set_index('linha')
+
+    encontrados = unicos[niveis].reindex(dados.index)
+    motivo = pd.Series('', index=dados.index, dtype=object)
+    contagem = ocorrencias_por_linha.reindex(dados.index, fill_value=0)
+    motivo[contagem == 0] = 'equipamento não encontrado no catálogo'
+    motivo[contagem > 1] = 'equipamento ambíguo no catálogo (informe UFV/SE)'
+    motivo[linhas['Equipamento_chave'].isna().to_numpy()] = 'equipamento não informado'
+    return encontrados, motivo
+
+
+def preparar_importacao(arquivo, mapeamento, catalogo_df, caminhos_validos=None):
+    """Converte e confere o arquivo inteiro.
+
+    O equipamento é localizado no catálogo (``conferir_catalogo``) e as linhas
+    encontradas passam pelas mesmas regras do formulário (``validacao.py``).
+    Retorna ``(validas, rejeitadas)``: ``validas`` tem as colunas de
+    COLUNAS_OCORRENCIA no formato gravado pelo formulário; ``rejeitadas`` traz
+    a linha do arquivo (contando o cabeçalho como linha 1) e os motivos.
+    """
+    dados = mapear(arquivo, mapeamento)
+    inicio = _data_hora(dados, "Data/Hora de Início", "Data de Início", "Hora de Início")
+    fim = _data_hora(dados, "Data/Hora de Término", "Data de Término", "Hora de Término")
+    encontrados, motivo_catalogo = conferir_catalogo(dados, catalogo_df)
+
+    def coluna(campo):
+        return dados[campo].fillna('') if campo in dados else pd.Series('', index=dados.index, dtype='string')
+
+    def texto_original(combinada, separada):
+        return coluna(combinada).where(coluna(combinada) != '', coluna(separada))
+
+    # Datas que não puderam ser interpretadas seguem como vieram, para a validação apontá-las
+    bloqueio = coluna("Atuação de Bloqueio").map(lambda v: normalizar(v).strip() in VALORES_SIM)
+    ocorrencias = pd.DataFrame({
+        "Data de Início": inicio.dt.strftime('%d/%m/%Y').fillna(texto_original("Data/Hora de Início", "Data de Início")),
+        "Hora de Início": inicio.dt.strftime('%H:%M').fillna(texto_original("Data/Hora de Início", "Hora de Início")),
+        "Data de Término": fim.dt.strftime('%d/%m/%Y').fillna(texto_original("Data/Hora de Término", "Data de Término")),
+        "Hora de Término": fim.dt.strftime('%H:%M').fillna(texto_original("Data/Hora de Término", "Hora de Término")),
+        "UFV": encontrados["UFV"],
+        "Família do Equipamento": encontrados["Família do Equipamento"],
+        "SE": encontrados["SE"],
+        "Equipamento": encontrados["Equipamento"],
+        "Descrição da Ocorrência": coluna("Descrição da Ocorrência"),
+        "Proteções Atuantes": normalizar_protecoes(coluna("Proteções Atuantes")),
+        "Atuação de Bloqueio": bloqueio.map({True: "Sim", False: "Não"}),
+        "Observações": coluna("Observações"),
+    }, columns=COLUNAS_OCORRENCIA)
+    ocorrencias[["Data de Término", "Hora de Término"]] = (
+        ocorrencias[["Data de Término", "Hora de Término"]].replace('', '-'))
+
+    if caminhos_validos is None:
+        caminhos_validos = chaves_caminhos(catalogo_df[COLUNAS_CASCATA])
+    encontrada = motivo_catalogo == ''
+    motivo = motivo_catalogo.copy()
+    motivo[encontrada] = validar_ocorrencias(ocorrencias[encontrada], caminhos_validos)
+    ok = motivo == ''
+
+    validas = ocorrencias[ok].reset_index(drop=True)
+    rejeitadas = arquivo[~ok].copy()
+    rejeitadas.insert(0, 'Motivo da rejeição', motivo[~ok])
+    rejeitadas.insert(0, 'Linha do arquivo', rejeitadas.index + 2)
+    return validas, rejeitadas.reset_index(drop=True)
@@ -0,0 +1,116 @@
+# --- Indicadores Operacionais ---
+#
+# Agregados mantidos no banco local a cada inserção, na mesma transação, para
+# que o painel de indicadores leia tabelas do tamanho do parque de
+# equipamentos, e não do histórico inteiro:
+#
+#   agg_equipamento  ocorrências, encerradas, duração total e bloqueios por equipamento
+#   agg_protecao     ocorrências por proteção atuante
+#
+# Totais por UFV ou SE saem da soma das linhas de agg_equipamento.
+
+import pandas as pd
+
+CHAVES_EQUIPAMENTO = ["UFV", "Família do Equipamento", "SE", "Equipamento"]
+
+
+def criar_tabelas(db):
+    """Cria as tabelas de agregados; retorna True se elas ainda não existiam."""
+    existia = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agg_equipamento'").fetchone()
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS agg_equipamento ("
+        " ufv TEXT NOT NULL, familia TEXT NOT NULL, se TEXT NOT NULL, equipamento TEXT NOT NULL,"
+        " ocorrencias INTEGER NOT NULL, fechadas INTEGER NOT NULL,"
+        " duracao_min REAL NOT NULL, bloqueios INTEGER NOT NULL,"
+        " PRIMARY KEY (ufv, familia, se, equipamento))"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS agg_protecao (protecao TEXT PRIMARY KEY, ocorrencias INTEGER NOT NULL)")
+    return existia is None
+
+
+def _data_hora(linhas, coluna_data, coluna_hora):
+    return pd.to_datetime(linhas[coluna_data].astype(str) + " " + linhas[coluna_hora].astype(str),
+                          format="%d/%m/%Y %H:%M", errors="coerce")
+
+
+def acumular(db, linhas, sinal=1):
+    """Soma (``sinal=1``) ou subtrai (``sinal=-1``) as linhas nos agregados.
+
+    Subtrair e somar de novo é como uma ocorrência alterada (por exemplo ao
+    ser encerrada) atualiza os indicadores sem recalcular o histórico.
+    """
+    aplicar(db, variacoes(linhas), sinal)
+
+
+def variacoes(linhas):
+    """Contribuição das linhas para cada tabela de agregados, sem tocar no banco.
+
+    Permite calcular a parte cara (pandas) antes de abrir a transação e
+    gravar depois com ``aplicar``.
+    """
+    if linhas.empty:
+        return [], []
+    inicio = _data_hora(linhas, "Data de Início", "Hora de Início")
+    fim = _data_hora(linhas, "Data de Término", "Hora de Término")
+    duracao = (fim - inicio).dt.total_seconds() / 60
+    fechada = duracao.notna() & (duracao >= 0)
+
+    por_equipamento = pd.DataFrame({
+        **{chave: linhas[chave].fillna('').astype(str) for chave in CHAVES_EQUIPAMENTO},
+        'ocorrencias': 1,
+        'fechadas': fechada.astype(int),
+        'duracao_min': duracao.where(fechada, 0.0),
+        'bloqueios': (linhas["Atuação de Bloqueio"] == "Sim").astype(int),
+    }).groupby(CHAVES_EQUIPAMENTO, as_index=False).sum()
+    equipamentos = [(*chaves, int(n), int(f), float(d), int(b))
+                    for *chaves, n, f, d, b in por_equipamento.itertuples(index=False, name=None)]
+
+    protecoes = linhas["Proteções Atuantes"].fillna('').astype(str).str.split(',').explode().str.strip()
+    contagem = protecoes[protecoes != ''].value_counts()
+    return equipamentos, [(protecao, int(n)) for protecao, n in contagem.items()]
+
+
+def aplicar(db, variacoes, sinal=1):
+    """Grava nos agregados as variações calculadas por ``variacoes``."""
+    equipamentos, protecoes = variacoes
+    db.executemany(
+        "INSERT INTO agg_equipamento VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (ufv, familia, se, equipamento) DO UPDATE SET"
+        " ocorrencias = ocorrencias + excluded.ocorrencias, fechadas = fechadas + excluded.fechadas,"
+        " duracao_min = duracao_min + excluded.duracao_min, bloqueios = bloqueios + excluded.bloqueios",
+        [(*chaves, sinal * n, sinal * f, sinal * d, sinal * b) for *chaves, n, f, d, b in equipamentos],
+    )
+    db.executemany(
+        "INSERT INTO agg_protecao VALUES (?, ?)"
+        " ON CONFLICT (protecao) DO UPDATE SET ocorrencias = ocorrencias + excluded.ocorrencias",
+        [(protecao, sinal * n) for protecao, n in protecoes],
+    )
+
+
+def reconstruir(db, consulta_ocorrencias, tamanho_bloco=50_000):
+    """Recalcula os agregados do zero a partir do histórico, em blocos (usado só na migração)."""
+    db.execute("DELETE FROM agg_equipamento")
+    db.execute("DELETE FROM agg_protecao")
+    for bloco in pd.read_sql_query(consulta_ocorrencias, db, chunksize=tamanho_bloco):
+        acumular(db, bloco)
+
+
+def por_equipamento(db):
+    agregados = pd.read_sql_query(
+        "SELECT ufv, familia, se, equipamento, ocorrencias, fechadas, duracao_min, bloqueios"
+        " FROM agg_equipamento WHERE ocorrencias > 0", db)
+    return agregados.set_axis(CHAVES_EQUIPAMENTO + list(agregados.columns[4:]), axis=1)
+
+
+def por_protecao(db):
+    return pd.read_sql_query(
+        "SELECT protecao, ocorrencias FROM agg_protecao WHERE ocorrencias > 0 ORDER BY ocorrencias DESC", db)
+
+
+def resumir(agregados, niveis):
+    """Soma os agregados por equipamento nos ``niveis`` pedidos e calcula o MTTR em horas."""
+    resumo = agregados.groupby(niveis, as_index=False)[['ocorrencias', 'fechadas', 'duracao_min', 'bloqueios']].sum()
+    resumo['MTTR (h)'] = resumo['duracao_min'] / resumo['fechadas'].where(resumo['fechadas'] > 0) / 60
+    return resumo.sort_values('ocorrencias', ascending=False, ignore_index=True)
@@ -0,0 +1,106 @@
+# --- Métricas de Tempo ---
+#
+# Trechos nomeados ("spans") em volta das etapas caras do formulário. Cada
+# duração entra em um histograma do processo (faixas geométricas de tempo), de
+# onde saem contagem, média, máximo e os percentis p50/p95/p99 sem guardar as
+# amostras individuais.
+#
+#     with medir('catalogo.carregar'):
+#         ...
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Limites das faixas do histograma, em segundos: de 0,05 ms a ~10 min, crescendo 20% por faixa
+_LIMITE_INICIAL = 0.00005
+_FATOR = 1.2
+_N_FAIXAS = int(math.log(600 / _LIMITE_INICIAL, _FATOR)) + 1
+LIMITES = [_LIMITE_INICIAL * _FATOR ** i for i in range(_N_FAIXAS)]
+
+
+class Histograma:
+    """Contagens de durações por faixa de tempo, com percentis aproximados."""
+
+    def __init__(self):
+        self.contagens = [0] * (len(LIMITES) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        if segundos <= _LIMITE_INICIAL:
+            faixa = 0
+        else:
+            faixa = min(int(math.ceil(math.log(segundos / _LIMITE_INICIAL, _FATOR))), len(LIMITES))
+        self.contagens[faixa] += 1
+        self.total += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        """Limite superior da faixa onde cai o percentil ``p`` (0–100); erro de até 20%."""
+        if not self.total:
+            return None
+        alvo = math.ceil(self.total * p / 100)
+        acumulado = 0
+        for faixa, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(LIMITES[faixa] if faixa < len(LIMITES) else self.maximo, self.maximo)
+        return self.maximo
+
+
+_histogramas = {}
+_lock = threading.Lock()
+
+
+def registrar(nome, segundos):
+    with _lock:
+        _histogramas.setdefault(nome, Histograma()).registrar(segundos)
+
+
+@contextmanager
+def medir(nome):
+    """Registra a duração do bloco no histograma ``nome``, mesmo se ele terminar em erro."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nome, time.perf_counter() - inicio)
+
+
+def resumo():
+    """DataFrame com uma linha por trecho medido; tempos em milissegundos."""
+    with _lock:
+        linhas = [
+            {
+                'trecho': nome,
+                'chamadas': h.total,
+                'média (ms)': h.soma / h.total * 1000,
+                'p50 (ms)': h.percentil(50) * 1000,
+                'p95 (ms)': h.percentil(95) * 1000,
+                'p99 (ms)': h.percentil(99) * 1000,
+                'máx (ms)': h.maximo * 1000,
+                'total (s)': h.soma,
+            }
+            for nome, h in _histogramas.items() if h.total
+        ]
+    colunas = ['trecho', 'chamadas', 'média (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'máx (ms)', 'total (s)']
+    return pd.DataFrame(linhas, columns=colunas).sort_values('total (s)', ascending=False, ignore_index=True)
+
+
+def exportar(caminho):
+    """Acrescenta ao arquivo (JSON Lines) um registro com o resumo atual, para comparar ao longo do tempo."""
+    registro = {'momento': time.strftime('%Y-%m-%dT%H:%M:%S'), 'trechos': resumo().to_dict(orient='records')}
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+
+def limpar():
+    with _lock:
+        _histogramas.clear()
@@ -0,0 +1,127 @@
+# --- Relatório de Tempo de Inicialização ---
+#
+# Mede quanto cada módulo importado pelo formulário custa no início frio do
+# processo, e compara dois cenários:
+#
+#   antes   todos os imports do script no topo (como era), inclusive a conexão
+#           com a planilha e a importação em lote
+#   agora   só os imports que continuam no topo do script; os que estão dentro
+#           de funções ou blocos condicionais ficam para o primeiro uso
+#
+# Os imports de cada cenário são lidos do próprio script (ast) e medidos com
+# ``python -X importtime`` em interpretadores novos, com streamlit e pandas já
+# carregados (como no servidor). pyarrow entra nos dois cenários: ele é
+# importado no primeiro uso pelo catalogo.py, mas a leitura do snapshot
+# acontece antes da primeira tela (e versões recentes do pandas já o carregam).
+# Módulos não instalados no ambiente ficam fora da medição e são listados.
+#
+#     python relatorio_inicializacao.py --repeticoes 5 --saida inicializacao.csv
+
+import argparse
+import ast
+import importlib.util
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent
+SCRIPT_PADRAO = RAIZ / 'Ocorrências-Streamlit_Cloud_v0.2.py'
+
+# Carregados pelo servidor antes de o script rodar
+PRE_CARREGADOS = ['streamlit', 'pandas']
+# Importados no primeiro uso por módulos do projeto, mas necessários para a primeira tela
+NECESSARIOS_NA_PRIMEIRA_TELA = ['pyarrow', 'pyarrow.feather']
+
+MARCADOR = '@@inicio-medicao'
+
+
+def imports_do_script(caminho):
+    """Módulos importados no topo do script e os adiados (dentro de funções ou blocos)."""
+    arvore = ast.parse(Path(caminho).read_text(encoding='utf-8'))
+    no_topo = {id(no) for no in arvore.body}
+    topo, adiados = [], []
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Import):
+            nomes = [alias.name for alias in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.module and not no.level:
+            nomes = [no.module]
+        else:
+            continue
+        destino = topo if id(no) in no_topo else adiados
+        destino.extend(n for n in nomes if n not in destino)
+    adiados = [n for n in adiados if n not in topo]
+    return topo, adiados
+
+
+def instalado(modulo):
+    try:
+        return importlib.util.find_spec(modulo) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def medir_importacao(modulos):
+    """Tempo (ms) de cada módulo de primeiro nível importado ao carregar ``modulos`` em um processo novo."""
+    codigo = (f"import sys; sys.path.insert(0, {str(RAIZ)!r}); import {', '.join(PRE_CARREGADOS)}; "
+              f"sys.stderr.write({MARCADOR + chr(10)!r}); sys.stderr.flush(); "
+              + "; ".join(f"import {m}" for m in modulos))
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo],
+                               capture_output=True, text=True, cwd=RAIZ, check=True)
+    tempos = {}
+    depois_do_marcador = False
+    for linha in resultado.stderr.splitlines():
+        if linha.strip() == MARCADOR:
+            depois_do_marcador = True
+            continue
+        if not depois_do_marcador or not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        if not nome.startswith('  '):  # só os de primeiro nível; os demais já estão no acumulado
+            tempos[nome.strip()] = int(acumulado) / 1000
+    return tempos
+
+
+def medir_cenario(modulos, repeticoes):
+    execucoes = [medir_importacao(modulos) for _ in range(repeticoes)]
+    nomes = {nome for tempos in execucoes for nome in tempos}
+    return {nome: statistics.median(tempos.get(nome, 0.0) for tempos in execucoes) for nome in nomes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de importação no início frio do formulário.")
+    parser.add_argument('--script', default=str(SCRIPT_PADRAO))
+    parser.add_argument('--repeticoes', type=int, default=5, help="Processos por cenário (usa a mediana)")
+    parser.add_argument('--saida', help="Arquivo CSV para gravar a tabela por módulo")
+    args = parser.parse_args()
+
+    topo, adiados = imports_do_script(args.script)
+    ausentes = [m for m in topo + adiados + NECESSARIOS_NA_PRIMEIRA_TELA if not instalado(m)]
+    cenarios = {
+        'antes': [m for m in topo + adiados + NECESSARIOS_NA_PRIMEIRA_TELA if m not in ausentes],
+        'agora': [m for m in topo + NECESSARIOS_NA_PRIMEIRA_TELA if m not in ausentes],
+    }
+    cenarios = {nome: [m for m in modulos if m not in PRE_CARREGADOS] for nome, modulos in cenarios.items()}
+
+    tempos = {nome: medir_cenario(modulos, args.repeticoes) for nome, modulos in cenarios.items()}
+    tabela = pd.DataFrame(tempos).fillna(0.0).rename(columns=lambda c: f'{c} (ms)')
+    tabela['no início'] = ['adiado' if m in adiados else 'topo' for m in tabela.index]
+    tabela = tabela.sort_values('antes (ms)', ascending=False).rename_axis('módulo')
+
+    print(f"Script: {Path(args.script).name} ({args.repeticoes} processo(s) por cenário; "
+          f"{', '.join(PRE_CARREGADOS)} já carregados)\n")
+    print(tabela[tabela[['antes (ms)', 'agora (ms)']].max(axis=1) >= 0.5].to_string(float_format='{:.1f}'.format))
+    total_antes, total_agora = tabela['antes (ms)'].sum(), tabela['agora (ms)'].sum()
+    print(f"\nTotal de importação antes da primeira tela: antes {total_antes:.1f} ms, agora {total_agora:.1f} ms "
+          f"({total_antes - total_agora:.1f} ms a menos)")
+    print(f"Adiados para o primeiro uso: {', '.join(adiados) or '-'}")
+    if ausentes:
+        print(f"Não instalados neste ambiente (fora da medição): {', '.join(ausentes)}")
+    if args.saida:
+        tabela.to_csv(args.saida)
+
+
+if __name__ == '__main__':
+    main()
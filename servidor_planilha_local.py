@@ -0,0 +1,343 @@
+# --- Servidor Local que Emula a Planilha Google ---
+#
+# Substituto offline das chamadas que o formulário faz à planilha, para rodar
+# o app e os testes de carga sem o serviço do Google:
+#
+#   GET/HEAD /spreadsheets/d/<id>/gviz/tq?tqx=out:csv[&sheet=<aba>][&tq=select * offset N]
+#            exportação CSV (catálogo e cauda das ocorrências), com ETag
+#   GET      /v4/spreadsheets/<id>/values/<aba>           leitura da aba
+#   POST     /v4/spreadsheets/<id>/values/<aba>:append    acréscimo de linhas
+#   PUT      /v4/spreadsheets/<id>/values/<aba>           substituição da aba
+#   GET      /v4/spreadsheets/<id>/values:batchGet        leitura de intervalos ('Aba'!M5, 'Aba'!A10:M)
+#   POST     /v4/spreadsheets/<id>/values:batchUpdate     alteração de intervalos ('Aba'!C5:D5)
+#
+# As planilhas ficam em memória. Cada requisição espera a latência configurada
+# (com variação aleatória) e pode falhar com 503 (taxa de erro) ou 429 (cota
+# de requisições por minuto, como a da API do Sheets). Para usar no app:
+#
+#     python servidor_planilha_local.py --porta 8765 --latencia 0.3 --catalogo "Listagem de equipamentos.xlsx"
+#     OCORRENCIAS_ARMAZENAMENTO=http://127.0.0.1:8765 streamlit run Ocorrências-Streamlit_Cloud_v0.2.py
+#
+# Sem --catalogo é gerado um catálogo sintético.
+
+import argparse
+import collections
+import csv
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from banco_ocorrencias import COLUNAS_PLANILHA
+
+ABA_PADRAO = 'Página1'
+
+
+class PlanilhasEmMemoria:
+    """Planilhas (id → aba → linhas, a primeira é o cabeçalho), com uma versão por planilha."""
+
+    def __init__(self):
+        self.planilhas = {}
+        self.versoes = collections.Counter()
+        self.lock = threading.Lock()
+
+    def aba(self, planilha, aba=None):
+        abas = self.planilhas.setdefault(planilha, {})
+        if aba is None:
+            aba = next(iter(abas), ABA_PADRAO)
+        return abas.setdefault(aba, [])
+
+    def definir(self, planilha, aba, linhas):
+        with self.lock:
+            self.aba(planilha, aba)[:] = [list(linha) for linha in linhas]
+            self.versoes[planilha] += 1
+
+    def acrescentar(self, planilha, aba, linhas):
+        with self.lock:
+            valores = self.aba(planilha, aba)
+            if not valores:
+                valores.append(list(COLUNAS_PLANILHA))
+            valores.extend(list(linha) for linha in linhas)
+            self.versoes[planilha] += 1
+            return len(valores)
+
+    def alterar(self, planilha, aba, linha, coluna, valores):
+        """Grava o bloco ``valores`` (lista de linhas) a partir da célula (linha, coluna), contadas de 0."""
+        with self.lock:
+            linhas = self.aba(planilha, aba)
+            for i, valores_linha in enumerate(valores):
+                while len(linhas) <= linha + i:
+                    linhas.append([])
+                atual = linhas[linha + i]
+                atual.extend([''] * (coluna + len(valores_linha) - len(atual)))
+                atual[coluna:coluna + len(valores_linha)] = valores_linha
+            self.versoes[planilha] += 1
+
+    def ler(self, planilha, aba=None):
+        with self.lock:
+            return [list(linha) for linha in self.aba(planilha, aba)]
+
+    def ler_intervalo(self, planilha, aba, linha, coluna, ultima_linha, ultima_coluna):
+        """Valores do retângulo (contado de 0; ``ultima_linha`` None = até o fim), como a API os devolve.
+
+        Células vazias no fim de cada linha e linhas vazias no fim são omitidas.
+        """
+        with self.lock:
+            linhas = self.aba(planilha, aba)[linha:None if ultima_linha is None else ultima_linha + 1]
+            valores = [[str(v) for v in l[coluna:ultima_coluna + 1]] for l in linhas]
+        for l in valores:
+            while l and l[-1] == '':
+                l.pop()
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+
+def catalogo_sintetico(ufvs=20, familias=6, ses=5, equipamentos=40, semente=0):
+    """Catálogo com ufvs × familias × ses × equipamentos linhas, nas colunas da listagem real."""
+    aleatorio = random.Random(semente)
+    nomes_familia = ['Disjuntor', 'Seccionadora', 'Transformador', 'Inversor', 'Religador', 'TC', 'TP', 'Relé']
+    linhas = [['UFV', 'família do equipamento', 'SE', 'equipamento']]
+    for u in range(ufvs):
+        for f in range(familias):
+            familia = nomes_familia[f % len(nomes_familia)]
+            for s in range(ses):
+                for e in range(equipamentos):
+                    linhas.append([f'UFV {u:02d}', familia, f'SE {u:02d}-{s}',
+                                   f'{familia[:3].upper()}-{u:02d}{s}{e:03d}-{aleatorio.randint(0, 9)}'])
+    return linhas
+
+
+def _indice_coluna(letras):
+    coluna = 0
+    for letra in letras:
+        coluna = coluna * 26 + ord(letra) - ord('A') + 1
+    return coluna - 1
+
+
+def _intervalo(a1):
+    """Aba, linha, coluna, última linha (None = até o fim) e última coluna de 'Aba'!C5:D5, contadas de 0."""
+    aba, _, celulas = a1.rpartition('!')
+    letras, numero, letras_fim, numero_fim = re.fullmatch(r'([A-Z]+)(\d+)(?::([A-Z]+)(\d*))?', celulas).groups()
+    linha = int(numero) - 1
+    if letras_fim is None:
+        ultima_linha, letras_fim = linha, letras
+    else:
+        ultima_linha = int(numero_fim) - 1 if numero_fim else None
+    return (aba.strip("'").replace("''", "'") or None, linha, _indice_coluna(letras),
+            ultima_linha, _indice_coluna(letras_fim))
+
+
+def _linhas_tabela(dados):
+    dados = dados.astype(object).where(dados.notna(), '')
+    return [[str(c) for c in dados.columns]] + dados.astype(str).values.tolist()
+
+
+def _csv(linhas):
+    texto = io.StringIO()
+    csv.writer(texto, lineterminator='\n').writerows(linhas)
+    return texto.getvalue().encode('utf-8')
+
+
+class ManipuladorPlanilha(BaseHTTPRequestHandler):
+    """Requisições da exportação gviz e da API de valores; a configuração fica no servidor."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    def _responder(self, status, corpo=b'', tipo='application/json', cabecalhos=None):
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(corpo)
+
+    def _erro(self, status, mensagem, cabecalhos=None):
+        corpo = json.dumps({'error': {'code': status, 'message': mensagem}}).encode('utf-8')
+        self._responder(status, corpo, cabecalhos=cabecalhos)
+
+    def _simular_rede(self):
+        """Latência, cota por minuto e falhas; retorna False se a requisição já foi respondida com erro."""
+        servidor = self.server
+        time.sleep(max(0.0, servidor.latencia + random.uniform(-servidor.variacao, servidor.variacao)))
+        if servidor.cota and (espera := servidor.consumir_cota()):
+            servidor.contar('429')
+            self._erro(429, 'Quota exceeded for quota metric "Requests" (emulado)',
+                       {'Retry-After': str(int(espera) + 1)})
+            return False
+        if random.random() < servidor.taxa_erro:
+            servidor.contar('503')
+            self._erro(503, 'The service is currently unavailable (emulado)')
+            return False
+        return True
+
+    def _corpo(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(tamanho) or b'{}')
+
+    def _rota(self):
+        partes = urlsplit(self.path)
+        return unquote(partes.path), parse_qs(partes.query)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        caminho, consulta = self._rota()
+        if not self._simular_rede():
+            return
+        planilhas = self.server.planilhas
+
+        if m := re.fullmatch(r'/spreadsheets/d/([^/]+)/gviz/tq', caminho):
+            planilha = m.group(1)
+            linhas = planilhas.ler(planilha, consulta.get('sheet', [None])[0])
+            offset = re.search(r'offset\s+(\d+)', consulta.get('tq', [''])[0], re.IGNORECASE)
+            if offset and linhas:
+                linhas = linhas[:1] + linhas[1 + int(offset.group(1)):]
+            self.server.contar('gviz')
+            self._responder(200, _csv(linhas), 'text/csv; charset=utf-8',
+                            {'ETag': f'"{planilha}-{planilhas.versoes[planilha]}"'})
+        elif m := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values:batchGet', caminho):
+            intervalos = []
+            for a1 in consulta.get('ranges', []):
+                aba, linha, coluna, ultima_linha, ultima_coluna = _intervalo(a1)
+                intervalos.append({'range': a1, 'values': planilhas.ler_intervalo(m.group(1), aba, linha, coluna,
+                                                                                  ultima_linha, ultima_coluna)})
+            self.server.contar('leitura')
+            self._responder(200, json.dumps({'valueRanges': intervalos}).encode('utf-8'))
+        elif m := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values/([^:]+)', caminho):
+            self.server.contar('leitura')
+            corpo = {'range': m.group(2), 'values': planilhas.ler(m.group(1), m.group(2))}
+            self._responder(200, json.dumps(corpo).encode('utf-8'))
+        else:
+            self._erro(404, f'Caminho desconhecido: {caminho}')
+
+    def do_POST(self):
+        caminho, _ = self._rota()
+        corpo = self._corpo()
+        if not self._simular_rede():
+            return
+        if m := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values:batchUpdate', caminho):
+            for dados in corpo.get('data', []):
+                aba, linha, coluna, _, _ = _intervalo(dados['range'])
+                self.server.planilhas.alterar(m.group(1), aba, linha, coluna, dados.get('values', []))
+            self.server.contar('alteracao')
+            self._responder(200, json.dumps({'totalUpdatedRanges': len(corpo.get('data', []))}).encode('utf-8'))
+        elif m := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values/([^:]+):append', caminho):
+            valores = corpo.get('values', [])
+            total = self.server.planilhas.acrescentar(m.group(1), m.group(2), valores)
+            self.server.contar('acrescimo')
+            resposta = {'updates': {'updatedRange': f'{m.group(2)}!A{total - len(valores) + 1}:A{total}',
+                                    'updatedRows': len(valores)}}
+            self._responder(200, json.dumps(resposta).encode('utf-8'))
+        else:
+            self._erro(404, f'Caminho desconhecido: {caminho}')
+
+    def do_PUT(self):
+        caminho, _ = self._rota()
+        corpo = self._corpo()
+        if not self._simular_rede():
+            return
+        if m := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values/([^:]+)', caminho):
+            valores = corpo.get('values', [])
+            self.server.planilhas.definir(m.group(1), m.group(2), valores)
+            self.server.contar('substituicao')
+            self._responder(200, json.dumps({'updatedRows': len(valores)}).encode('utf-8'))
+        else:
+            self._erro(404, f'Caminho desconhecido: {caminho}')
+
+
+class ServidorPlanilhaLocal(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, latencia=0.0, variacao=0.0, taxa_erro=0.0, cota=None, verboso=False):
+        super().__init__(endereco, ManipuladorPlanilha)
+        self.planilhas = PlanilhasEmMemoria()
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_erro = taxa_erro
+        self.cota = cota
+        self.verboso = verboso
+        self.requisicoes = collections.Counter()
+        self._janela_cota = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def contar(self, tipo):
+        with self._lock:
+            self.requisicoes[tipo] += 1
+
+    def consumir_cota(self):
+        """Janela deslizante de 60 s: conta a requisição e retorna 0, ou os segundos até caber na cota."""
+        agora = time.monotonic()
+        with self._lock:
+            while self._janela_cota and agora - self._janela_cota[0] >= 60:
+                self._janela_cota.popleft()
+            if len(self._janela_cota) >= self.cota:
+                return max(self._janela_cota[0] + 60 - agora, 0.001)
+            self._janela_cota.append(agora)
+            return 0
+
+
+def iniciar(porta=0, catalogo=None, host='127.0.0.1', **opcoes):
+    """Sobe o servidor em uma thread e retorna-o (``servidor.url`` tem o endereço; pare com ``shutdown()``).
+
+    ``catalogo`` pode ser um DataFrame, um caminho de xlsx/CSV ou None
+    (catálogo sintético). As planilhas são "catalogo" e "ocorrencias", as
+    mesmas que ``armazenamento.abrir_armazenamento`` espera.
+    """
+    servidor = ServidorPlanilhaLocal((host, porta), **opcoes)
+    if catalogo is None:
+        linhas = catalogo_sintetico()
+    else:
+        if not isinstance(catalogo, pd.DataFrame):
+            from catalogo import ler_origem
+
+            catalogo = ler_origem(catalogo)
+        linhas = _linhas_tabela(catalogo)
+    servidor.planilhas.definir('catalogo', ABA_PADRAO, linhas)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que emula a exportação gviz e a API de valores do Sheets.")
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--latencia', type=float, default=0.2, help="Latência de cada requisição (s)")
+    parser.add_argument('--variacao', type=float, default=0.1, help="Variação aleatória da latência (± s)")
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help="Fração das requisições que falham com 503")
+    parser.add_argument('--cota', type=int, help="Requisições por minuto antes de responder 429")
+    parser.add_argument('--catalogo', help="Listagem de equipamentos (xlsx/CSV); padrão: sintética")
+    parser.add_argument('--verboso', action='store_true', help="Registra cada requisição")
+    args = parser.parse_args()
+
+    servidor = iniciar(args.porta, args.catalogo, args.host, latencia=args.latencia, variacao=args.variacao,
+                       taxa_erro=args.taxa_erro, cota=args.cota, verboso=args.verboso)
+    print(f"Planilha local em {servidor.url} (catálogo: {len(servidor.planilhas.ler('catalogo')) - 1} linhas)")
+    print(f"Use OCORRENCIAS_ARMAZENAMENTO={servidor.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
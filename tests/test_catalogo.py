@@ -0,0 +1,63 @@
+# Testes da busca de equipamentos (catalogo.IndiceBusca) e do snapshot do catálogo
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import catalogo  # noqa: E402
+from catalogo import AtualizadorCatalogo, IndiceBusca  # noqa: E402
+
+
+def _caminhos():
+    # 100 UFVs com 100 disjuntores e 100 TPs cada; a UFV 0049 tem ainda 600 seccionadoras.
+    # Os TPs vêm por último, depois de todos os outros caminhos da UFV 0049.
+    caminhos = [(f'UFV {u:04d}', 'Disjuntor', f'SE {u:04d}-{s}', f'DJ-{u:04d}{s}{e:02d}')
+                for u in range(100) for s in range(5) for e in range(20)]
+    caminhos += [('UFV 0049', 'Seccionadora', f'SE 0049-{s}', f'SC-0049{s}{e:03d}') for s in range(5) for e in range(120)]
+    caminhos += [(f'UFV {u:04d}', 'TP', f'SE {u:04d}-{s}', f'TP-{u:04d}{s}{e:02d}')
+                 for u in range(100) for s in range(5) for e in range(20)]
+    return caminhos
+
+
+def test_varios_termos_com_intervalo_maior_que_o_limite_de_candidatos():
+    indice = IndiceBusca(_caminhos())
+    # O termo mais seletivo ("0049") casa com mais de MAX_CANDIDATOS caminhos, e os TPs vêm depois deles
+    for termo in ('ufv', '0049', 'tp'):
+        inicio, fim = indice._intervalo(termo)
+        assert fim - inicio > IndiceBusca.MAX_CANDIDATOS
+
+    resultados = indice.buscar('ufv 0049 tp', limite=500)
+
+    assert len(resultados) == 100
+    assert all(ufv == 'UFV 0049' and familia == 'TP' for ufv, familia, _, _ in resultados)
+
+
+def test_trigramas_com_grupo_maior_que_o_limite_de_candidatos():
+    indice = IndiceBusca(_caminhos())
+    # Sem palavra que comece por "p", a busca usa trigramas: "p00" casa com todos os TPs e
+    # "004"/"049" com centenas de equipamentos antes dos TPs da UFV 0049
+    resultados = indice.buscar('p-0049', limite=500)
+
+    assert len(resultados) == 100
+    assert all(equipamento.startswith('TP-0049') for _, _, _, equipamento in resultados)
+
+
+def test_snapshot_atualizado_em_segundo_plano_e_reaproveitado(tmp_path, monkeypatch):
+    origem, destino = tmp_path / 'catalogo.csv', tmp_path / 'catalogo.arrow'
+    pd.DataFrame({'UFV': ['UFV 01'], 'Equipamento': ['DJ-01']}).to_csv(origem, index=False)
+    AtualizadorCatalogo(str(origem), destino).carregar()
+    pd.DataFrame({'UFV': ['UFV 02'], 'Equipamento': ['DJ-02']}).to_csv(origem, index=False)
+    assert AtualizadorCatalogo(str(origem), destino).verificar()
+
+    # Próximo início: o snapshot gravado pela atualização vale para a mesma origem
+    leituras = []
+    ler_origem = catalogo.ler_origem
+    monkeypatch.setattr(catalogo, 'ler_origem', lambda o: leituras.append(o) or ler_origem(o))
+    atualizador = AtualizadorCatalogo(str(origem), destino)
+    atualizador.carregar()
+
+    assert leituras == []
+    assert list(atualizador.atual.dados['UFV']) == ['UFV 02']
@@ -0,0 +1,91 @@
+# Testes do encerramento de ocorrências replicado na planilha (FilaGravacao.drenar_alteracoes)
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from armazenamento import abrir_armazenamento  # noqa: E402
+from banco_ocorrencias import (  # noqa: E402
+    COLUNA_ID, COLUNAS_OCORRENCIA, COLUNAS_PLANILHA, BancoOcorrencias, SincronizadorPlanilha,
+)
+from fila_gravacao import FilaGravacao  # noqa: E402
+from servidor_planilha_local import iniciar  # noqa: E402
+
+ABA = "Ocorrências"
+
+# Linhas gravadas antes da coluna de ID: só as 12 colunas da ocorrência, em aberto
+LEGADAS = [
+    ['01/02/2024', '08:00', '-', '-', 'UFV 01', 'Disjuntor', 'SE 01', 'DJ-01', 'Trip', '', 'Não', ''],
+    ['02/02/2024', '09:30', '-', '-', 'UFV 02', 'Disjuntor', 'SE 02', 'DJ-02', 'Trip', '', 'Não', ''],
+]
+
+
+@pytest.fixture
+def ambiente(tmp_path):
+    servidor = iniciar(0)
+    servidor.planilhas.definir('ocorrencias', ABA, [COLUNAS_OCORRENCIA] + LEGADAS)
+    armazenamento = abrir_armazenamento(servidor.url)
+    caminho = tmp_path / 'ocorrencias.db'
+    banco = None
+    fila = FilaGravacao(caminho, enviar=armazenamento.acrescentar, alterar=armazenamento.alterar,
+                        localizar=lambda ids: banco.linhas_planilha(ids))
+    banco = BancoOcorrencias(caminho, fila=fila)
+    SincronizadorPlanilha(banco, ABA, armazenamento.ler_ocorrencias, intervalo=0).sincronizar(forcar=True)
+    yield servidor, banco, fila
+    servidor.shutdown()
+
+
+def _uid(banco, equipamento):
+    abertas, _ = banco.abertas()
+    return abertas.loc[abertas["Equipamento"] == equipamento, COLUNA_ID].iloc[0]
+
+
+def _linha_aba(servidor, equipamento):
+    linhas = servidor.planilhas.ler('ocorrencias', ABA)[1:]
+    linha = next(linha for linha in linhas if linha[7:8] == [equipamento])
+    return dict(zip(COLUNAS_PLANILHA, linha + [''] * (len(COLUNAS_PLANILHA) - len(linha))))
+
+
+def test_encerrar_linha_sem_id_confere_pelo_conteudo_e_grava_o_id(ambiente):
+    servidor, banco, fila = ambiente
+    uid = _uid(banco, 'DJ-02')
+    assert banco.encerrar(uid, '02/02/2024', '10:15')
+
+    assert fila.drenar_alteracoes() == 1
+
+    linha = _linha_aba(servidor, 'DJ-02')
+    assert (linha["Data de Término"], linha["Hora de Término"], linha[COLUNA_ID]) == ('02/02/2024', '10:15', uid)
+    assert _linha_aba(servidor, 'DJ-01')["Data de Término"] == '-'
+    assert fila.alteracoes_pendentes() == 0
+    assert fila.alteracoes_descartadas() == {}
+
+
+def test_linha_sem_id_deslocada_e_encontrada_pelo_conteudo(ambiente):
+    servidor, banco, fila = ambiente
+    uid = _uid(banco, 'DJ-02')
+    # Alguém insere uma linha à mão no meio da aba depois da sincronização
+    linhas = servidor.planilhas.ler('ocorrencias', ABA)
+    servidor.planilhas.definir('ocorrencias', ABA, linhas[:2] + [['03/02/2024', '07:00', '-', '-', 'UFV 03']] + linhas[2:])
+    banco.encerrar(uid, '02/02/2024', '10:15')
+
+    assert fila.drenar_alteracoes() == 1
+    assert _linha_aba(servidor, 'DJ-02')[COLUNA_ID] == uid
+
+
+def test_linha_apagada_e_descartada_sem_novas_tentativas(ambiente):
+    servidor, banco, fila = ambiente
+    uid = _uid(banco, 'DJ-02')
+    linhas = servidor.planilhas.ler('ocorrencias', ABA)
+    servidor.planilhas.definir('ocorrencias', ABA, linhas[:2])
+    banco.encerrar(uid, '02/02/2024', '10:15')
+
+    assert fila.drenar_alteracoes() == 0
+    assert fila.alteracoes_pendentes() == 0
+    assert list(fila.alteracoes_descartadas()) == [uid]
+    # Nada é reenviado no ciclo seguinte
+    alteracoes = servidor.requisicoes['alteracao']
+    assert fila.drenar_alteracoes() == 0
+    assert servidor.requisicoes['alteracao'] == alteracoes
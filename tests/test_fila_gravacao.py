@@ -0,0 +1,54 @@
+# Testes do envio das ocorrências pela fila local (fila_gravacao.FilaGravacao)
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from banco_ocorrencias import COLUNA_ID  # noqa: E402
+from fila_gravacao import FilaGravacao  # noqa: E402
+
+
+class DestinoInstavel:
+    """Acrescenta as linhas e, no primeiro envio, falha depois de acrescentá-las (resposta perdida)."""
+
+    def __init__(self):
+        self.linhas = []
+        self.falhar = True
+
+    def enviar(self, linhas):
+        self.linhas += linhas[COLUNA_ID].tolist()
+        if self.falhar:
+            self.falhar = False
+            raise TimeoutError("resposta perdida")
+
+    def conferir(self, linhas):
+        return linhas[COLUNA_ID].isin(self.linhas)
+
+
+def test_reenvio_apos_falha_com_lote_aplicado_nao_duplica(tmp_path):
+    destino = DestinoInstavel()
+    fila = FilaGravacao(tmp_path / 'fila.db', enviar=destino.enviar, conferir=destino.conferir)
+    fila.enfileirar(pd.DataFrame({COLUNA_ID: ['a', 'b']}))
+    with pytest.raises(TimeoutError):
+        fila.drenar_lote()
+    fila.enfileirar(pd.DataFrame({COLUNA_ID: ['c']}))
+
+    assert fila.drenar_lote() == 3
+    assert destino.linhas == ['a', 'b', 'c']
+    assert fila.pendentes() == 0
+
+
+def test_journal_de_execucao_anterior_e_conferido_antes_do_envio(tmp_path):
+    destino = DestinoInstavel()
+    destino.falhar = False
+    FilaGravacao(tmp_path / 'fila.db', enviar=destino.enviar).enfileirar(pd.DataFrame({COLUNA_ID: ['a', 'b']}))
+    destino.linhas = ['a']  # Enviada pelo processo anterior, que parou antes de apagá-la do journal
+
+    fila = FilaGravacao(tmp_path / 'fila.db', enviar=destino.enviar, conferir=destino.conferir)
+    fila.drenar_lote()
+
+    assert destino.linhas == ['a', 'b']
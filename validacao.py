@@ -0,0 +1,133 @@
+# --- Validação de Ocorrências ---
+#
+# Regras únicas para o formulário e para a importação em lote. Todas operam
+# sobre um DataFrame inteiro com as colunas de COLUNAS_OCORRENCIA (como texto,
+# no formato gravado na planilha) usando operações de coluna, de forma que
+# validar um registro ou cem mil custa praticamente o mesmo código.
+
+import pandas as pd
+
+from catalogo import chaves_caminhos
+
+PROTECOES = ['21 - Prot. Distância', '27 - Subtensão', '59 - Sobretensão', '50 - Sobrecorrente Inst.',
+             '51 - Sobrecorrente Temp.', '50/62BF - Falha de abertura DJ', '87T - Diferencial do TR',
+             '87B - Diferencial de Barras', '81U/O - Sub/Sobrefrequência', 'Nenhuma atuação de proteção']
+SEM_PROTECAO = 'Nenhuma atuação de proteção'
+
+CAMPOS_OBRIGATORIOS = ["Data de Início", "Hora de Início", "UFV", "Família do Equipamento", "SE", "Equipamento"]
+
+REGRAS = ('obrigatorios', 'datas', 'equipamento', 'protecoes')
+
+# Código ANSI (o que vem antes do " - ") → rótulo completo da lista de proteções
+_PROTECAO_POR_CODIGO = {p.split(' - ')[0].upper(): p for p in PROTECOES if ' - ' in p}
+
+# Bit de cada proteção na máscara gravada no banco: a posição em PROTECOES.
+# Novas proteções devem entrar sempre no final da lista, para não mudar os bits já gravados.
+BIT_PROTECAO = {p: 1 << i for i, p in enumerate(PROTECOES)}
+
+
+def colunas_faltando(dados, obrigatorias):
+    """Colunas obrigatórias que não existem no DataFrame."""
+    return [col for col in obrigatorias if col not in dados.columns]
+
+
+def _texto(ocorrencias, coluna):
+    if coluna not in ocorrencias:
+        return pd.Series('', index=ocorrencias.index, dtype='string')
+    return ocorrencias[coluna].astype('string').fillna('').str.strip()
+
+
+def _data_hora(data, hora):
+    return pd.to_datetime(data + ' ' + hora, format='%d/%m/%Y %H:%M', errors='coerce')
+
+
+def _acrescentar(motivo, mascara, texto):
+    """Acrescenta ``texto`` (str ou Series) ao motivo das linhas marcadas, separando por '; '."""
+    mascara = mascara.fillna(False).astype(bool)
+    separador = motivo.where(motivo == '', motivo + '; ')
+    return motivo.where(~mascara, separador + texto)
+
+
+def normalizar_protecoes(protecoes):
+    """Converte códigos soltos ("50", "87t; 51") nos rótulos completos usados no formulário.
+
+    Itens que não correspondem a nenhum código são mantidos como vieram, para
+    que a regra 'protecoes' os aponte.
+    """
+    itens = protecoes.astype('string').fillna('').str.split(r'\s*[,;|]\s*', regex=True).explode().str.strip()
+    itens = itens[itens != '']
+    codigos = itens.str.split(' - ').str[0].str.upper()
+    rotulos = codigos.map(_PROTECAO_POR_CODIGO).fillna(itens)
+    return rotulos.groupby(level=0).agg(', '.join).reindex(protecoes.index, fill_value='')
+
+
+def bits_protecoes(selecionadas):
+    """Máscara (int) de uma lista de rótulos de PROTECOES; rótulos desconhecidos são ignorados."""
+    mascara = 0
+    for protecao in selecionadas:
+        mascara |= BIT_PROTECAO.get(protecao, 0)
+    return mascara
+
+
+def mascara_protecoes(protecoes):
+    """Máscara de bits (int64) de cada linha a partir do texto "Proteções Atuantes".
+
+    Aceita o texto gravado pelo formulário (rótulos separados por vírgula). O
+    índice deve ser único.
+    """
+    itens = protecoes.astype('string').fillna('').str.split(',').explode().str.strip()
+    bits = itens.map(BIT_PROTECAO).fillna(0).astype('int64')
+    # Sem repetições por linha, a soma dos bits equivale ao OU bit a bit
+    bits = bits.rename_axis('linha').reset_index(name='bit').drop_duplicates()
+    mascara = bits.groupby('linha', sort=False)['bit'].sum()
+    return mascara.reindex(protecoes.index, fill_value=0).astype('int64')
+
+
+def validar_ocorrencias(ocorrencias, caminhos_validos=None, regras=REGRAS):
+    """Aplica as regras a todas as linhas (colunas de COLUNAS_OCORRENCIA).
+
+    Retorna o motivo da rejeição de cada linha, ou '' quando a linha é válida.
+
+    ``caminhos_validos`` é o resultado de ``catalogo.chaves_caminhos`` sobre o
+    catálogo (ou ``CatalogoCompartilhado.chaves_caminhos``); sem ele a regra
+    'equipamento' é ignorada. O índice do DataFrame deve ser único.
+    """
+    motivo = pd.Series('', index=ocorrencias.index, dtype=object)
+
+    if 'obrigatorios' in regras:
+        faltando = pd.Series('', index=ocorrencias.index, dtype=object)
+        for campo in CAMPOS_OBRIGATORIOS:
+            faltando = faltando + (_texto(ocorrencias, campo) == '').map({True: campo + ', ', False: ''})
+        faltando = faltando.str.removesuffix(', ')
+        motivo = _acrescentar(motivo, faltando != '', 'campos obrigatórios não preenchidos: ' + faltando)
+
+    if 'datas' in regras:
+        data_ini, hora_ini = _texto(ocorrencias, "Data de Início"), _texto(ocorrencias, "Hora de Início")
+        data_fim, hora_fim = _texto(ocorrencias, "Data de Término"), _texto(ocorrencias, "Hora de Término")
+        inicio = _data_hora(data_ini, hora_ini)
+        fim = _data_hora(data_fim, hora_fim)
+        inicio_informado = (data_ini != '') & (hora_ini != '')
+        fim_informado = ~data_fim.isin(['', '-']) | ~hora_fim.isin(['', '-'])
+        motivo = _acrescentar(motivo, inicio_informado & inicio.isna(), 'data/hora de início inválida')
+        motivo = _acrescentar(motivo, fim_informado & fim.isna(),
+                              'data/hora de término inválida (informe data e hora)')
+        motivo = _acrescentar(motivo, fim < inicio, 'término anterior ao início')
+
+    if 'equipamento' in regras and caminhos_validos is not None:
+        campos = ["UFV", "Família do Equipamento", "SE", "Equipamento"]
+        niveis = ocorrencias.reindex(columns=campos)
+        informado = pd.concat([_texto(ocorrencias, c) != '' for c in campos], axis=1).all(axis=1)
+        existe = pd.Series(chaves_caminhos(niveis).isin(caminhos_validos), index=ocorrencias.index)
+        motivo = _acrescentar(motivo, informado & ~existe, 'equipamento não encontrado no catálogo')
+
+    if 'protecoes' in regras and "Proteções Atuantes" in ocorrencias:
+        itens = _texto(ocorrencias, "Proteções Atuantes").str.split(',').explode().str.strip()
+        itens = itens[itens != '']
+        desconhecida = (~itens.isin(PROTECOES)).groupby(level=0).any()
+        conflito = (itens == SEM_PROTECAO).groupby(level=0).any() & (itens.groupby(level=0).size() > 1)
+        motivo = _acrescentar(motivo, desconhecida.reindex(ocorrencias.index, fill_value=False),
+                              'proteção não reconhecida')
+        motivo = _acrescentar(motivo, conflito.reindex(ocorrencias.index, fill_value=False),
+                              f'"{SEM_PROTECAO}" marcada junto com outras proteções')
+
+    return motivo